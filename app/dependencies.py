@@ -2,15 +2,111 @@ import logging
 import os
 
 url_to_check = os.environ.get("TESTING_URL","http://example.com")
+# Connectivity-check endpoints as "<url>|<expected status>|<expected body text>", comma separated.
+PROBE_TARGETS = os.environ.get(
+    "PROBE_TARGETS",
+    "http://connectivitycheck.gstatic.com/generate_204|204,"
+    "http://www.msftconnecttest.com/connecttest.txt|200|Microsoft Connect Test,"
+    f"{url_to_check}|200|Example Domain")
+PROBE_TIMEOUT = float(os.environ.get("PROBE_TIMEOUT", "5"))
 captive_portal_url = os.environ.get("CAPTIVE_PORTAL_URL", "https://cpts.piponet.in")
+# How to log in through the portal: "browser" drives Selenium, "direct" replays its HTTP API and
+# "auto" tries direct first and falls back to the browser when the portal does not look as expected.
+# The built-in profile only has a direct API once all three PORTAL_API_* paths are configured.
+PORTAL_MODE = os.environ.get("PORTAL_MODE", "browser").lower()
+PORTAL_API_REQUEST_OTP = os.environ.get("PORTAL_API_REQUEST_OTP", "")
+PORTAL_API_VERIFY_OTP = os.environ.get("PORTAL_API_VERIFY_OTP", "")
+PORTAL_API_SKIP_AD = os.environ.get("PORTAL_API_SKIP_AD", "")
+PORTAL_HTTP_TIMEOUT = float(os.environ.get("PORTAL_HTTP_TIMEOUT", "15"))
+# YAML file or directory of portal flow profiles, tried before the built-in Railwire one.
+PORTAL_PROFILES = os.environ.get("PORTAL_PROFILES", "")
+DEFAULT_PORTAL_PROFILE = os.environ.get("DEFAULT_PORTAL_PROFILE", "railwire")
 SERIAL_PORT = os.environ.get("SERIAL_PORT", "/dev/serial0")
 BAUD_RATE = os.environ.get("BAUD_RATE", "115200")
+# SIM800C modems as "<port>|<baud rate>|<mobile number of its SIM>", comma separated. A modem
+# without a number serves whatever number a test asks for.
+MODEMS = os.environ.get("MODEMS", f"{SERIAL_PORT}|{BAUD_RATE}|{os.environ.get('MODEM_NUMBER', '')}")
 OTP_TEMPLATE = os.environ.get("OTP_TEMPLATE", "Railwire WiFi OTP sponsored by BPCL is (\\d+)")
 OTP_TIMEOUT = int(os.environ.get("OTP_TIMEOUT", "60"))
+OTP_BUFFER_TTL = int(os.environ.get("OTP_BUFFER_TTL", "30"))
+# "stored" reads every SMS back from the SIM after +CMTI, "direct" has the modem push it as a +CMT PDU.
+SMS_DELIVERY = os.environ.get("SMS_DELIVERY", "stored").lower()
+# Only messages from senders containing one of these (e.g. "RLWIRE") are considered, empty accepts all.
+SMS_SENDERS = [sender.strip().upper() for sender in os.environ.get("SMS_SENDERS", "").split(",") if sender.strip()]
+SMS_CONCAT_TIMEOUT = int(os.environ.get("SMS_CONCAT_TIMEOUT", "60"))
 
-DEFAULT_LOG_LEVEL = "DEBUG"
+CHROMEDRIVER_PATH = os.environ.get("CHROMEDRIVER_PATH", "/usr/bin/chromedriver")
+DRIVER_POOL_SIZE = int(os.environ.get("DRIVER_POOL_SIZE", "1"))
+DRIVER_MAX_USES = int(os.environ.get("DRIVER_MAX_USES", "25"))
+DRIVER_MAX_RSS_MB = int(os.environ.get("DRIVER_MAX_RSS_MB", "350"))
+DRIVER_CHECKOUT_TIMEOUT = int(os.environ.get("DRIVER_CHECKOUT_TIMEOUT", "120"))
+
+PAGE_LOAD_STRATEGY = os.environ.get("PAGE_LOAD_STRATEGY", "eager")
+# Resource types (image, media, font, stylesheet) and URL patterns the browser never fetches.
+BROWSER_BLOCK_TYPES = [kind.strip() for kind in os.environ.get("BROWSER_BLOCK_TYPES", "image,media,font").split(",") if kind.strip()]
+BROWSER_BLOCK_URLS = [url.strip() for url in os.environ.get(
+    "BROWSER_BLOCK_URLS",
+    "*doubleclick.net*,*googlesyndication.com*,*googleadservices.com*,*google-analytics.com*,"
+    "*googletagmanager.com*,*adservice.google.*,*facebook.net*").split(",") if url.strip()]
+# Load every Nth visit of a page (the first one included) without blocking to measure what
+# blocking saves, 0 never does.
+BROWSER_BASELINE_EVERY = int(os.environ.get("BROWSER_BASELINE_EVERY", "20"))
+
+# Backends prepared in the background after start-up: browser, modem, wifi and scan (a first scan
+# of SCAN_REFRESH_INTERFACES). /readyz answers 200 once all of them are ready.
+WARMUP = [part.strip() for part in os.environ.get("WARMUP", "browser,modem,wifi").split(",") if part.strip()]
+
+# Seconds an API request waits for a busy Wi-Fi interface before getting 429, a test waits for a
+# free modem, and the Retry-After sent when there are no hold times to estimate from yet.
+LEASE_WAIT_TIMEOUT = float(os.environ.get("LEASE_WAIT_TIMEOUT", "5"))
+MODEM_LEASE_TIMEOUT = float(os.environ.get("MODEM_LEASE_TIMEOUT", "120"))
+LEASE_RETRY_AFTER = int(os.environ.get("LEASE_RETRY_AFTER", "5"))
+
+# Background link monitor: interfaces to watch (empty disables it) and seconds between probes.
+MONITOR_INTERFACES = [int(index) for index in os.environ.get("MONITOR_INTERFACES", "").split(",") if index.strip()]
+MONITOR_INTERVAL = float(os.environ.get("MONITOR_INTERVAL", "30"))
+MONITOR_TCP_TARGET = os.environ.get("MONITOR_TCP_TARGET", "1.1.1.1:443")
+MONITOR_DNS_HOST = os.environ.get("MONITOR_DNS_HOST", "connectivitycheck.gstatic.com")
+MONITOR_HTTP_TARGET = os.environ.get("MONITOR_HTTP_TARGET", "http://connectivitycheck.gstatic.com/generate_204|204")
+# Run the HTTP check on every Nth probe of an online link; TCP and DNS alone cannot see a portal
+# that took the session back, so keep this low.
+MONITOR_HTTP_EVERY = max(int(os.environ.get("MONITOR_HTTP_EVERY", "1")), 1)
+# Consecutive probes that must agree before the state changes, and the longest wait between failed re-logins.
+MONITOR_DEBOUNCE = int(os.environ.get("MONITOR_DEBOUNCE", "2"))
+MONITOR_BACKOFF_MAX = float(os.environ.get("MONITOR_BACKOFF_MAX", "900"))
+MONITOR_HISTORY = int(os.environ.get("MONITOR_HISTORY", "50"))
+# SIM used for automatic re-logins, empty lets any modem with a configured number take it.
+MONITOR_MOBILE_NUMBER = os.environ.get("MONITOR_MOBILE_NUMBER") or None
+
+BROWSER_WORKERS = int(os.environ.get("BROWSER_WORKERS", str(max(DRIVER_POOL_SIZE, 1))))
+RADIO_WORKERS = int(os.environ.get("RADIO_WORKERS", "4"))
+
+WIFI_BACKEND = os.environ.get("WIFI_BACKEND", "auto").lower()  # auto, wpa_ctrl or pywifi
+WPA_CTRL_DIR = os.environ.get("WPA_CTRL_DIR", "/var/run/wpa_supplicant")
+WIFI_SCAN_TIMEOUT = float(os.environ.get("WIFI_SCAN_TIMEOUT", "10"))
+WIFI_CONNECT_TIMEOUT = float(os.environ.get("WIFI_CONNECT_TIMEOUT", "20"))
+PYWIFI_SCAN_WAIT = float(os.environ.get("PYWIFI_SCAN_WAIT", "5"))
+
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "wifiprobe_jobs.sqlite3")
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "50"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+
+INTERFACE_CACHE_TTL = float(os.environ.get("INTERFACE_CACHE_TTL", "3"))
+NETLINK_WATCH = os.environ.get("NETLINK_WATCH", "1") == "1"
+
+SCAN_CACHE_TTL = float(os.environ.get("SCAN_CACHE_TTL", "30"))
+SCAN_REFRESH_INTERVAL = float(os.environ.get("SCAN_REFRESH_INTERVAL", "0"))
+SCAN_REFRESH_INTERFACES = [int(index) for index in os.environ.get("SCAN_REFRESH_INTERFACES", "0").split(",") if index.strip()]
+# RF survey: interfaces scanned continuously from start-up, seconds between scans, and the size of
+# each interface's ring buffer (scans kept x BSSIDs tracked).
+SURVEY_INTERFACES = [int(index) for index in os.environ.get("SURVEY_INTERFACES", "").split(",") if index.strip()]
+SURVEY_INTERVAL = float(os.environ.get("SURVEY_INTERVAL", "5"))
+SURVEY_SAMPLES = int(os.environ.get("SURVEY_SAMPLES", "720"))
+SURVEY_MAX_BSSIDS = int(os.environ.get("SURVEY_MAX_BSSIDS", "256"))
+
+DEFAULT_LOG_LEVEL = "INFO"
 LOG_LEVEL = os.getenv("LOGGING_LEVEL", DEFAULT_LOG_LEVEL).upper()
-LOGGING_LEVEL = os.getenv("LOGGING_LEVEL", DEFAULT_LOG_LEVEL).upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json or text
 
 LOG_LEVEL_MAPPING = {
     'DEBUG': logging.DEBUG,
@@ -1,14 +1,81 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 
+from app.dependencies import NETLINK_WATCH
+from app.routers.admin_router import router as admin_router
 from app.routers.captive_router import router as captive_router
 from app.routers.network_router import router as network_router
 from app.routers.network_interface_router import router as network_interface_router
+from app.routers.status_router import router as status_router
+from app.routers.jobs_router import router as jobs_router
+from app.routers.metrics_router import router as metrics_router
+from app.routers.health_router import router as health_router
+from app.routers.rf_survey_router import router as rf_survey_router
+from app.services.driver_pool import get_driver_pool
+from app.services.executors import shutdown_executors
+from app.services.jobs import get_job_scheduler
+from app.services.link_monitor import get_link_monitor
+from app.services.logger import setup_logger
+from app.services.netlink_watcher import get_netlink_watcher
+from app.services.portal_flow import get_portal_profiles
+from app.services.rf_survey import get_rf_survey
+from app.services.scan_cache import get_scan_cache
+from app.services.sms_reader import get_sms_readers
+from app.services.warmup import get_warm_up
+from app.services.wpa_ctrl import close_wpa_ctrls
+
+# Configure logger
+logger = setup_logger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Parse the portal profiles up front so a broken YAML file fails the start, not the first login.
+    get_portal_profiles()
+    # Browsers, modems and radios warm up in the background so the server starts accepting
+    # requests straight away; /readyz reports their progress.
+    warm_up = get_warm_up()
+    warm_up.start()
+    scan_cache = get_scan_cache()
+    scan_cache.start_refresher()
+    rf_survey = get_rf_survey()
+    rf_survey.start_configured()
+    job_scheduler = get_job_scheduler()
+    await job_scheduler.start()
+    netlink_watcher = get_netlink_watcher()
+    if NETLINK_WATCH:
+        try:
+            await netlink_watcher.start()
+        except Exception as e:
+            logger.error("Interface watcher not started, /interfaces/ falls back to polling: %s", e)
+    link_monitor = get_link_monitor()
+    link_monitor.start()
+    yield
+    await link_monitor.stop()
+    await warm_up.stop()
+    await netlink_watcher.stop()
+    await job_scheduler.stop()
+    await rf_survey.stop_all()
+    await scan_cache.stop_refresher()
+    await get_sms_readers().stop()
+    await asyncio.get_running_loop().run_in_executor(None, get_driver_pool().close)
+    shutdown_executors()
+    close_wpa_ctrls()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(captive_router)
 app.include_router(network_router)
 app.include_router(network_interface_router)
+app.include_router(status_router)
+app.include_router(jobs_router)
+app.include_router(admin_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
+app.include_router(rf_survey_router)
 
 
 @app.exception_handler(Exception)
@@ -0,0 +1,25 @@
+# app/routers/admin_router.py
+from fastapi import APIRouter, HTTPException
+
+from app.schemas.admin import LogLevelUpdate
+from app.services.logger import get_log_levels, set_log_level, setup_logger
+
+# Configure logger
+logger = setup_logger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/admin/log-levels")
+async def list_log_levels():
+    return get_log_levels()
+
+
+@router.put("/admin/log-levels/{logger_name}")
+async def update_log_level(logger_name: str, data: LogLevelUpdate):
+    try:
+        effective = set_log_level(logger_name, data.level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.warning("Log level of %s set to %s.", logger_name, effective)
+    return {"logger": logger_name, "level": effective}
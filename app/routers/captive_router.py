@@ -1,13 +1,21 @@
 # app/routers/captive_router.py
+import uuid
+
 from fastapi import APIRouter, HTTPException, Depends
-from selenium.webdriver.chrome.webdriver import WebDriver
 
+from app.dependencies import LEASE_WAIT_TIMEOUT
 from app.schemas.captive_portal import MobileNumber
-from app.schemas.wifi import WiFiTest
+from app.schemas.wifi import WiFiTest, WiFiSurvey
 from app.services.logger import setup_logger
-from app.services.selenium_utils import enter_mobile_number, submit_otp, check_internet_connection, get_driver, navigate_to_captive_portal, skip_ad, handle_portal_interaction
-from app.services.sim800c_service import SmsModem, extract_otp, process_sms, message_type, Indication, receive_otp
-from app.services.wifi_service import scan_wifi_networks, connect_to_network
+from app.services.driver_pool import DriverPoolExhausted
+from app.services.leases import get_lease_manager, LeaseUnavailable
+from app.services.selenium_utils import checkout_driver, open_captive_portal
+from app.services.connectivity_probe import get_connectivity_probe
+from app.services.executors import run_browser
+from app.services.orchestrator import run_survey, NoFreeInterfaces
+from app.services.portal_flow import select_profile, run_portal_flow
+from app.services.sms_reader import SmsReaderPool, get_sms_readers
+from app.services.test_pipeline import run_wifi_test, WiFiTestError
 
 # Configure logger
 logger = setup_logger(__name__)
@@ -15,81 +23,76 @@ logger = setup_logger(__name__)
 router = APIRouter()
 
 
-# Dependency to get the SMS Modem instance
-def get_sms_modem():
-    return SmsModem()
+# Dependency to get the shared SMS readers with at least one modem running
+async def get_running_sms_readers():
+    sms_readers = get_sms_readers()
+    if not sms_readers.running:
+        try:
+            await sms_readers.start()
+        except Exception as e:
+            logger.error("SMS modem is unavailable: %s", e)
+            raise HTTPException(status_code=503, detail=f"SMS modem is unavailable: {e}")
+    return sms_readers
 
 @router.post("/check-internet-connection/")
-async def initiate_test(driver: WebDriver = Depends(get_driver)):
+async def initiate_test():
     logger.info("Trying to check if internet connection is there.")
     try:
-        connected = check_internet_connection(driver)
-        return {"Internet Connection": connected}
+        result = await get_connectivity_probe().check()
+        return {"Internet Connection": result.online, "Probe": result.as_dict()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 
 @router.post("/initiate-manual-test/")
-async def initiate_test(data: MobileNumber, driver: WebDriver = Depends(get_driver),
-                        sms_modem: SmsModem = Depends(get_sms_modem)):
+async def initiate_test(data: MobileNumber, sms_readers: SmsReaderPool = Depends(get_running_sms_readers)):
     logger.info("Requesting OTP for the mobile number.")
+    test_id = uuid.uuid4().hex
+    if not sms_readers.serves(data.mobile_number):
+        raise HTTPException(status_code=400, detail=f"No modem holds the SIM for {data.mobile_number}.")
     try:
-        # Step 1: Feed mobile number to the captive portal
-        enter_mobile_number(driver, data.mobile_number)
-        logger.info("OTP request process completed successfully.")
-
-        # Step 2: Wait and receive OTP from SIM800C
-        otp = None
-        while otp is None:
-            line = sms_modem.receive()
-            indication, info = message_type(line)
-            if indication == Indication.RX_SMS:
-                #            if indication == message_type.Indication.RX_SMS:
-                sms_content = process_sms(sms_modem, info)
-                logger.debug(f"Recieved SMS content: {sms_content}.")
-                otp = extract_otp(sms_content)
+        probe = await get_connectivity_probe().check()
+        profile = select_profile(probe.portal_url)
+        # The browser and the modem are leased together, as for /test-wifi/.
+        needs = ["browser"] + ([sms_readers.modem_need(data.mobile_number)] if profile.needs_otp else [])
+        async with get_lease_manager().acquire(needs, LEASE_WAIT_TIMEOUT) as lease:
+            async with checkout_driver(lease) as driver:
+                # Step 1: Open the portal the probe was redirected to
+                await run_browser(open_captive_portal, driver, probe.portal_url or profile.url)
 
-        # Step 3: Feed the OTP to the captive portal
-        if otp:
-            submit_otp(driver, otp)
-
-        # Step 4: Check if the internet connection is established
-        connected = check_internet_connection(driver)
-        return {"Internet Connection": connected}
+                # Step 2: Walk the portal's flow, the SMS reader hands over the OTP from SIM800C
+                result = await run_portal_flow(driver, profile, data.mobile_number, sms_readers, test_id,
+                                               lease=lease)
+        logger.info("Portal flow %s completed.", profile.name)
+        return result or {"Internet Connection": False}
+    except LeaseUnavailable as e:
+        logger.warning("Browser or modem is busy: %s", e)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DriverPoolExhausted as e:
+        logger.error("Unable to check out a web driver: %s", e)
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/test-wifi/")
-async def initiate_wifi_test(data: WiFiTest, driver: WebDriver = Depends(get_driver),
-                        sms_modem: SmsModem = Depends(get_sms_modem)):
+async def initiate_wifi_test(data: WiFiTest,
+                             sms_readers: SmsReaderPool = Depends(get_running_sms_readers)):
     logger.debug("Received request to automatically connect to Wi-Fi.")
     try:
-        # Step 1: Scan for available networks and find the desired SSID
-        ssid = data.ssid
-        logger.debug("Scanning wifi networks")
-        networks = scan_wifi_networks(data.interface_index)
-        if not any(net.ssid == ssid for net in networks):
-            logger.error(f"SSID '{ssid}' not found.")
-            raise HTTPException(status_code=404, detail=f"SSID '{ssid}' not found.")
-        logger.debug(f"SSID '{ssid}' found.")
-        # Step 2: Connect to the network
-        logger.debug(f"Trying to connect to SSID '{ssid}'.")
-        connection_result = connect_to_network(data.interface_index,data.ssid, data.password)
-        if not connection_result.get("connected"):
-            logger.error(f"Failed to connect to SSID '{ssid}'.")
-            raise HTTPException(status_code=400, detail="Failed to connect to the network.")
-        logger.debug(f"Successfully connected to SSID '{ssid}'.")
-        # Step 3: Check for a captive portal
-        portal_exists, redirect_url = navigate_to_captive_portal(driver)
-        if portal_exists:
-            result = handle_portal_interaction(driver, data.mobile_number, sms_modem)
-            if result:
-                return {"message": "Internet access granted"}
-            else:
-                raise HTTPException(status_code=400, detail="Failed to gain internet access")
-
+        return await run_wifi_test(data.interface_index, data.ssid, data.password, data.mobile_number, sms_readers)
+    except WiFiTestError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
     except Exception as e:
-        logger.error("An error occurred: " + str(e))
+        logger.error("An error occurred: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/survey-wifi/")
+async def survey_wifi(data: WiFiSurvey, sms_readers: SmsReaderPool = Depends(get_running_sms_readers)):
+    logger.debug("Received request to survey %s Wi-Fi networks.", len(data.tests))
+    try:
+        return await run_survey(data.tests, sms_readers, data.interface_indexes)
+    except NoFreeInterfaces as e:
+        raise HTTPException(status_code=409, detail=str(e))
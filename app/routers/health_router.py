@@ -0,0 +1,20 @@
+# app/routers/health_router.py
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.services.warmup import get_warm_up
+
+router = APIRouter()
+
+
+@router.get("/healthz")
+async def liveness():
+    """The process is up and its event loop answers."""
+    return {"status": "ok", "uptime": get_warm_up().status()["uptime"]}
+
+
+@router.get("/readyz")
+async def readiness():
+    """200 once every configured warm-up has finished, 503 with per-component progress until then."""
+    status = get_warm_up().status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
@@ -0,0 +1,54 @@
+# app/routers/jobs_router.py
+from typing import List, Optional, Union
+
+import orjson
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.schemas.job import Job, JobBatch, JobSubmission
+from app.schemas.wifi import WiFiTest
+from app.services.jobs import get_job_scheduler, JobQueueFull
+from app.services.logger import setup_logger
+
+# Configure logger
+logger = setup_logger(__name__)
+
+router = APIRouter()
+
+
+@router.post("/jobs/", response_model=JobSubmission, status_code=202)
+async def submit_jobs(data: Union[JobBatch, WiFiTest]):
+    tests = data.tests if isinstance(data, JobBatch) else [data]
+    logger.debug("Received %s Wi-Fi test jobs.", len(tests))
+    try:
+        batch_id, jobs = await get_job_scheduler().submit(tests)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    return {"batch_id": batch_id, "jobs": jobs}
+
+
+@router.get("/jobs/", response_model=List[Job])
+async def list_jobs(limit: int = Query(50, ge=1, le=500), batch_id: Optional[str] = None):
+    return await get_job_scheduler().list(limit, batch_id)
+
+
+@router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    job = await get_job_scheduler().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    scheduler = get_job_scheduler()
+    if await scheduler.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+
+    async def event_stream():
+        async for event in scheduler.events(job_id):
+            yield b"id: %d\nevent: %s\ndata: %s\n\n" % (event["seq"], event["step"].encode(), orjson.dumps(event))
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,32 +1,73 @@
-from fastapi import APIRouter, HTTPException
+from typing import Optional
 
-from app.schemas.network_interface import AllNetworkInterfaces
-from app.services.network_service import fetch_network_details, fetch_wifi_interfaces
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.schemas.network_interface import AllNetworkInterfaces, NetworkInterfaceDetails
+from app.services.executors import run_radio
+from app.services.netlink_watcher import get_netlink_watcher
+from app.services.network_service import fetch_network_details, fetch_interface_details, fetch_wifi_interfaces
+from app.services.serialization import parse_fields, wants_ndjson, json_response, ndjson_response
 
 router = APIRouter()
 
+INTERFACE_FIELDS = tuple(NetworkInterfaceDetails.model_fields)
+FIELDS = Query(None, description="Comma separated interface fields to return, all when omitted")
+FORMAT = Query(None, pattern="^(json|ndjson)$",
+               description="ndjson streams one interface per line, as does Accept: application/x-ndjson")
+
+
+def _interfaces_response(request, interfaces, fields, format):
+    """
+    Encode a snapshot as it is: its entries were validated once when it was built, going through
+    the response model would validate and copy every one of them again.
+    """
+    if interfaces is None:
+        raise HTTPException(status_code=500, detail="Interface details could not be read.")
+    projection = parse_fields(fields, INTERFACE_FIELDS)
+    include = set(projection) if projection else None
+    if wants_ndjson(request, format):
+        return ndjson_response(detail.model_dump_json(include=include).encode()
+                               for detail in interfaces.interfaces.values())
+    return json_response(interfaces.model_dump_json(include={"interfaces": {"__all__": include}} if include else None))
+
 
 @router.get("/interfaces/", response_model=AllNetworkInterfaces)
-async def list_interfaces():
+async def list_interfaces(request: Request, fields: Optional[str] = FIELDS, format: Optional[str] = FORMAT):
     try:
-        interfaces = fetch_network_details()
-        return interfaces
+        interfaces = await run_radio(fetch_network_details)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return _interfaces_response(request, interfaces, fields, format)
+
+
+# Declared before /interfaces/{interface_name} so "events" is not taken for an interface name.
+@router.get("/interfaces/events")
+async def stream_interface_events():
+    watcher = get_netlink_watcher()
+    if not watcher.running:
+        raise HTTPException(status_code=503, detail="Interface watcher is not running.")
+
+    async def event_stream():
+        async for change in watcher.events():
+            yield b"event: %s\ndata: %s\n\n" % (change["event"].encode(), orjson.dumps(change))
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @router.get("/interfaces/{interface_name}")
 async def get_interface(interface_name: str):
     try:
-        interfaces = fetch_network_details()
-        return interfaces.interfaces.get(interface_name)
+        return await run_radio(fetch_interface_details, interface_name)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/wifi-interfaces/", response_model=AllNetworkInterfaces)
-async def list_wifi_interfaces():
+async def list_wifi_interfaces(request: Request, fields: Optional[str] = FIELDS, format: Optional[str] = FORMAT):
     try:
-        interfaces = fetch_wifi_interfaces()
-        return interfaces
+        interfaces = await run_radio(fetch_wifi_interfaces)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return _interfaces_response(request, interfaces, fields, format)
@@ -1,11 +1,13 @@
 # app/routers/network_router.py
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 
-from app.schemas.network import Network
+from app.schemas.network import Network, NETWORK_FIELDS
+from app.services.leases import LeaseUnavailable
 from app.services.logger import setup_logger
-from app.services.wifi_service import scan_wifi_networks
+from app.services.scan_cache import get_scan_cache
+from app.services.serialization import parse_fields, wants_ndjson, json_response, ndjson_response
 
 # Configure logger
 logger = setup_logger(__name__)
@@ -14,9 +16,28 @@ router = APIRouter()
 
 
 @router.get("/scan-networks/", response_model=List[Network])
-async def scan_networks(interface_index: int = Query(0, description="Index of the network interface to scan")):
+async def scan_networks(request: Request,
+                        interface_index: int = Query(0, description="Index of the network interface to scan"),
+                        fresh: bool = Query(False, description="Ignore cached results and wait for a new scan"),
+                        max_age: Optional[float] = Query(None, ge=0, description="Oldest cached result to accept, in seconds"),
+                        fields: Optional[str] = Query(None, description="Comma separated fields to return, all when omitted"),
+                        format: Optional[str] = Query(None, pattern="^(json|ndjson)$",
+                                                      description="ndjson streams one network per line, as does "
+                                                                  "Accept: application/x-ndjson")):
     logger.debug("Received request to scan Wi-Fi networks.")
+    projection = parse_fields(fields, NETWORK_FIELDS)
     try:
-        return scan_wifi_networks(interface_index)
+        result, cached = await get_scan_cache().get(interface_index, max_age=max_age, fresh=fresh)
+    except LeaseUnavailable as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    headers = {
+        "Age": str(int(result.age)),
+        "X-Scan-Timestamp": result.scanned_at.isoformat(),
+        "X-Scan-Cache": "HIT" if cached else "MISS",
+    }
+    # Networks were checked when the scan was parsed, they are encoded as they are.
+    if wants_ndjson(request, format):
+        return ndjson_response(result.lines(projection), headers)
+    return json_response(result.encode(projection), headers)
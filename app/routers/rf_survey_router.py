@@ -0,0 +1,56 @@
+# app/routers/rf_survey_router.py
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.dependencies import SURVEY_INTERVAL
+from app.services.logger import setup_logger
+from app.services.rf_survey import get_rf_survey
+
+# Configure logger
+logger = setup_logger(__name__)
+
+router = APIRouter()
+
+WINDOW = Query(None, gt=0, description="Only scans from the last this many seconds, all kept scans when omitted")
+
+
+def _history(interface_index):
+    history = get_rf_survey().history(interface_index)
+    if history is None:
+        raise HTTPException(status_code=404, detail=f"Interface {interface_index} has not been surveyed.")
+    return history
+
+
+@router.get("/rf-survey/")
+async def rf_survey_status():
+    return get_rf_survey().status()
+
+
+@router.post("/rf-survey/{interface_index}/start")
+async def start_rf_survey(interface_index: int,
+                          interval: float = Query(SURVEY_INTERVAL, ge=1, description="Seconds between scans")):
+    get_rf_survey().start(interface_index, interval)
+    return get_rf_survey().status()[interface_index]
+
+
+@router.post("/rf-survey/{interface_index}/stop")
+async def stop_rf_survey(interface_index: int):
+    if not get_rf_survey().stop(interface_index):
+        raise HTTPException(status_code=404, detail=f"Interface {interface_index} is not being surveyed.")
+    return get_rf_survey().status()[interface_index]
+
+
+@router.get("/rf-survey/{interface_index}/bssids")
+async def rf_survey_bssids(interface_index: int, window: Optional[float] = WINDOW):
+    return _history(interface_index).bssid_stats(window)
+
+
+@router.get("/rf-survey/{interface_index}/events")
+async def rf_survey_events(interface_index: int, window: Optional[float] = WINDOW):
+    return _history(interface_index).events(window)
+
+
+@router.get("/rf-survey/{interface_index}/channels")
+async def rf_survey_channels(interface_index: int, window: Optional[float] = WINDOW):
+    return _history(interface_index).channel_occupancy(window)
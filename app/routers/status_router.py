@@ -0,0 +1,41 @@
+# app/routers/status_router.py
+from fastapi import APIRouter
+
+from app.services.driver_pool import get_driver_pool
+from app.services.executors import executor_stats
+from app.services.jobs import get_job_scheduler
+from app.services.leases import get_lease_manager
+from app.services.link_monitor import get_link_monitor
+from app.services.sms_reader import get_sms_readers
+
+router = APIRouter()
+
+
+@router.get("/status/driver-pool")
+async def driver_pool_status():
+    return get_driver_pool().stats()
+
+
+@router.get("/status/modem")
+async def modem_status():
+    return {"modems": get_sms_readers().stats()}
+
+
+@router.get("/status/executors")
+async def executors_status():
+    return executor_stats()
+
+
+@router.get("/status/leases")
+async def leases_status():
+    return get_lease_manager().stats()
+
+
+@router.get("/status/links")
+async def links_status():
+    return get_link_monitor().status()
+
+
+@router.get("/status/jobs")
+async def jobs_status():
+    return get_job_scheduler().stats()
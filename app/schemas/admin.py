@@ -0,0 +1,8 @@
+# app/schemas/admin.py
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class LogLevelUpdate(BaseModel):
+    level: Optional[str] = None  # None drops the override and inherits from the parent logger
@@ -1,8 +1,10 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
 class MobileNumber(BaseModel):
-    mobile_number: str
+    mobile_number: Optional[str] = None
 
 
 class OTPVerification(BaseModel):
@@ -0,0 +1,36 @@
+# app/schemas/job.py
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.schemas.wifi import WiFiTest
+
+
+class JobBatch(BaseModel):
+    tests: List[WiFiTest]
+
+
+class JobEvent(BaseModel):
+    seq: int
+    ts: float
+    step: str
+    state: str
+    info: Dict[str, Any] = {}
+
+
+class Job(BaseModel):
+    id: str
+    batch_id: str
+    request: Dict[str, Any]
+    state: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    events: List[JobEvent] = []
+
+
+class JobSubmission(BaseModel):
+    batch_id: str
+    jobs: List[Job]
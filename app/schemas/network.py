@@ -10,3 +10,39 @@ class Network(BaseModel):
     security: str = Field(None, description="Security type of the Wi-Fi network")
     auth_algorithm: str = Field(None, description="Authentication algorithm of the Wi-Fi network")
     network_type: str = Field(None, description="Type of the Wi-Fi network")
+
+
+NETWORK_FIELDS = tuple(Network.model_fields)
+
+
+def _optional(kind, value):
+    return None if value is None else kind(value)
+
+
+class ScanRecord:
+    """
+    Compact internal form of a Network for scan results, which can hold hundreds of entries
+    and are polled often. Values are checked and coerced once when the record is made, the
+    same way the model would; responses are encoded straight from it, not through the model.
+    """
+
+    __slots__ = NETWORK_FIELDS
+
+    def __init__(self, ssid=None, bssid=None, signal=None, frequency=None, security=None, auth_algorithm=None,
+                 network_type=None):
+        self.ssid = _optional(str, ssid)
+        self.bssid = _optional(str, bssid)
+        self.signal = _optional(int, signal)
+        self.frequency = _optional(int, frequency)
+        self.security = _optional(str, security)
+        self.auth_algorithm = _optional(str, auth_algorithm)
+        self.network_type = _optional(str, network_type)
+
+    def as_dict(self, fields=NETWORK_FIELDS):
+        return {field: getattr(self, field) for field in fields}
+
+    def as_model(self) -> Network:
+        return Network.model_construct(**self.as_dict())
+
+    def __repr__(self):
+        return f"ScanRecord({self.ssid!r}, {self.bssid!r}, signal={self.signal})"
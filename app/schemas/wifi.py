@@ -1,7 +1,20 @@
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 class WiFiTest(BaseModel):
     interface_index: int = 1
     ssid: str
     password: str = None
-    mobile_number: str
+    mobile_number: Optional[str] = None
+
+
+class SurveyTarget(BaseModel):
+    ssid: str
+    password: str = None
+    mobile_number: Optional[str] = None
+
+
+class WiFiSurvey(BaseModel):
+    tests: List[SurveyTarget]
+    interface_indexes: Optional[List[int]] = None
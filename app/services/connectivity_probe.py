@@ -0,0 +1,167 @@
+# app/services/connectivity_probe.py
+import asyncio
+import ipaddress
+import re
+import socket
+import time
+from enum import Enum
+from typing import List, Optional
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+
+from app.dependencies import PROBE_TARGETS, PROBE_TIMEOUT
+from app.services.logger import setup_logger
+
+# Configure logger
+logger = setup_logger(__name__)
+
+META_REFRESH = re.compile(r"""<meta[^>]+http-equiv=["']?refresh["']?[^>]+content=["']?\d+\s*;\s*url=([^"'>\s]+)""", re.I)
+JS_REDIRECT = re.compile(r"""(?:window\.)?location(?:\.href)?\s*=\s*["']([^"']+)["']""", re.I)
+
+
+class ProbeOutcome(str, Enum):
+    ONLINE = "online"
+    PORTAL = "portal"
+    OFFLINE = "offline"
+
+
+class ProbeTarget:
+    def __init__(self, url, expected_status=200, expected_body=None):
+        self.url = url
+        self.expected_status = expected_status
+        self.expected_body = expected_body
+        self.host = urlsplit(url).hostname
+
+    @classmethod
+    def parse(cls, spec):
+        url, _, rest = spec.strip().partition("|")
+        status, _, body = rest.partition("|")
+        return cls(url, int(status) if status else 200, body or None)
+
+    def __repr__(self):
+        return f"ProbeTarget({self.url!r}, {self.expected_status}, {self.expected_body!r})"
+
+
+class ProbeResult:
+    def __init__(self, outcome, target=None, status_code=None, portal_url=None, detail=None, elapsed=0.0):
+        self.outcome = outcome
+        self.target = target
+        self.status_code = status_code
+        self.portal_url = portal_url
+        self.detail = detail
+        self.elapsed = elapsed
+
+    @property
+    def online(self):
+        return self.outcome == ProbeOutcome.ONLINE
+
+    @property
+    def conclusive(self):
+        return self.outcome != ProbeOutcome.OFFLINE
+
+    def as_dict(self):
+        return {
+            "outcome": self.outcome.value,
+            "target": self.target.url if self.target else None,
+            "status_code": self.status_code,
+            "portal_url": self.portal_url,
+            "detail": self.detail,
+            "elapsed": round(self.elapsed, 3),
+        }
+
+
+def parse_targets(specs) -> List[ProbeTarget]:
+    return [ProbeTarget.parse(spec) for spec in specs.split(",") if spec.strip()]
+
+
+def _is_hijacked_address(address):
+    ip = ipaddress.ip_address(address)
+    # Loopback is left out so the probe can be pointed at a local stand-in server.
+    return not ip.is_loopback and (ip.is_private or ip.is_link_local or ip.is_reserved or ip.is_unspecified)
+
+
+def _extract_portal_url(response):
+    location = response.headers.get("location")
+    if location:
+        return urljoin(str(response.url), location)
+    match = META_REFRESH.search(response.text) or JS_REDIRECT.search(response.text)
+    if match:
+        return urljoin(str(response.url), match.group(1))
+    return str(response.url)
+
+
+class ConnectivityProbe:
+    """
+    Decides between online, captive portal and offline by racing plain HTTP requests against several
+    connectivity-check endpoints and taking the first conclusive answer. No browser is involved.
+    """
+
+    def __init__(self, targets=None, timeout=PROBE_TIMEOUT):
+        self.targets = targets if targets is not None else parse_targets(PROBE_TARGETS)
+        self.timeout = timeout
+
+    async def _resolve(self, host):
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        return [info[4][0] for info in infos]
+
+    def _classify(self, target, response, hijacked_dns):
+        status = response.status_code
+        if status == target.expected_status and (not target.expected_body or target.expected_body in response.text):
+            if hijacked_dns:
+                return ProbeOutcome.PORTAL, _extract_portal_url(response), "dns-hijack"
+            return ProbeOutcome.ONLINE, None, f"http-{status}"
+        if 300 <= status < 400 and response.headers.get("location"):
+            return ProbeOutcome.PORTAL, _extract_portal_url(response), f"redirect-{status}"
+        if status == 511 or status == 200 or (status == 204 and hijacked_dns):
+            # The answer was rewritten on the way, which is what captive portals do.
+            return ProbeOutcome.PORTAL, _extract_portal_url(response), "dns-hijack" if hijacked_dns else f"content-{status}"
+        return ProbeOutcome.OFFLINE, None, f"unexpected-{status}"
+
+    async def probe(self, client, target) -> ProbeResult:
+        started = time.monotonic()
+        hijacked_dns = False
+        try:
+            if target.host and not _is_ip(target.host):
+                addresses = await self._resolve(target.host)
+                hijacked_dns = bool(addresses) and all(_is_hijacked_address(address) for address in addresses)
+            response = await client.get(target.url)
+        except (httpx.HTTPError, OSError) as e:
+            return ProbeResult(ProbeOutcome.OFFLINE, target, detail=f"{type(e).__name__}: {e}",
+                               elapsed=time.monotonic() - started)
+        outcome, portal_url, detail = self._classify(target, response, hijacked_dns)
+        return ProbeResult(outcome, target, response.status_code, portal_url, detail, time.monotonic() - started)
+
+    async def check(self, local_address: Optional[str] = None) -> ProbeResult:
+        transport = httpx.AsyncHTTPTransport(local_address=local_address) if local_address else None
+        async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=False, transport=transport,
+                                     headers={"Cache-Control": "no-cache"}) as client:
+            tasks = [asyncio.create_task(self.probe(client, target)) for target in self.targets]
+            result = ProbeResult(ProbeOutcome.OFFLINE, detail="no probe targets configured")
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    result = await next_done
+                    if result.conclusive:
+                        break
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Connectivity probe: %s via %s (%s).", result.outcome.value, result.target.url if result.target else '-', result.detail)
+        return result
+
+
+def _is_ip(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+_connectivity_probe = ConnectivityProbe()
+
+
+def get_connectivity_probe() -> ConnectivityProbe:
+    return _connectivity_probe
@@ -0,0 +1,582 @@
+# app/services/driver_pool.py
+import itertools
+import queue
+import socket
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+import orjson
+import psutil
+
+from app.dependencies import (CHROMEDRIVER_PATH, DRIVER_POOL_SIZE, DRIVER_MAX_USES, DRIVER_MAX_RSS_MB,
+                              DRIVER_CHECKOUT_TIMEOUT, captive_portal_url, PAGE_LOAD_STRATEGY,
+                              BROWSER_BLOCK_TYPES, BROWSER_BLOCK_URLS, BROWSER_BASELINE_EVERY)
+from app.services.logger import setup_logger
+from app.services.metrics import Counter, Gauge, Histogram
+
+# Configure logger
+logger = setup_logger(__name__)
+
+
+# BROWSER_BLOCK_TYPES names to DevTools Network.ResourceType values.
+RESOURCE_TYPES = {
+    "image": "Image",
+    "media": "Media",
+    "font": "Font",
+    "stylesheet": "Stylesheet",
+}
+
+PAGE_LOAD_SECONDS = Histogram("wifiprobe_page_load_seconds", "Portal page load time in the browser.", ("blocking",))
+PAGE_BYTES = Counter("wifiprobe_page_bytes_total", "Bytes the browser downloaded for portal pages.", ("blocking",))
+PAGE_BLOCKED_REQUESTS = Counter("wifiprobe_page_blocked_requests_total", "Requests the browser was told not to make.")
+PAGE_BYTES_SAVED = Counter("wifiprobe_page_bytes_saved_total",
+                           "Bytes saved by blocking, against the last unblocked load of the same page.")
+
+
+class DriverPoolExhausted(Exception):
+    pass
+
+
+def blocked_url_patterns(urls=BROWSER_BLOCK_URLS):
+    """Network.setBlockedURLs patterns for the configured URLs."""
+    return list(urls)
+
+
+def blocked_request_patterns(types=BROWSER_BLOCK_TYPES):
+    """Fetch.enable patterns pausing every request for one of the configured resource types."""
+    unknown = [kind for kind in types if kind not in RESOURCE_TYPES]
+    if unknown:
+        logger.warning("Ignoring unknown resource types to block: %s.", ", ".join(unknown))
+    return [{"urlPattern": "*", "resourceType": RESOURCE_TYPES[kind], "requestStage": "Request"}
+            for kind in types if kind in RESOURCE_TYPES]
+
+
+def _free_port():
+    # Every pooled browser needs its own DevTools port, let the kernel pick one.
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def create_driver(debug_port):
+    logger.debug("Launching headless Chrome on debugging port %s.", debug_port)
+    # Importing selenium.webdriver loads every browser binding, so it waits until a browser is launched.
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    options = Options()
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("start-maximized")
+    options.add_argument("disable-infobars")
+    options.add_argument("--disable-extensions")
+    # Nothing but the portal should use the link before it is authenticated.
+    options.add_argument("--disable-background-networking")
+    options.add_argument("--disable-component-update")
+    options.add_argument("--disable-default-apps")
+    options.add_argument("--disable-sync")
+    options.add_argument("--no-first-run")
+    options.add_argument("--mute-audio")
+    options.add_argument("--autoplay-policy=user-gesture-required")
+    options.add_argument(f"--remote-debugging-port={debug_port}")
+    options.add_argument("--headless")
+    # Hand control back at DOMContentLoaded, every portal step waits for its own element anyway.
+    options.page_load_strategy = PAGE_LOAD_STRATEGY
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    service = Service(CHROMEDRIVER_PATH)
+    return webdriver.Chrome(service=service, options=options)
+
+
+class RequestBlocker:
+    """
+    DevTools session of its own on a browser's page that fails every request of a blocked resource
+    type. Chromedriver's CDP commands cannot receive events, so Fetch.requestPaused is answered on
+    this connection from a background thread.
+    """
+
+    def __init__(self, debug_port, patterns, timeout=10):
+        self.debug_port = debug_port
+        self.patterns = list(patterns)
+        self.timeout = timeout
+        self._connection = None
+        self._ids = itertools.count(1)
+        self._replies = {}
+        self._send_lock = threading.Lock()
+
+    def start(self):
+        from websockets.sync.client import connect
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{self.debug_port}/json/list", timeout=self.timeout) as response:
+            targets = orjson.loads(response.read())
+        page = next((target for target in targets if target.get("type") == "page"), None)
+        if page is None:
+            raise ValueError("Browser has no page to attach to.")
+        self._connection = connect(page["webSocketDebuggerUrl"], open_timeout=self.timeout, max_size=None)
+        threading.Thread(target=self._read, name=f"request-blocker-{self.debug_port}", daemon=True).start()
+
+    def set_enabled(self, enabled):
+        if enabled:
+            self._command("Fetch.enable", {"patterns": self.patterns})
+        else:
+            self._command("Fetch.disable", {})
+
+    def _send(self, command_id, method, params):
+        with self._send_lock:
+            self._connection.send(orjson.dumps({"id": command_id, "method": method, "params": params}).decode())
+
+    def _command(self, method, params):
+        # Waits for the reply so the next page load already sees the change.
+        replied = threading.Event()
+        command_id = next(self._ids)
+        self._replies[command_id] = replied
+        try:
+            self._send(command_id, method, params)
+            if not replied.wait(self.timeout):
+                raise TimeoutError(f"No reply to {method} from browser on port {self.debug_port}.")
+        finally:
+            self._replies.pop(command_id, None)
+
+    def _read(self):
+        try:
+            for message in self._connection:
+                message = orjson.loads(message)
+                if "id" in message:
+                    replied = self._replies.get(message["id"])
+                    if replied is not None:
+                        replied.set()
+                elif message.get("method") == "Fetch.requestPaused":
+                    self._send(next(self._ids), "Fetch.failRequest",
+                               {"requestId": message["params"]["requestId"], "errorReason": "BlockedByClient"})
+        except Exception as e:
+            logger.debug("Request blocker on port %s stopped: %s", self.debug_port, e)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def _network_totals(entries):
+    requests = loaded = blocked = 0
+    for entry in entries:
+        message = orjson.loads(entry["message"])["message"]
+        method = message.get("method")
+        if method == "Network.requestWillBeSent":
+            requests += 1
+        elif method == "Network.loadingFinished":
+            loaded += message["params"].get("encodedDataLength", 0)
+        elif method == "Network.loadingFailed" and (message["params"].get("blockedReason") or
+                                                    message["params"].get("errorText") == "net::ERR_BLOCKED_BY_CLIENT"):
+            blocked += 1
+    return requests, int(loaded), blocked
+
+
+class PooledDriver:
+    def __init__(self, driver, debug_port, blocked_patterns=(), request_patterns=()):
+        self.driver = driver
+        self.debug_port = debug_port
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.blocked_patterns = list(blocked_patterns)
+        self.blocker = None
+        if request_patterns:
+            blocker = RequestBlocker(debug_port, request_patterns)
+            try:
+                blocker.start()
+                self.blocker = blocker
+            except Exception as e:
+                blocker.close()
+                logger.warning("Could not block resource types in browser on port %s: %s", debug_port, e)
+        self.blocking = False
+        self.set_blocking(True)
+
+    def set_blocking(self, enabled):
+        if enabled == self.blocking or not (self.blocked_patterns or self.blocker):
+            return
+        if self.blocked_patterns:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.blocked_patterns if enabled else []})
+        if self.blocker is not None:
+            self.blocker.set_enabled(enabled)
+        self.blocking = enabled
+
+    def drain_network_log(self):
+        try:
+            return _network_totals(self.driver.get_log("performance"))
+        except Exception:
+            return 0, 0, 0
+
+    def navigate(self, url, timeout=20):
+        """Load `url` and return what it cost: wall time, requests, bytes and blocked requests."""
+        self.drain_network_log()
+        started = time.monotonic()
+        self.driver.get(url)
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        WebDriverWait(self.driver, timeout).until(EC.presence_of_element_located(("tag name", "html")))
+        elapsed = time.monotonic() - started
+        requests, loaded, blocked = self.drain_network_log()
+        return {"seconds": elapsed, "requests": requests, "bytes": loaded, "blocked_requests": blocked,
+                "blocking": self.blocking}
+
+    def is_alive(self):
+        process = getattr(self.driver.service, "process", None)
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            self.driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def rss_bytes(self):
+        """Resident memory of chromedriver and every Chrome process it spawned."""
+        process = getattr(self.driver.service, "process", None)
+        if process is None:
+            return 0
+        try:
+            root = psutil.Process(process.pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for proc in processes:
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+
+    def reset(self):
+        """Bring the browser back to a blank state: one tab, no cookies, no storage."""
+        driver = self.driver
+        try:
+            driver.switch_to.alert.dismiss()
+        except Exception:
+            pass
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+
+        origins = {_origin(captive_portal_url)}
+        current_origin = _origin(driver.current_url)
+        if current_origin:
+            origins.add(current_origin)
+            try:
+                driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            except Exception:
+                pass
+        driver.get("about:blank")
+        driver.delete_all_cookies()
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        for origin in origins:
+            if origin:
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        self.set_blocking(True)
+        self.drain_network_log()
+
+    def quit(self):
+        if self.blocker is not None:
+            self.blocker.close()
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning("Error while quitting browser on port %s: %s", self.debug_port, e)
+
+
+def _page_key(url):
+    parts = urlsplit(url or "")
+    return f"{parts.netloc}{parts.path or '/'}"
+
+
+def _origin(url):
+    parts = urlsplit(url or "")
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class DriverPool:
+    """
+    Keeps up to `size` headless Chrome instances alive and hands them out one request at a time.
+    Browsers are reset on return and retired after `max_uses` checkouts or once they grow past `max_rss_mb`.
+    Ad and tracker URLs and heavy resource types are blocked in every browser; page loads are
+    measured against an occasional unblocked baseline load of the same page.
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES, max_rss_mb=DRIVER_MAX_RSS_MB,
+                 checkout_timeout=DRIVER_CHECKOUT_TIMEOUT, factory=create_driver, blocked_patterns=None,
+                 request_patterns=None, baseline_every=BROWSER_BASELINE_EVERY):
+        self.size = size
+        self.blocked_patterns = blocked_url_patterns() if blocked_patterns is None else blocked_patterns
+        self.request_patterns = blocked_request_patterns() if request_patterns is None else request_patterns
+        self.baseline_every = baseline_every
+        self._pages = {}
+        self.max_uses = max_uses
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.checkout_timeout = checkout_timeout
+        self._factory = factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._in_use = {}
+        self._launching = 0
+        self._lock = threading.Lock()
+        self._warming = threading.Lock()
+        self._closed = False
+        self._stats = {
+            "launched": 0,
+            "retired": 0,
+            "replaced": 0,
+            "launch_failures": 0,
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "wait_seconds_last": 0.0,
+        }
+
+    def _launch(self):
+        port = _free_port()
+        try:
+            driver = self._factory(port)
+        except Exception:
+            with self._lock:
+                self._stats["launch_failures"] += 1
+            raise
+        with self._lock:
+            self._stats["launched"] += 1
+        logger.info("Launched pooled browser on debugging port %s.", port)
+        return PooledDriver(driver, port, self.blocked_patterns, self.request_patterns)
+
+    def _retire(self, pooled, reason):
+        logger.info("Retiring browser on port %s after %s uses: %s.", pooled.debug_port, pooled.uses, reason)
+        pooled.quit()
+        with self._lock:
+            self._stats["retired"] += 1
+
+    def _take_idle(self):
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if pooled.is_alive():
+                return pooled
+            logger.warning("Pooled browser on port %s crashed, replacing it.", pooled.debug_port)
+            pooled.quit()
+            with self._lock:
+                self._stats["replaced"] += 1
+
+    def _checkout(self, timeout=None, record=True):
+        if self._closed:
+            raise DriverPoolExhausted("Driver pool is closed.")
+        started = time.monotonic()
+        timeout = self.checkout_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            if record:
+                with self._lock:
+                    self._stats["checkout_timeouts"] += 1
+            raise DriverPoolExhausted(f"No browser became available within {timeout} seconds.")
+        launching = False
+        try:
+            pooled = self._take_idle()
+            if pooled is None:
+                with self._lock:
+                    self._launching += 1
+                launching = True
+                pooled = self._launch()
+        except Exception:
+            if launching:
+                with self._lock:
+                    self._launching -= 1
+            self._slots.release()
+            raise
+        waited = time.monotonic() - started
+        with self._lock:
+            # Counted as launching until it is in use, so warm() never sees its slot as empty.
+            if launching:
+                self._launching -= 1
+            self._in_use[id(pooled.driver)] = pooled
+            if record:
+                pooled.uses += 1
+                self._stats["checkouts"] += 1
+                self._stats["wait_seconds_total"] += waited
+                self._stats["wait_seconds_last"] = waited
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        return pooled
+
+    def acquire(self, timeout=None):
+        return self._checkout(timeout).driver
+
+    def release(self, driver, reset=True):
+        with self._lock:
+            pooled = self._in_use.pop(id(driver), None)
+        if pooled is None:
+            logger.warning("Tried to release a browser that does not belong to the pool.")
+            return
+        returned = False
+        try:
+            if self._closed:
+                self._retire(pooled, "pool closed")
+            elif pooled.uses >= self.max_uses:
+                self._retire(pooled, "use limit reached")
+            elif not pooled.is_alive():
+                pooled.quit()
+                with self._lock:
+                    self._stats["replaced"] += 1
+            elif self.max_rss_bytes and pooled.rss_bytes() > self.max_rss_bytes:
+                self._retire(pooled, "memory limit exceeded")
+            else:
+                try:
+                    if reset:
+                        pooled.reset()
+                    if not self._put_idle(pooled):
+                        self._retire(pooled, "pool closed")
+                    returned = True
+                except Exception as e:
+                    self._retire(pooled, f"reset failed ({e})")
+        finally:
+            self._slots.release()
+        if not returned and not self._closed:
+            # Launch the replacement off the request path so the next checkout finds a warm browser.
+            threading.Thread(target=self.warm, daemon=True).start()
+
+    def navigate(self, driver, url):
+        """Load `url` in a checked-out browser and account for the page's cost and savings."""
+        page = _page_key(url)
+        with self._lock:
+            pooled = self._in_use.get(id(driver))
+            entry = self._pages.setdefault(page, {"visits": 0, "baseline_bytes": None, "baseline_seconds": None})
+            entry["visits"] += 1
+            baseline = bool(self.baseline_every) and (entry["visits"] - 1) % self.baseline_every == 0
+        if pooled is None:
+            raise ValueError("Browser does not belong to the pool.")
+        if baseline:
+            pooled.set_blocking(False)
+        try:
+            load = pooled.navigate(url)
+        finally:
+            if baseline:
+                pooled.set_blocking(True)
+        blocking = "true" if load["blocking"] else "false"
+        PAGE_LOAD_SECONDS.observe(load["seconds"], blocking=blocking)
+        PAGE_BYTES.inc(load["bytes"], blocking=blocking)
+        PAGE_BLOCKED_REQUESTS.inc(load["blocked_requests"])
+        load.update(page=page, bytes_saved=None, seconds_saved=None)
+        with self._lock:
+            if not load["blocking"]:
+                entry.update(baseline_bytes=load["bytes"], baseline_seconds=load["seconds"])
+            elif entry["baseline_bytes"] is not None:
+                load["bytes_saved"] = max(entry["baseline_bytes"] - load["bytes"], 0)
+                load["seconds_saved"] = entry["baseline_seconds"] - load["seconds"]
+            entry["last"] = dict(load)
+        if load["bytes_saved"]:
+            PAGE_BYTES_SAVED.inc(load["bytes_saved"])
+        return load
+
+    def _put_idle(self, pooled):
+        """Return a browser to the idle queue, unless close() already emptied it for good."""
+        with self._lock:
+            if self._closed:
+                return False
+            self._idle.put(pooled)
+            return True
+
+    def _reserve_launch(self):
+        """Count a launch for a slot with no browser, idle, in use or being launched; False when there is none."""
+        with self._lock:
+            if self.size - self._idle.qsize() - len(self._in_use) - self._launching <= 0:
+                return False
+            self._launching += 1
+            return True
+
+    def warm(self):
+        """Launch browsers for every slot that has none, idle or in use, and return how many are idle."""
+        # One warm-up at a time, two replacement threads would otherwise fill the same slot.
+        with self._warming:
+            while not self._closed:
+                # Hold the slot while launching so a checkout cannot launch a browser for it too.
+                if not self._slots.acquire(blocking=False):
+                    break
+                try:
+                    if not self._reserve_launch():
+                        break
+                    try:
+                        pooled = self._launch()
+                    except Exception as e:
+                        logger.error("Failed to pre-launch browser: %s", e)
+                        break
+                    finally:
+                        with self._lock:
+                            self._launching -= 1
+                    if not self._put_idle(pooled):
+                        self._retire(pooled, "pool closed")
+                        break
+                finally:
+                    self._slots.release()
+        logger.info("Driver pool warmed with %s idle browsers.", self._idle.qsize())
+        return self._idle.qsize()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._retire(pooled, "pool closed")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            in_use = len(self._in_use)
+            pages = {page: dict(entry) for page, entry in self._pages.items()}
+        checkouts = stats["checkouts"]
+        stats.update({
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "in_use": in_use,
+            "occupancy": in_use / self.size if self.size else 0.0,
+            "wait_seconds_avg": stats["wait_seconds_total"] / checkouts if checkouts else 0.0,
+            "blocked_url_patterns": len(self.blocked_patterns),
+            "blocked_resource_types": [pattern["resourceType"] for pattern in self.request_patterns],
+            "pages": pages,
+        })
+        return stats
+
+
+_driver_pool = None
+_driver_pool_lock = threading.Lock()
+
+
+def get_driver_pool() -> DriverPool:
+    global _driver_pool
+    with _driver_pool_lock:
+        if _driver_pool is None:
+            _driver_pool = DriverPool()
+        return _driver_pool
+
+
+def _pool_gauge(key):
+    return lambda: get_driver_pool().stats()[key]
+
+
+Gauge("wifiprobe_driver_pool_size", "Configured number of pooled browsers.", callback=_pool_gauge("size"))
+Gauge("wifiprobe_driver_pool_idle", "Warm browsers waiting in the pool.", callback=_pool_gauge("idle"))
+Gauge("wifiprobe_driver_pool_in_use", "Browsers checked out by a request.", callback=_pool_gauge("in_use"))
+Gauge("wifiprobe_driver_pool_checkouts_total", "Browser checkouts.", callback=_pool_gauge("checkouts"), kind="counter")
+Gauge("wifiprobe_driver_pool_checkout_timeouts_total", "Checkouts that gave up waiting for a browser.",
+      callback=_pool_gauge("checkout_timeouts"), kind="counter")
+Gauge("wifiprobe_driver_pool_retired_total", "Browsers retired for age, memory or pool shutdown.",
+      callback=_pool_gauge("retired"), kind="counter")
+Gauge("wifiprobe_driver_pool_wait_seconds_total", "Time spent waiting for a browser.",
+      callback=_pool_gauge("wait_seconds_total"), kind="counter")
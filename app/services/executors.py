@@ -0,0 +1,111 @@
+# app/services/executors.py
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.dependencies import BROWSER_WORKERS, RADIO_WORKERS
+from app.services.logger import setup_logger
+from app.services.metrics import Gauge
+
+# Configure logger
+logger = setup_logger(__name__)
+
+
+class InstrumentedExecutor:
+    """
+    Bounded thread pool for blocking work called from async handlers. Tracks how many calls are
+    queued or running and how long they waited for a worker, so the pool can be sized.
+    """
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._stats = {
+            "queued": 0,
+            "running": 0,
+            "completed": 0,
+            "failed": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "run_seconds_total": 0.0,
+        }
+
+    def _call(self, submitted, fn, args, kwargs):
+        started = time.monotonic()
+        waited = started - submitted
+        with self._lock:
+            self._stats["queued"] -= 1
+            self._stats["running"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self._stats["running"] -= 1
+                self._stats["completed" if not failed else "failed"] += 1
+                self._stats["run_seconds_total"] += time.monotonic() - started
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._stats["queued"] += 1
+        call = functools.partial(self._call, time.monotonic(), fn, args, kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        finished = stats["completed"] + stats["failed"]
+        stats.update({
+            "max_workers": self.max_workers,
+            "wait_seconds_avg": stats["wait_seconds_total"] / finished if finished else 0.0,
+            "run_seconds_avg": stats["run_seconds_total"] / finished if finished else 0.0,
+        })
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+browser_executor = InstrumentedExecutor("browser", BROWSER_WORKERS)
+radio_executor = InstrumentedExecutor("radio", RADIO_WORKERS)
+
+
+async def run_browser(fn, *args, **kwargs):
+    """Run a blocking Selenium call on the browser pool."""
+    return await browser_executor.run(fn, *args, **kwargs)
+
+
+async def run_radio(fn, *args, **kwargs):
+    """Run a blocking pywifi / interface call on the radio pool."""
+    return await radio_executor.run(fn, *args, **kwargs)
+
+
+def executor_stats():
+    return {executor.name: executor.stats() for executor in (browser_executor, radio_executor)}
+
+
+def shutdown_executors():
+    for executor in (browser_executor, radio_executor):
+        executor.shutdown()
+
+
+def _executor_gauge(key):
+    return lambda: [({"executor": name}, stats[key]) for name, stats in executor_stats().items()]
+
+
+Gauge("wifiprobe_executor_queued", "Blocking calls waiting for a worker thread.", ("executor",),
+      callback=_executor_gauge("queued"))
+Gauge("wifiprobe_executor_running", "Blocking calls running on a worker thread.", ("executor",),
+      callback=_executor_gauge("running"))
+Gauge("wifiprobe_executor_wait_seconds_total", "Time blocking calls waited for a worker thread.", ("executor",),
+      callback=_executor_gauge("wait_seconds_total"), kind="counter")
@@ -0,0 +1,131 @@
+# app/services/job_store.py
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+
+from app.dependencies import JOB_DB_PATH
+from app.services.logger import setup_logger
+
+# Configure logger
+logger = setup_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    request TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    step TEXT NOT NULL,
+    state TEXT NOT NULL,
+    info TEXT,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+JOB_COLUMNS = ("id", "batch_id", "request", "state", "created_at", "started_at", "finished_at", "result", "error")
+
+
+class JobStore:
+    """SQLite persistence for test jobs. All access goes through one thread, which sqlite prefers."""
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        self._db = None
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+    def _open(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        # Jobs that were in progress when the service stopped will never finish.
+        interrupted = self._db.execute(
+            "UPDATE jobs SET state = 'interrupted' WHERE state IN ('queued', 'running')").rowcount
+        self._db.commit()
+        if interrupted:
+            logger.warning("Marked %s unfinished jobs from a previous run as interrupted.", interrupted)
+
+    async def open(self):
+        if self._db is None:
+            await self._run(self._open)
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def close(self):
+        await self._run(self._close)
+        self._io.shutdown(wait=True)
+
+    def _upsert(self, job):
+        self._db.execute(
+            "INSERT OR REPLACE INTO jobs (id, batch_id, request, state, created_at, started_at, finished_at, result, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job["id"], job["batch_id"], orjson.dumps(job["request"]), job["state"], job["created_at"],
+             job["started_at"], job["finished_at"],
+             orjson.dumps(job["result"]) if job["result"] is not None else None, job["error"]))
+        self._db.commit()
+
+    async def save_job(self, job):
+        await self._run(self._upsert, dict(job))
+
+    def _insert_event(self, job_id, event):
+        self._db.execute(
+            "INSERT INTO job_events (job_id, seq, ts, step, state, info) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, event["seq"], event["ts"], event["step"], event["state"], orjson.dumps(event["info"])))
+        self._db.commit()
+
+    async def save_event(self, job_id, event):
+        await self._run(self._insert_event, job_id, dict(event))
+
+    @staticmethod
+    def _row_to_job(row):
+        job = dict(zip(JOB_COLUMNS, row))
+        job["request"] = orjson.loads(job["request"])
+        job["result"] = orjson.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _get(self, job_id):
+        row = self._db.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = self._row_to_job(row)
+        job["events"] = [
+            {"seq": seq, "ts": ts, "step": step, "state": state, "info": orjson.loads(info) if info else {}}
+            for seq, ts, step, state, info in self._db.execute(
+                "SELECT seq, ts, step, state, info FROM job_events WHERE job_id = ? ORDER BY seq", (job_id,))
+        ]
+        return job
+
+    async def get_job(self, job_id):
+        return await self._run(self._get, job_id)
+
+    def _list(self, limit, batch_id):
+        query = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+        params = []
+        if batch_id:
+            query += " WHERE batch_id = ?"
+            params.append(batch_id)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        return [self._row_to_job(row) for row in self._db.execute(query, params)]
+
+    async def list_jobs(self, limit=50, batch_id=None):
+        return await self._run(self._list, limit, batch_id)
@@ -0,0 +1,206 @@
+# app/services/jobs.py
+import asyncio
+import time
+import uuid
+
+from app.dependencies import JOB_QUEUE_SIZE, JOB_WORKERS
+from app.services.job_store import JobStore
+from app.services.logger import setup_logger
+from app.services.metrics import Gauge
+from app.services.progress import set_reporter, reset_reporter
+from app.services.sms_reader import get_sms_readers
+from app.services.test_pipeline import run_wifi_test, WiFiTestError
+
+# Configure logger
+logger = setup_logger(__name__)
+
+TERMINAL_STATES = ("succeeded", "failed", "interrupted")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobScheduler:
+    """
+    Bounded queue of Wi-Fi test jobs drained by a fixed number of workers. Every step a job goes
+    through is recorded as an event, persisted to the job store and pushed to live subscribers.
+    """
+
+    def __init__(self, store=None, queue_size=JOB_QUEUE_SIZE, workers=JOB_WORKERS):
+        self.store = store or JobStore()
+        self.worker_count = workers
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._jobs = {}
+        self._subscribers = {}
+        self._workers = []
+        self._writes = set()
+        self._reserved = 0
+
+    @property
+    def running(self):
+        return bool(self._workers)
+
+    async def start(self):
+        if self.running:
+            return
+        await self.store.open()
+        self._workers = [asyncio.create_task(self._work(), name=f"job-worker-{n}") for n in range(self.worker_count)]
+        logger.info("Job scheduler started with %s workers.", self.worker_count)
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+        await self.store.close()
+
+    def stats(self):
+        states = [job["state"] for job in self._jobs.values()]
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "workers": self.worker_count,
+            "running": states.count("running"),
+        }
+
+    async def submit(self, tests):
+        if self._queue.maxsize and self._queue.maxsize - self._queue.qsize() - self._reserved < len(tests):
+            raise JobQueueFull(f"Job queue is full ({self._queue.qsize()}/{self._queue.maxsize}), retry later.")
+        # The slots are held while the jobs are saved, a concurrent submit could take them otherwise.
+        self._reserved += len(tests)
+        try:
+            batch_id, jobs = await self._save_batch(tests)
+        finally:
+            self._reserved -= len(tests)
+        for job, test in zip(jobs, tests):
+            self._queue.put_nowait((job["id"], test))
+        return batch_id, jobs
+
+    async def _save_batch(self, tests):
+        batch_id = uuid.uuid4().hex
+        jobs = []
+        for test in tests:
+            job = {
+                "id": uuid.uuid4().hex,
+                "batch_id": batch_id,
+                "request": test.model_dump(exclude={"password"}),
+                "state": "queued",
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+                "events": [],
+            }
+            self._jobs[job["id"]] = job
+            jobs.append(job)
+        try:
+            for job in jobs:
+                await self.store.save_job(job)
+        except BaseException:
+            # Rows already written stay queued until the next start marks them interrupted.
+            for job in jobs:
+                self._jobs.pop(job["id"], None)
+            raise
+        return batch_id, jobs
+
+    def _persist(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    def _emit(self, job, step, state, info):
+        event = {"seq": len(job["events"]), "ts": time.time(), "step": step, "state": state, "info": info}
+        job["events"].append(event)
+        self._persist(self.store.save_event(job["id"], event))
+        for subscriber in self._subscribers.get(job["id"], ()):
+            subscriber.put_nowait(event)
+
+    async def _work(self):
+        while True:
+            job_id, test = await self._queue.get()
+            try:
+                await self._run(self._jobs[job_id], test)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job, test):
+        job["state"] = "running"
+        job["started_at"] = time.time()
+        await self.store.save_job(job)
+        self._emit(job, "job", "running", {})
+        token = set_reporter(lambda step, state, info: self._emit(job, step, state, info))
+        try:
+            sms_readers = get_sms_readers()
+            if not sms_readers.running:
+                await sms_readers.start()
+            # Jobs for the same radio wait for it one after another instead of failing as busy.
+            job["result"] = await run_wifi_test(test.interface_index, test.ssid, test.password,
+                                                test.mobile_number, sms_readers, test_id=job["id"], wait=None)
+            job["state"] = "succeeded"
+        except WiFiTestError as e:
+            job.update(state="failed", error=e.detail, result={"status_code": e.status_code})
+        except asyncio.CancelledError:
+            job.update(state="interrupted", error="Service shut down while the job was running.")
+            raise
+        except Exception as e:
+            logger.error("Job %s failed: %s", job['id'], e, exc_info=True)
+            job.update(state="failed", error=str(e))
+        finally:
+            reset_reporter(token)
+            job["finished_at"] = time.time()
+            self._emit(job, "job", job["state"], {"error": job["error"]} if job["error"] else {})
+            try:
+                # Saved before the job leaves memory, so lookups never fall back to the stale running row.
+                await self.store.save_job(job)
+            except Exception as e:
+                logger.error("Could not save job %s: %s", job['id'], e)
+            for subscriber in self._subscribers.pop(job["id"], ()):
+                subscriber.put_nowait(None)
+            self._jobs.pop(job["id"], None)
+
+    async def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return await self.store.get_job(job_id)
+
+    async def list(self, limit=50, batch_id=None):
+        return await self.store.list_jobs(limit, batch_id)
+
+    async def events(self, job_id):
+        """Replay a job's events so far, then follow it live until it finishes."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            stored = await self.store.get_job(job_id)
+            for event in (stored or {}).get("events", []):
+                yield event
+            return
+        subscriber = asyncio.Queue()
+        history = list(job["events"])
+        self._subscribers.setdefault(job_id, []).append(subscriber)
+        try:
+            for event in history:
+                yield event
+            while True:
+                event = await subscriber.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers and subscriber in subscribers:
+                subscribers.remove(subscriber)
+
+
+_job_scheduler = JobScheduler()
+
+
+def get_job_scheduler() -> JobScheduler:
+    return _job_scheduler
+
+
+Gauge("wifiprobe_job_queue_depth", "Jobs waiting for a worker.", callback=lambda: _job_scheduler.stats()["queue_depth"])
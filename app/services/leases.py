@@ -0,0 +1,175 @@
+# app/services/leases.py
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+
+from app.dependencies import DRIVER_POOL_SIZE, LEASE_RETRY_AFTER
+from app.services.logger import setup_logger
+from app.services.metrics import Counter, Gauge, Histogram
+
+# Configure logger
+logger = setup_logger(__name__)
+
+LEASE_WAIT_SECONDS = Histogram("wifiprobe_lease_wait_seconds", "Time spent waiting for a hardware lease.",
+                               ("resource",))
+LEASE_HOLD_SECONDS = Histogram("wifiprobe_lease_hold_seconds", "Time a hardware lease was held.", ("resource",))
+LEASE_REJECTED = Counter("wifiprobe_lease_rejected_total", "Lease requests turned away because capacity was saturated.",
+                         ("resource",))
+
+
+def interface_resource(interface_index):
+    return f"wifi:{interface_index}"
+
+
+def _kind(name):
+    # "wifi:1" and "modem:/dev/ttyUSB0" are labelled by kind to keep the series count bounded.
+    return name.split(":", 1)[0]
+
+
+class LeaseUnavailable(Exception):
+    def __init__(self, resources, retry_after):
+        super().__init__(f"{', '.join(resources)} busy, retry in {retry_after} seconds.")
+        self.resources = resources
+        self.retry_after = retry_after
+
+
+class Lease:
+    """The resources granted for one request, released together or one by one."""
+
+    def __init__(self, manager, names):
+        self.names = list(names)
+        self._manager = manager
+        self._held = {name: time.monotonic() for name in names}
+
+    def holds(self, name):
+        return name in self._held
+
+    def release(self, name):
+        acquired = self._held.pop(name, None)
+        if acquired is not None:
+            self._manager._release(name, time.monotonic() - acquired)
+
+    def release_all(self):
+        for name in list(self._held):
+            self.release(name)
+
+
+class LeaseManager:
+    """
+    Capacity of the shared hardware: one slot per Wi-Fi interface ("wifi:<index>") and modem
+    ("modem:<port>"), and one per pooled browser ("browser"). A request names everything it
+    needs, a tuple standing for "any one of these", and gets all of it at once or nothing, so
+    two requests never hold half of each other's needs. Waits are bounded; when they run out
+    the caller gets LeaseUnavailable with a retry estimate from recent hold times.
+    """
+
+    def __init__(self, capacities=None, retry_after=LEASE_RETRY_AFTER):
+        self.retry_after = retry_after
+        self._capacity = dict(capacities or {})
+        self._held = {}
+        self._waiters = []
+        self._hold_totals = {}
+
+    def set_capacity(self, name, capacity):
+        self._capacity[name] = capacity
+        self._wake()
+
+    def available(self, name):
+        return self._capacity.get(name, 1) - self._held.get(name, 0)
+
+    def held(self, name):
+        return self._held.get(name, 0)
+
+    def _pick(self, needs):
+        chosen = []
+        for need in needs:
+            options = need if isinstance(need, (tuple, list)) else (need,)
+            option = next((name for name in options if self.available(name) - chosen.count(name) > 0), None)
+            if option is None:
+                return None
+            chosen.append(option)
+        return chosen
+
+    def _blocking(self, needs):
+        blocked = []
+        for need in needs:
+            options = need if isinstance(need, (tuple, list)) else (need,)
+            if all(self.available(name) <= 0 for name in options):
+                blocked.extend(options)
+        return blocked or [name for need in needs for name in (need if isinstance(need, (tuple, list)) else (need,))]
+
+    def _estimate_retry(self, names):
+        averages = [total / count for total, count in (self._hold_totals.get(name, (0.0, 0)) for name in names) if count]
+        return max(1, math.ceil(max(averages))) if averages else self.retry_after
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _release(self, name, held_for):
+        self._held[name] -= 1
+        total, count = self._hold_totals.get(name, (0.0, 0))
+        self._hold_totals[name] = (total + held_for, count + 1)
+        LEASE_HOLD_SECONDS.observe(held_for, resource=_kind(name))
+        self._wake()
+
+    @asynccontextmanager
+    async def acquire(self, needs, timeout=None):
+        """Hold every resource in `needs` for the block. `timeout` None waits as long as it takes, 0 not at all."""
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        while (chosen := self._pick(needs)) is None:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                blocked = self._blocking(needs)
+                for name in blocked:
+                    LEASE_REJECTED.inc(resource=_kind(name))
+                raise LeaseUnavailable(blocked, self._estimate_retry(blocked))
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        for name in chosen:
+            self._held[name] = self._held.get(name, 0) + 1
+        waited = time.monotonic() - started
+        for name in chosen:
+            LEASE_WAIT_SECONDS.observe(waited, resource=_kind(name))
+        if waited > 1:
+            logger.info("Waited %.2fs for %s.", waited, ", ".join(chosen))
+        lease = Lease(self, chosen)
+        try:
+            yield lease
+        finally:
+            lease.release_all()
+
+    def stats(self):
+        names = sorted(set(self._capacity) | set(self._held))
+        return {
+            "waiting": len(self._waiters),
+            "resources": {name: {
+                "capacity": self._capacity.get(name, 1),
+                "held": self._held.get(name, 0),
+                "hold_seconds_avg": (self._hold_totals[name][0] / self._hold_totals[name][1]
+                                     if self._hold_totals.get(name, (0, 0))[1] else None),
+            } for name in names},
+        }
+
+
+_lease_manager = LeaseManager({"browser": DRIVER_POOL_SIZE})
+
+
+def get_lease_manager() -> LeaseManager:
+    return _lease_manager
+
+
+Gauge("wifiprobe_leases_held", "Hardware leases currently held.", ["resource"],
+      callback=lambda: [({"resource": name}, count) for name, count in _lease_manager._held.items()])
+Gauge("wifiprobe_lease_waiters", "Requests waiting for a hardware lease.", callback=lambda: len(_lease_manager._waiters))
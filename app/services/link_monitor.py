@@ -0,0 +1,256 @@
+# app/services/link_monitor.py
+import asyncio
+import socket
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+import httpx
+
+from app.dependencies import (MONITOR_INTERFACES, MONITOR_INTERVAL, MONITOR_TCP_TARGET, MONITOR_DNS_HOST,
+                              MONITOR_HTTP_TARGET, MONITOR_HTTP_EVERY, MONITOR_DEBOUNCE, MONITOR_BACKOFF_MAX, MONITOR_HISTORY,
+                              MONITOR_MOBILE_NUMBER, PROBE_TIMEOUT)
+from app.services.connectivity_probe import ConnectivityProbe, ProbeOutcome, ProbeTarget
+from app.services.executors import run_radio
+from app.services.leases import get_lease_manager, interface_resource, LeaseUnavailable
+from app.services.logger import setup_logger
+from app.services.metrics import Counter, Gauge
+from app.services.sms_reader import get_sms_readers
+from app.services.test_pipeline import login_through_portal
+from app.services.wifi_service import list_wifi_interfaces, get_interface_ipv4
+
+# Configure logger
+logger = setup_logger(__name__)
+
+STATE_UNKNOWN = "unknown"
+STATE_ONLINE = ProbeOutcome.ONLINE.value
+STATE_PORTAL = ProbeOutcome.PORTAL.value
+STATE_OFFLINE = ProbeOutcome.OFFLINE.value
+
+LINK_TRANSITIONS = Counter("wifiprobe_link_transitions_total", "Connectivity state changes of monitored links.",
+                           ("to",))
+LINK_RELOGINS = Counter("wifiprobe_link_relogins_total", "Automatic portal re-logins by result.", ("result",))
+
+
+class Observation:
+    """Outcome of one round of probes on a link."""
+
+    def __init__(self, state, detail, portal_url=None, tcp=None, dns=None, http=None):
+        self.state = state
+        self.detail = detail
+        self.portal_url = portal_url
+        self.tcp = tcp
+        self.dns = dns
+        self.http = http
+        self.at = datetime.now(timezone.utc)
+
+    def as_dict(self):
+        return {"state": self.state, "detail": self.detail, "portal_url": self.portal_url, "tcp": self.tcp,
+                "dns": self.dns, "http": self.http, "at": self.at.isoformat()}
+
+
+class LinkState:
+    """
+    Connectivity state of one interface. A new state is taken only after `debounce` probes in a
+    row agree, so a single lost probe does not flap the link or trigger a re-login.
+    """
+
+    def __init__(self, interface_index, debounce=MONITOR_DEBOUNCE, history=MONITOR_HISTORY):
+        self.interface_index = interface_index
+        self.debounce = debounce
+        self.state = STATE_UNKNOWN
+        self.since = time.monotonic()
+        self.last = None
+        self.history = deque(maxlen=history)
+        self._candidate = None
+        self._streak = 0
+        self.relogins = 0
+        self.relogin_failures = 0
+        self.next_relogin = 0.0
+        self.http_skipped = 0
+
+    def observe(self, observation):
+        """Record an observation and return whether it changed the state."""
+        self.last = observation
+        if observation.state == self.state:
+            self._candidate, self._streak = None, 0
+            return False
+        if observation.state == self._candidate:
+            self._streak += 1
+        else:
+            self._candidate, self._streak = observation.state, 1
+        if self.state != STATE_UNKNOWN and self._streak < self.debounce:
+            return False
+        self.history.append({"from": self.state, "to": observation.state, "detail": observation.detail,
+                             "at": observation.at.isoformat()})
+        logger.info("Interface %s went %s -> %s (%s).", self.interface_index, self.state, observation.state,
+                    observation.detail)
+        LINK_TRANSITIONS.inc(to=observation.state)
+        self.state = observation.state
+        self.since = time.monotonic()
+        self._candidate, self._streak = None, 0
+        return True
+
+    def as_dict(self):
+        return {
+            "interface_index": self.interface_index,
+            "state": self.state,
+            "for_seconds": round(time.monotonic() - self.since, 3),
+            "last": self.last.as_dict() if self.last else None,
+            "relogins": self.relogins,
+            "relogin_failures": self.relogin_failures,
+            "next_relogin_in": round(max(self.next_relogin - time.monotonic(), 0), 3),
+            "history": list(self.history),
+        }
+
+
+def _parse_host_port(spec):
+    host, _, port = spec.rpartition(":")
+    return host, int(port)
+
+
+class LinkMonitor:
+    """
+    Keeps watch over associated interfaces. The state comes from the HTTP 204 check, the only
+    probe that sees a portal taking the session back; a TCP connect and a DNS lookup (through the
+    system resolver, so not bound to the interface) run alongside as diagnostics. An online link
+    whose TCP and DNS probes pass may skip the HTTP check on all but every `http_every`th probe.
+    When a portal session expires the existing portal login is run again, with the time between
+    failed attempts doubling up to `backoff_max`. A radio busy with a test is left alone, the
+    test logs in itself.
+    """
+
+    def __init__(self, interface_indexes=MONITOR_INTERFACES, interval=MONITOR_INTERVAL,
+                 tcp_target=MONITOR_TCP_TARGET, dns_host=MONITOR_DNS_HOST, http_target=MONITOR_HTTP_TARGET,
+                 http_every=MONITOR_HTTP_EVERY, debounce=MONITOR_DEBOUNCE, backoff_max=MONITOR_BACKOFF_MAX, mobile_number=MONITOR_MOBILE_NUMBER,
+                 timeout=PROBE_TIMEOUT):
+        self.interface_indexes = interface_indexes
+        self.interval = interval
+        self.tcp_target = _parse_host_port(tcp_target)
+        self.dns_host = dns_host
+        self.http_target = ProbeTarget.parse(http_target)
+        self.http_every = http_every
+        self.backoff_max = backoff_max
+        self.mobile_number = mobile_number
+        self.timeout = timeout
+        self._http = ConnectivityProbe([self.http_target], timeout)
+        self.links = {index: LinkState(index, debounce) for index in interface_indexes}
+        self._tasks = []
+
+    async def _tcp(self, local_address):
+        started = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(*self.tcp_target, local_addr=(local_address, 0)), self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        writer.close()
+        return round(time.monotonic() - started, 3)
+
+    async def _dns(self):
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().getaddrinfo(self.dns_host, None,
+                                                                          type=socket.SOCK_STREAM), self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        return round(time.monotonic() - started, 3)
+
+    async def _http_check(self, local_address):
+        transport = httpx.AsyncHTTPTransport(local_address=local_address)
+        async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=False, transport=transport,
+                                     headers={"Cache-Control": "no-cache"}) as client:
+            return await self._http.probe(client, self.http_target)
+
+    async def probe(self, link):
+        """One round of probes on a link. The HTTP check decides the state; TCP and DNS are reported alongside."""
+        interface_name = dict(await run_radio(list_wifi_interfaces)).get(link.interface_index)
+        local_address = await run_radio(get_interface_ipv4, interface_name) if interface_name else None
+        if not local_address:
+            return Observation(STATE_OFFLINE, "no-address")
+        tcp, dns = await asyncio.gather(self._tcp(local_address), self._dns())
+        if (tcp is not None and dns is not None and link.state == STATE_ONLINE
+                and link.http_skipped + 1 < self.http_every):
+            link.http_skipped += 1
+            return Observation(STATE_ONLINE, "tcp+dns", tcp=tcp, dns=dns)
+        link.http_skipped = 0
+        result = await self._http_check(local_address)
+        return Observation(result.outcome.value, result.detail, result.portal_url, tcp, dns, round(result.elapsed, 3))
+
+    async def relogin(self, link):
+        """Log in through the portal again, unless a test holds the radio. Returns whether it got back online."""
+        sms_readers = get_sms_readers()
+        try:
+            async with get_lease_manager().acquire([interface_resource(link.interface_index)], 0):
+                if not sms_readers.running:
+                    await sms_readers.start()
+                interface_name = dict(await run_radio(list_wifi_interfaces)).get(link.interface_index)
+                local_address = await run_radio(get_interface_ipv4, interface_name) if interface_name else None
+                logger.info("Portal session on interface %s expired, logging in again.", link.interface_index)
+                result = await login_through_portal(link.last.portal_url, self.mobile_number, sms_readers,
+                                                    uuid.uuid4().hex, local_address)
+        except LeaseUnavailable:
+            logger.debug("Interface %s or its portal hardware is busy, not logging in again.", link.interface_index)
+            return None
+        except Exception as e:
+            logger.error("Re-login on interface %s failed: %s", link.interface_index, e)
+            result = None
+        return bool(result and result.get("Internet Connection"))
+
+    async def _tick(self, link):
+        link.observe(await self.probe(link))
+        if link.state != STATE_PORTAL or time.monotonic() < link.next_relogin:
+            return
+        succeeded = await self.relogin(link)
+        if succeeded is None:
+            return
+        link.relogins += 1
+        if succeeded:
+            LINK_RELOGINS.inc(result="succeeded")
+            link.relogin_failures = 0
+            link.next_relogin = 0.0
+            # Confirm straight away instead of reporting the portal until the next interval.
+            link.observe(await self.probe(link))
+        else:
+            LINK_RELOGINS.inc(result="failed")
+            link.relogin_failures += 1
+            backoff = min(self.interval * 2 ** link.relogin_failures, self.backoff_max)
+            link.next_relogin = time.monotonic() + backoff
+            logger.warning("Next re-login on interface %s in %.0f seconds.", link.interface_index, backoff)
+
+    async def _watch(self, link):
+        while True:
+            try:
+                await self._tick(link)
+            except Exception as e:
+                logger.error("Monitoring interface %s failed: %s", link.interface_index, e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._tasks or not self.links:
+            return
+        logger.info("Monitoring interfaces %s every %s seconds.", self.interface_indexes, self.interval)
+        self._tasks = [asyncio.create_task(self._watch(link), name=f"link-monitor-{index}")
+                       for index, link in self.links.items()]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def status(self):
+        return {"interval": self.interval, "links": [link.as_dict() for link in self.links.values()]}
+
+
+_link_monitor = LinkMonitor()
+
+
+def get_link_monitor() -> LinkMonitor:
+    return _link_monitor
+
+
+Gauge("wifiprobe_link_online", "Whether a monitored interface currently has internet access.", ["interface"],
+      callback=lambda: [({"interface": str(index)}, int(link.state == STATE_ONLINE))
+                        for index, link in _link_monitor.links.items()])
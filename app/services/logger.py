@@ -1,29 +1,112 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
+import threading
+import time
 
-from app.dependencies import LOG_LEVEL, LOG_LEVEL_MAPPING
+import orjson
 
+from app.dependencies import LOG_LEVEL, LOG_LEVEL_MAPPING, LOG_FORMAT
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, so logs can be shipped and filtered without parsing text."""
+
+    converter = time.gmtime
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + ".%03dZ" % record.msecs,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Resolve the lazy arguments and traceback on the calling thread, where they are still
+        # valid, but leave the formatting to the listener so the traceback stays its own field.
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
-def setup_logger(name):
-    logger = logging.getLogger(name)
-    log_level = LOG_LEVEL_MAPPING.get(LOG_LEVEL, logging.INFO)
-    logger.setLevel(log_level)
 
-    # Create handlers for stdout and stderr
-    stdout_handler = logging.StreamHandler(sys.stdout)
-    stderr_handler = logging.StreamHandler(sys.stderr)
+def _formatter():
+    if LOG_FORMAT == "text":
+        return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    return JsonFormatter()
+
+
+def configure_logging():
+    """
+    Route every record through a queue drained by a background thread, so writing to the
+    console or an SD card never blocks the event loop. Safe to call more than once.
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(_formatter())
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        # Replace whatever libraries (pywifi) installed, otherwise every line is printed twice.
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_QueueHandler(log_queue))
+        root.setLevel(LOG_LEVEL_MAPPING.get(LOG_LEVEL, logging.INFO))
+        # httpx logs every connectivity probe request at INFO.
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush the queue and stop the writer thread."""
+    global _listener
+    with _configure_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def setup_logger(name):
+    configure_logging()
+    return logging.getLogger(name)
 
-    # Set logging level for each handler
-    stdout_handler.setLevel(log_level)  # Adjust as needed
-    stderr_handler.setLevel(logging.ERROR)  # Adjust as needed
 
-    # Set formatter
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-    stdout_handler.setFormatter(formatter)
-    stderr_handler.setFormatter(formatter)
+def get_log_levels():
+    """Effective level of the root logger and of every logger with an explicit override."""
+    levels = {"root": logging.getLevelName(logging.getLogger().level)}
+    for name, logger in sorted(logging.root.manager.loggerDict.items()):
+        if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET:
+            levels[name] = logging.getLevelName(logger.level)
+    return levels
 
-    # Add handlers to logger
-    logger.addHandler(stdout_handler)
-    logger.addHandler(stderr_handler)
 
-    return logger
+def set_log_level(name, level):
+    """Override the level of one logger (and its children) at runtime; None removes the override."""
+    if level is not None and level.upper() not in LOG_LEVEL_MAPPING:
+        raise ValueError(f"Unknown log level '{level}'.")
+    logger = logging.getLogger(None if name == "root" else name)
+    if level is None:
+        logger.setLevel(LOG_LEVEL_MAPPING.get(LOG_LEVEL, logging.INFO) if name == "root" else logging.NOTSET)
+    else:
+        logger.setLevel(LOG_LEVEL_MAPPING[level.upper()])
+    return logging.getLevelName(logger.getEffectiveLevel())
@@ -0,0 +1,282 @@
+# app/services/netlink_watcher.py
+import asyncio
+import errno
+import ipaddress
+import socket
+import struct
+
+from app.schemas.network_interface import AllNetworkInterfaces, NetworkInterfaceDetails
+from app.services.executors import run_radio
+from app.services.logger import setup_logger
+from app.services.network_service import get_interface_inventory, wifi_status
+
+# Configure logger
+logger = setup_logger(__name__)
+
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_BROADCAST = 4
+IFF_UP = 0x1
+
+NLMSGHDR = struct.Struct("=IHHII")
+IFINFOMSG = struct.Struct("=BxHiII")
+IFADDRMSG = struct.Struct("=BBBBI")
+RTATTR = struct.Struct("=HH")
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def parse_attributes(data, offset):
+    attributes = {}
+    while offset + RTATTR.size <= len(data):
+        length, kind = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attributes[kind] = data[offset + RTATTR.size:offset + length]
+        offset += _align(length)
+    return attributes
+
+
+def parse_messages(data):
+    """Split a netlink datagram into (type, payload) pairs."""
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, kind, _flags, _seq, _pid = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        yield kind, data[offset + NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+
+def _netmask(family, prefixlen):
+    network = ipaddress.ip_network(("0.0.0.0" if family == socket.AF_INET else "::", prefixlen))
+    return str(network.netmask)
+
+
+class NetlinkWatcher:
+    """
+    Keeps a live AllNetworkInterfaces snapshot by applying rtnetlink link and address events
+    to the snapshot taken at startup, and pushes every change to subscribers.
+    """
+
+    def __init__(self, inventory=None):
+        self.inventory = inventory or get_interface_inventory()
+        self._sock = None
+        self._details = {}
+        self._names = {}
+        self._subscribers = set()
+        self._tasks = set()
+        self._resyncing = False
+
+    @property
+    def running(self):
+        return self._sock is not None
+
+    async def start(self):
+        if self.running:
+            return
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        try:
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+            sock.setblocking(False)
+            # Take the baseline after subscribing so no event between the two is lost.
+            baseline = await run_radio(self.inventory.snapshot)
+        except Exception:
+            sock.close()
+            raise
+        self._details = {name: detail.model_copy(deep=True) for name, detail in baseline.interfaces.items()}
+        self._names = {index: name for index, name in socket.if_nameindex()}
+        self._sock = sock
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_readable)
+        self.inventory.attach_live_source(self.snapshot)
+        logger.info("Watching %s interfaces through rtnetlink.", len(self._details))
+
+    async def stop(self):
+        if self._sock is None:
+            return
+        self.inventory.attach_live_source(None)
+        asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        for subscriber in list(self._subscribers):
+            subscriber.put_nowait(None)
+
+    def snapshot(self) -> AllNetworkInterfaces:
+        # Entries are validated one by one as they change.
+        return AllNetworkInterfaces.model_construct(interfaces=dict(self._details))
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=256)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    async def events(self):
+        """The current snapshot followed by every change, until the watcher stops."""
+        queue = self.subscribe()
+        try:
+            yield {"event": "snapshot", "interfaces": self.snapshot().model_dump(mode="json")["interfaces"]}
+            while True:
+                change = await queue.get()
+                if change is None:
+                    return
+                yield change
+        finally:
+            self.unsubscribe(queue)
+
+    def _publish(self, change):
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.put_nowait(change)
+            except asyncio.QueueFull:
+                # A client that stopped reading is dropped instead of growing memory.
+                self._subscribers.discard(subscriber)
+                logger.warning("Dropping a slow interface event subscriber.")
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    logger.error("Error reading rtnetlink socket: %s", e)
+                    return
+                # The kernel dropped events it could not queue, so the snapshot may be missing changes.
+                logger.warning("rtnetlink socket overflowed, taking a new interface baseline.")
+                if not self._resyncing:
+                    self._resyncing = True
+                    self._spawn(self._resync())
+                continue
+            for kind, payload in parse_messages(data):
+                try:
+                    self._handle(kind, payload)
+                except Exception as e:
+                    logger.error("Failed to apply rtnetlink message %s: %s", kind, e, exc_info=True)
+
+    def _handle(self, kind, payload):
+        if kind in (RTM_NEWLINK, RTM_DELLINK):
+            self._handle_link(kind, payload)
+        elif kind in (RTM_NEWADDR, RTM_DELADDR):
+            self._handle_address(kind, payload)
+
+    def _handle_link(self, kind, payload):
+        _family, _type, index, flags, _change = IFINFOMSG.unpack_from(payload)
+        attributes = parse_attributes(payload, IFINFOMSG.size)
+        name = attributes.get(IFLA_IFNAME, b"").rstrip(b"\0").decode() or self._names.get(index)
+        if not name:
+            return
+        if kind == RTM_DELLINK:
+            self._names.pop(index, None)
+            if self._details.pop(name, None) is not None:
+                self._publish({"event": "link_removed", "interface": name})
+            return
+        self._names[index] = name
+        added = name not in self._details
+        detail = self._details.get(name) or NetworkInterfaceDetails(name=name)
+        update = {"is_up": bool(flags & IFF_UP)}
+        if IFLA_MTU in attributes:
+            update["mtu"] = struct.unpack("=I", attributes[IFLA_MTU])[0]
+        if IFLA_ADDRESS in attributes and len(attributes[IFLA_ADDRESS]) == 6:
+            update["mac_address"] = attributes[IFLA_ADDRESS].hex(":")
+        self._store(name, detail, update, "link_added" if added else "link")
+        if added or detail.is_wifi:
+            # A hot-plugged adapter may be a new radio; otherwise association state may have changed.
+            self._spawn(self._refresh_wifi_status(name, refresh=added))
+
+    def _handle_address(self, kind, payload):
+        family, prefixlen, _flags, _scope, index = IFADDRMSG.unpack_from(payload)
+        name = self._names.get(index)
+        if name is None or family not in (socket.AF_INET, socket.AF_INET6):
+            return
+        attributes = parse_attributes(payload, IFADDRMSG.size)
+        raw = attributes.get(IFA_LOCAL) or attributes.get(IFA_ADDRESS)
+        if raw is None:
+            return
+        address = socket.inet_ntop(family, raw)
+        if family == socket.AF_INET6 and ipaddress.ip_address(address).is_link_local:
+            address = f"{address}%{name}"  # same form psutil reports
+        key = "ipv4" if family == socket.AF_INET else "ipv6"
+        detail = self._details.get(name) or NetworkInterfaceDetails(name=name)
+        addresses = [ip for ip in getattr(detail, key) if str(ip.address) != address]
+        if kind == RTM_NEWADDR:
+            broadcast = attributes.get(IFA_BROADCAST)
+            addresses.append({
+                "address": address,
+                "netmask": _netmask(family, prefixlen),
+                "broadcast": socket.inet_ntop(family, broadcast) if broadcast else None,
+            })
+        self._store(name, detail, {key: [ip if isinstance(ip, dict) else ip.model_dump() for ip in addresses]},
+                    "address_added" if kind == RTM_NEWADDR else "address_removed")
+
+    def _store(self, name, detail, update, event):
+        merged = NetworkInterfaceDetails(**{**detail.model_dump(), **update})
+        if merged == self._details.get(name):
+            return
+        self._details[name] = merged
+        self._publish({"event": event, "interface": name, "details": merged.model_dump(mode="json")})
+
+    async def _resync(self):
+        """Replace the snapshot with a fresh one from the inventory and publish what differs."""
+        try:
+            baseline = await run_radio(self.inventory.rebuild)
+        except Exception as e:
+            logger.error("Could not take a new interface baseline: %s", e)
+            return
+        finally:
+            self._resyncing = False
+        if baseline is None or self._sock is None:
+            return
+        self._names = {index: name for index, name in socket.if_nameindex()}
+        for name in set(self._details) - set(baseline.interfaces):
+            del self._details[name]
+            self._publish({"event": "link_removed", "interface": name})
+        for name, detail in baseline.interfaces.items():
+            self._store(name, detail, {}, "link" if name in self._details else "link_added")
+        logger.info("Resynchronised %s interfaces after rtnetlink overflow.", len(self._details))
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh_wifi_status(self, name, refresh=False):
+        try:
+            handle = await run_radio(self.inventory.wifi_handle, name, refresh)
+            if handle is None:
+                return
+            index, iface = handle
+            status = wifi_status(await run_radio(iface.status))
+        except Exception as e:
+            logger.warning("Could not read Wi-Fi status of %s: %s", name, e)
+            return
+        detail = self._details.get(name)
+        if detail is not None:
+            self._store(name, detail, {"is_wifi": True, "index": index, "status": status}, "link")
+
+
+_netlink_watcher = NetlinkWatcher()
+
+
+def get_netlink_watcher() -> NetlinkWatcher:
+    return _netlink_watcher
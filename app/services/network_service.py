@@ -1,85 +1,180 @@
 # app/services/network_service.py
 
 import socket
+import threading
+import time
+from typing import Optional
 
 import psutil
 from pydantic import ValidationError
-from pywifi import PyWiFi, const
 
-from app.schemas.network_interface import AllNetworkInterfaces
+from app.dependencies import INTERFACE_CACHE_TTL
+from app.schemas.network_interface import AllNetworkInterfaces, NetworkInterfaceDetails
 from app.services.logger import setup_logger
+from app.services.wifi_service import get_pywifi
 
 # Configure logger
 logger = setup_logger(__name__)
 
 
-def fetch_network_details() -> AllNetworkInterfaces:
-    interfaces_details = {}
-    all_if_addrs = psutil.net_if_addrs()
-    all_if_stats = psutil.net_if_stats()
-    wifi = PyWiFi()
-    if not wifi.interfaces():
-        logger.error("No Wi-Fi interfaces found.")
-        raise ValueError("No Wi-Fi interfaces available")
-    all_wifi_interfaces = wifi.interfaces()
-    logger.info(f"Found {len(all_if_addrs)} network interfaces.")
-    for if_name, addrs in all_if_addrs.items():
-        if_stats = all_if_stats.get(if_name, None)
-        for index,wifiiface in enumerate(all_wifi_interfaces):
-            if wifiiface.name() == if_name:
-                is_wifi = True
-                status = wifiiface.status()
-                wifi_index = index
-                status = {
-                    const.IFACE_DISCONNECTED: "Disconnected",
-                    const.IFACE_SCANNING: "Scanning",
-                    const.IFACE_INACTIVE: "Inactive",
-                    const.IFACE_CONNECTING: "Connecting",
-                    const.IFACE_CONNECTED: "Connected",
-                }.get(status, "Unknown")
-            else:
-                is_wifi = False
-                status = "Unknown"
-                wifi_index = 0
-
-
-        interface_detail = {
-            "mac_address": None,
-            "ipv4": [],
-            "ipv6": [],
-            "is_up": if_stats.isup if if_stats else False,
-            "speed": if_stats.speed if if_stats else 0,
-            "duplex": if_stats.duplex.name if if_stats else "Unknown",
-            "mtu": if_stats.mtu if if_stats else 0,
-            "is_wifi": is_wifi if is_wifi else False,
-            "index": wifi_index if wifi_index else 0,
-            "status": status if status else "Unknown",
-            "name": if_name,
+def wifi_status(status):
+    from pywifi import const
+    return {
+        const.IFACE_DISCONNECTED: "Disconnected",
+        const.IFACE_SCANNING: "Scanning",
+        const.IFACE_INACTIVE: "Inactive",
+        const.IFACE_CONNECTING: "Connecting",
+        const.IFACE_CONNECTED: "Connected",
+    }.get(status, "Unknown")
+
+
+def wifi_handles():
+    """Wi-Fi interfaces by name, with the index used by the scan and connect endpoints."""
+    return {iface.name(): (index, iface) for index, iface in enumerate(get_pywifi().interfaces())}
+
+
+def build_interface_detail(if_name, addrs, if_stats, wifi_handle=None):
+    if wifi_handle is not None:
+        wifi_index, wifiiface = wifi_handle
+        is_wifi = True
+        status = wifi_status(wifiiface.status())
+    else:
+        is_wifi = False
+        status = "Unknown"
+        wifi_index = 0
+
+    interface_detail = {
+        "mac_address": None,
+        "ipv4": [],
+        "ipv6": [],
+        "is_up": if_stats.isup if if_stats else False,
+        "speed": if_stats.speed if if_stats else 0,
+        "duplex": if_stats.duplex.name if if_stats else "Unknown",
+        "mtu": if_stats.mtu if if_stats else 0,
+        "is_wifi": is_wifi,
+        "index": wifi_index,
+        "status": status,
+        "name": if_name,
+    }
+    for addr in addrs:
+        ip_detail = {"address": addr.address, "netmask": addr.netmask, "broadcast": addr.broadcast}
+        if addr.family == socket.AF_INET:
+            interface_detail["ipv4"].append(ip_detail)
+        elif addr.family == socket.AF_INET6:
+            interface_detail["ipv6"].append(ip_detail)
+        elif addr.family == psutil.AF_LINK:
+            interface_detail["mac_address"] = addr.address
+    return interface_detail
+
+
+class InterfaceInventory:
+    """
+    Snapshot of every network interface, rebuilt at most once per `ttl` seconds or after
+    invalidate(). Single-interface lookups are answered from the snapshot while it is fresh
+    and otherwise built on their own. While a live source (the netlink watcher) is attached,
+    its snapshot is served instead and never expires.
+    """
+
+    def __init__(self, ttl=INTERFACE_CACHE_TTL):
+        self.ttl = ttl
+        self._snapshot = None
+        self._built_at = 0.0
+        self._handles = None
+        self._lock = threading.Lock()
+        self._live_source = None
+
+    def attach_live_source(self, source):
+        """Serve `source()` instead of polling psutil, or go back to polling with None."""
+        self._live_source = source
+
+    def _fresh(self):
+        return self._snapshot is not None and time.monotonic() - self._built_at <= self.ttl
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._handles = None
+
+    def _wifi_handles(self):
+        if self._handles is None:
+            self._handles = wifi_handles()
+        return self._handles
+
+    def wifi_handle(self, interface_name, refresh=False):
+        with self._lock:
+            if refresh:
+                self._handles = None
+            return self._wifi_handles().get(interface_name)
+
+    def snapshot(self) -> Optional[AllNetworkInterfaces]:
+        if self._live_source is not None:
+            return self._live_source()
+        with self._lock:
+            if self._fresh():
+                return self._snapshot
+            return self._build()
+
+    def rebuild(self) -> Optional[AllNetworkInterfaces]:
+        """Build a new snapshot from psutil, even while a live source is attached."""
+        with self._lock:
+            return self._build()
+
+    def _build(self):
+        all_if_addrs = psutil.net_if_addrs()
+        all_if_stats = psutil.net_if_stats()
+        # Re-read the adapter list on every rebuild so hot-plugged USB radios show up.
+        self._handles = None
+        handles = self._wifi_handles()
+        if not handles:
+            logger.error("No Wi-Fi interfaces found.")
+            raise ValueError("No Wi-Fi interfaces available")
+        logger.info("Found %s network interfaces.", len(all_if_addrs))
+        interfaces_details = {
+            if_name: build_interface_detail(if_name, addrs, all_if_stats.get(if_name), handles.get(if_name))
+            for if_name, addrs in all_if_addrs.items()
         }
-        for addr in addrs:
-            ip_detail = {"address": addr.address, "netmask": addr.netmask, "broadcast": addr.broadcast}
-            if addr.family == socket.AF_INET:
-                interface_detail["ipv4"].append(ip_detail)
-            elif addr.family == socket.AF_INET6:
-                interface_detail["ipv6"].append(ip_detail)
-            elif addr.family == psutil.AF_LINK:
-                interface_detail["mac_address"] = addr.address
-
-        interfaces_details[if_name] = interface_detail
-        logger.debug(f"Interface details: {interfaces_details}")
-    try:
-        return AllNetworkInterfaces(interfaces=interfaces_details)
-    except ValidationError as e:
-        print("Error validating network data:", e)
-        return None
+        try:
+            self._snapshot = AllNetworkInterfaces(interfaces=interfaces_details)
+        except ValidationError as e:
+            logger.error("Error validating network data: %s", e)
+            return None
+        self._built_at = time.monotonic()
+        return self._snapshot
+
+    def get(self, interface_name) -> Optional[NetworkInterfaceDetails]:
+        if self._live_source is not None:
+            return self._live_source().interfaces.get(interface_name)
+        with self._lock:
+            if self._fresh():
+                return self._snapshot.interfaces.get(interface_name)
+            handle = self._wifi_handles().get(interface_name)
+        addrs = psutil.net_if_addrs().get(interface_name)
+        if addrs is None:
+            return None
+        if_stats = psutil.net_if_stats().get(interface_name)
+        return NetworkInterfaceDetails(**build_interface_detail(interface_name, addrs, if_stats, handle))
+
+
+_inventory = InterfaceInventory()
+
+
+def get_interface_inventory() -> InterfaceInventory:
+    return _inventory
+
+
+def fetch_network_details() -> AllNetworkInterfaces:
+    return _inventory.snapshot()
+
+
+def fetch_interface_details(interface_name) -> Optional[NetworkInterfaceDetails]:
+    return _inventory.get(interface_name)
+
 
 def fetch_wifi_interfaces() -> AllNetworkInterfaces:
     logger.info("Fetching Wi-Fi interfaces.")
-    logger.debug("Fetching all network interfaces.")
     interfaces = fetch_network_details()
-    logger.debug(f"Found {len(interfaces.interfaces)} network interfaces.")
-    logger.debug("Filtering Wi-Fi interfaces.")
-    wifi_interfaces = AllNetworkInterfaces(interfaces={interface: interfaces.interfaces[interface] for interface in interfaces.interfaces if interfaces.interfaces[interface].is_wifi})
-
-    logger.debug(f"Found {len(wifi_interfaces.interfaces)} Wi-Fi interfaces.")
+    # The entries were validated when the snapshot was built, no need to do it again.
+    wifi_interfaces = AllNetworkInterfaces.model_construct(
+        interfaces={name: detail for name, detail in interfaces.interfaces.items() if detail.is_wifi})
+    logger.debug("Found %s Wi-Fi interfaces.", len(wifi_interfaces.interfaces))
     return wifi_interfaces
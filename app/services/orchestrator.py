@@ -0,0 +1,42 @@
+# app/services/orchestrator.py
+import asyncio
+import time
+
+from app.services.logger import setup_logger
+from app.services.test_pipeline import free_wifi_interfaces, run_timed_wifi_test
+
+# Configure logger
+logger = setup_logger(__name__)
+
+
+class NoFreeInterfaces(Exception):
+    pass
+
+
+async def run_survey(targets, sms_readers, interface_indexes=None):
+    """
+    Spread SSID tests over every free Wi-Fi interface with one worker per radio. Workers pull the
+    next SSID from a shared queue, so a slow hotspot on one radio does not hold up the others.
+    Browsers come from the driver pool and OTP exchanges take turns on the modem holding each SIM.
+    """
+    indexes = await free_wifi_interfaces(interface_indexes)
+    if not indexes:
+        raise NoFreeInterfaces("No free Wi-Fi interface is available for the survey.")
+    logger.info("Surveying %s SSIDs on interfaces %s.", len(targets), indexes)
+
+    pending = asyncio.Queue()
+    for target in targets:
+        pending.put_nowait(target)
+    results = {index: [] for index in indexes}
+
+    async def worker(interface_index):
+        while True:
+            try:
+                target = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            results[interface_index].append(await run_timed_wifi_test(interface_index, target, sms_readers))
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker(index) for index in indexes))
+    return {"interfaces": results, "elapsed": round(time.monotonic() - started, 3)}
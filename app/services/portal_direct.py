@@ -0,0 +1,122 @@
+# app/services/portal_direct.py
+import re
+from html.parser import HTMLParser
+from typing import Optional
+from urllib.parse import urljoin
+
+import httpx
+
+from app.dependencies import OTP_TIMEOUT, PORTAL_HTTP_TIMEOUT
+from app.services.connectivity_probe import get_connectivity_probe
+from app.services.logger import setup_logger
+from app.services.metrics import PORTAL_EVENTS
+from app.services.progress import step
+
+# Configure logger
+logger = setup_logger(__name__)
+
+TOKEN_HEADER = "X-CSRF-Token"
+
+
+class PortalStructureChanged(Exception):
+    """The portal did not look or answer the way the direct flow expects."""
+
+
+class _FormFields(HTMLParser):
+    """Collects hidden inputs and csrf meta tags, the state a browser would send back."""
+
+    def __init__(self):
+        super().__init__()
+        self.hidden = {}
+        self.token = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "input" and (attrs.get("type") or "").lower() == "hidden" and attrs.get("name"):
+            self.hidden[attrs["name"]] = attrs.get("value") or ""
+        elif tag == "meta" and re.fullmatch(r"(csrf|xsrf)[-_]token", attrs.get("name") or "", re.I):
+            self.token = attrs.get("content")
+
+
+class DirectPortalLogin:
+    """
+    Logs in by sending the portal's own request-OTP, verify-OTP and skip-ad requests over httpx,
+    keeping the session cookies and hidden tokens from the landing page. The endpoints and the
+    page markers come from the profile's `direct` section. Raises PortalStructureChanged when the
+    page or an answer is not what the browser flow would see, so the caller can fall back to Selenium.
+    """
+
+    def __init__(self, profile, portal_url=None, local_address=None, timeout=PORTAL_HTTP_TIMEOUT):
+        if not profile.direct:
+            raise PortalStructureChanged(f"Portal profile {profile.name!r} has no direct API.")
+        self.profile = profile
+        self.api = profile.direct
+        self.portal_url = portal_url or profile.url
+        self.local_address = local_address
+        self.timeout = timeout
+        self._fields = {}
+        self._token = None
+
+    def _client(self):
+        transport = httpx.AsyncHTTPTransport(local_address=self.local_address) if self.local_address else None
+        return httpx.AsyncClient(timeout=self.timeout, follow_redirects=True, transport=transport)
+
+    async def _open(self, client):
+        response = await client.get(self.portal_url)
+        if response.status_code != 200:
+            raise PortalStructureChanged(f"Portal page answered {response.status_code}.")
+        # What the browser flow relies on; if the page lacks these the API probably changed as well.
+        missing = [marker for marker in self.api.get("markers", []) if marker not in response.text]
+        if missing:
+            raise PortalStructureChanged(f"Portal page lacks {', '.join(missing)}.")
+        parser = _FormFields()
+        parser.feed(response.text)
+        self._fields = parser.hidden
+        self._token = parser.token or parser.hidden.get("csrf_token") or client.cookies.get("XSRF-TOKEN")
+        # API paths are relative to wherever the redirect chain ended.
+        self.portal_url = str(response.url)
+
+    async def _post(self, client, path, payload):
+        headers = {TOKEN_HEADER: self._token} if self._token else {}
+        response = await client.post(urljoin(self.portal_url, path), json={**self._fields, **payload},
+                                     headers=headers)
+        if response.status_code in (404, 405) or response.status_code >= 500:
+            raise PortalStructureChanged(f"{path} answered {response.status_code}.")
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            raise PortalStructureChanged(f"{path} did not answer with JSON.")
+
+    async def login(self, mobile_number, sms_readers, test_id) -> Optional[dict]:
+        pattern = self.profile.otp_pattern
+        async with self._client() as client:
+            with step("direct_open_portal"):
+                await self._open(client)
+            async with sms_readers.lease(mobile_number) as (sms_reader, mobile_number):
+                # Register for the OTP before requesting it so an early SMS is not missed.
+                sms_reader.expect_otp(test_id, pattern=pattern)
+                try:
+                    with step("direct_request_otp"):
+                        _, answer = await self._post(client, self.api["request_otp"], {"number": mobile_number})
+                    if answer.get("otp_required", True):
+                        with step("otp_wait"):
+                            otp = await sms_reader.wait_for_otp(test_id, OTP_TIMEOUT, pattern)
+                        if not otp:
+                            return None
+                        with step("direct_verify_otp"):
+                            status, answer = await self._post(client, self.api["verify_otp"], {"otp": otp})
+                        if status != 200 or not answer.get("ok"):
+                            logger.warning("Portal rejected the OTP: %s", answer)
+                            return None
+                finally:
+                    sms_reader.discard(test_id)
+            with step("direct_skip_ad"):
+                _, answer = await self._post(client, self.api["skip_ad"], {})
+            failure = self.profile.failure_for(str(answer.get("alert") or answer.get("message") or ""))
+            if failure:
+                logger.warning("Portal %s refused the login: %s", self.profile.name, failure)
+                PORTAL_EVENTS.inc(event=failure)
+                return None
+        with step("check_internet_connection"):
+            connected = (await get_connectivity_probe().check(local_address=self.local_address)).online
+        return {"Internet Connection": connected}
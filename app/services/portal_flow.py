@@ -0,0 +1,353 @@
+# app/services/portal_flow.py
+import fnmatch
+import os
+import re
+import threading
+import time
+from contextlib import AsyncExitStack
+from typing import Optional
+from urllib.parse import urlsplit
+
+import yaml
+from selenium.common.exceptions import NoAlertPresentException, StaleElementReferenceException, TimeoutException
+
+from app.dependencies import (captive_portal_url, OTP_TEMPLATE, OTP_TIMEOUT, PORTAL_API_REQUEST_OTP,
+                              PORTAL_API_VERIFY_OTP, PORTAL_API_SKIP_AD, PORTAL_PROFILES, DEFAULT_PORTAL_PROFILE)
+from app.services.connectivity_probe import get_connectivity_probe
+from app.services.executors import run_browser
+from app.services.logger import setup_logger
+from app.services.metrics import PORTAL_EVENTS
+from app.services.progress import step
+
+# Configure logger
+logger = setup_logger(__name__)
+
+# The values of selenium's By constants. selenium.webdriver loads every browser binding when
+# imported, so it is only imported inside the functions that run in a browser.
+LOCATORS = {
+    "xpath": "xpath",
+    "css": "css selector",
+    "class": "class name",
+    "id": "id",
+    "name": "name",
+    "tag": "tag name",
+}
+ACTIONS = ("click", "fill", "await", "otp")
+DEFAULT_TIMEOUT = 20
+# How long a click waits for its effect before clicking again.
+CLICK_RETRY_INTERVAL = 1.0
+
+# The Railwire portal as it was hardcoded in selenium_utils; url, OTP regex and API paths
+# come from the settings.
+BUILTIN_PROFILES = """
+name: railwire
+steps:
+  - name: connect_button
+    # The button ignores clicks for a while after page load; retry until the form shows up.
+    click: {xpath: "//span[contains(text(), 'Connect To Wi-Fi')]"}
+    until: {class: phoneNumber}
+    timeout: 30
+  - name: enter_mobile_number
+    fill: {class: phoneNumber}
+    value: "{mobile_number}"
+    timeout: 10
+  - name: request_otp
+    click: {xpath: '//button[contains(@class, "enter-btn")]'}
+    timeout: 10
+  - name: determine_next_step
+    await:
+      otp: {css: "input[type='number'][placeholder='Enter OTP']"}
+      skip_ad: {xpath: "//button[contains(text(), 'Skip Ad to Connect WiFi')]"}
+    timeout: 30
+  - name: otp_wait
+    when: otp
+    otp: true
+  - name: submit_otp
+    when: otp
+    fill: {css: "input.form-control[type='number'][placeholder='Enter OTP']"}
+    value: "{otp}"
+  - name: verify_otp
+    when: otp
+    click: {css: "button.verify-btn.btn.btn-primary"}
+    timeout: 10
+  - name: skip_ad
+    click: {xpath: "//button[contains(text(), 'Skip Ad to Connect WiFi')]"}
+    alert: 5
+success:
+  - css: span.wifi-connect
+    text: "Congratulations!!! You are connected to RailWire WIFI"
+failures:
+  free_plan_exhausted: "Free plan limit exhausted for the day"
+direct:
+  markers: ["Connect To Wi-Fi", "phoneNumber", "Enter OTP", "Skip Ad to Connect WiFi"]
+"""
+
+
+class PortalProfileError(ValueError):
+    pass
+
+
+class FlowFailed(Exception):
+    def __init__(self, outcome, detail):
+        super().__init__(detail)
+        self.outcome = outcome
+
+
+def _locator(spec, where):
+    if not isinstance(spec, dict) or len(spec) != 1:
+        raise PortalProfileError(f"{where}: a locator is one of {', '.join(LOCATORS)} mapped to a selector.")
+    (kind, selector), = spec.items()
+    if kind not in LOCATORS:
+        raise PortalProfileError(f"{where}: unknown locator type '{kind}'.")
+    return LOCATORS[kind], selector
+
+
+class FlowStep:
+    def __init__(self, spec, position):
+        actions = [action for action in ACTIONS if action in spec]
+        if len(actions) != 1:
+            raise PortalProfileError(f"Step {position} needs exactly one of {', '.join(ACTIONS)}.")
+        self.action = actions[0]
+        self.name = spec.get("name") or f"{self.action}_{position}"
+        where = f"Step '{self.name}'"
+        self.when = spec.get("when")
+        self.timeout = float(spec.get("timeout", DEFAULT_TIMEOUT))
+        self.alert_timeout = float(spec.get("alert", 0))
+        self.value = spec.get("value")
+        self.locator = _locator(spec[self.action], where) if self.action in ("click", "fill") else None
+        self.until = _locator(spec["until"], where) if spec.get("until") else None
+        self.choices = {}
+        if self.action == "await":
+            if not isinstance(spec["await"], dict) or not spec["await"]:
+                raise PortalProfileError(f"{where}: await maps branch names to locators.")
+            self.choices = {branch: _locator(locator, where) for branch, locator in spec["await"].items()}
+        if self.action == "fill" and self.value is None:
+            raise PortalProfileError(f"{where}: fill needs a value.")
+
+
+class PortalProfile:
+    """One portal's login flow, parsed and checked once when the profiles are loaded."""
+
+    def __init__(self, data):
+        try:
+            self.name = data["name"]
+            self.hosts = [host.lower() for host in data.get("hosts", [])]
+            self.url = data.get("url")
+            self.otp_pattern = re.compile(data.get("otp_regex") or OTP_TEMPLATE)
+            self.steps = [FlowStep(spec, n) for n, spec in enumerate(data["steps"])]
+            self.success = [(_locator({k: v for k, v in marker.items() if k != "text"}, "success"),
+                             marker.get("text")) for marker in data.get("success", [])]
+            self.failures = dict(data.get("failures", {}))
+            self.direct = data.get("direct")
+        except (KeyError, TypeError, re.error) as e:
+            raise PortalProfileError(f"Invalid portal profile {data.get('name', '?')!r}: {e}") from e
+        missing = [key for key in ("request_otp", "verify_otp", "skip_ad") if self.direct and key not in self.direct]
+        if missing:
+            raise PortalProfileError(f"Portal profile {self.name!r}: direct needs {', '.join(missing)}.")
+        if self.otp_pattern.groups < 1:
+            raise PortalProfileError(f"Portal profile {self.name!r}: otp_regex needs a capture group.")
+
+    @property
+    def needs_otp(self):
+        return any(flow_step.action == "otp" for flow_step in self.steps)
+
+    def matches(self, host):
+        return any(fnmatch.fnmatch(host, pattern) for pattern in self.hosts)
+
+    def failure_for(self, text):
+        for outcome, marker in self.failures.items():
+            if marker in (text or ""):
+                return outcome
+        return None
+
+
+def _builtin_profile():
+    data = yaml.safe_load(BUILTIN_PROFILES)
+    data.update({
+        "url": captive_portal_url,
+        "hosts": [urlsplit(captive_portal_url).hostname or ""],
+        "otp_regex": OTP_TEMPLATE,
+    })
+    api = {"request_otp": PORTAL_API_REQUEST_OTP, "verify_otp": PORTAL_API_VERIFY_OTP, "skip_ad": PORTAL_API_SKIP_AD}
+    if all(api.values()):
+        data["direct"].update(api)
+    else:
+        # The real portal's API paths are not known until configured, guessing them costs every login a failed try.
+        data["direct"] = None
+    return PortalProfile(data)
+
+
+def _profile_files(path):
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith((".yaml", ".yml")))
+    return [path]
+
+
+def load_profiles(path=PORTAL_PROFILES):
+    """Profiles from `path` (a YAML file or a directory of them), followed by the built-in one."""
+    profiles = []
+    for file_name in _profile_files(path) if path else []:
+        with open(file_name) as f:
+            for document in yaml.safe_load_all(f):
+                if document is None:
+                    continue  # empty file or trailing ---
+                for data in document if isinstance(document, list) else [document]:
+                    profiles.append(PortalProfile(data))
+    profiles.append(_builtin_profile())
+    logger.info("Loaded portal profiles: %s", ", ".join(profile.name for profile in profiles))
+    return profiles
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def get_portal_profiles():
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            _profiles = load_profiles()
+        return _profiles
+
+
+def select_profile(portal_url=None) -> PortalProfile:
+    """The first profile whose hosts match the portal the probe was redirected to, else the default."""
+    profiles = get_portal_profiles()
+    host = (urlsplit(portal_url or "").hostname or "").lower()
+    for profile in profiles:
+        if host and profile.matches(host):
+            return profile
+    return next((profile for profile in profiles if profile.name == DEFAULT_PORTAL_PROFILE), profiles[-1])
+
+
+def _check_alert(driver, profile, timeout):
+    from selenium.webdriver.support.ui import WebDriverWait
+    def alert_or_success(driver):
+        try:
+            return driver.switch_to.alert
+        except NoAlertPresentException:
+            pass
+        # Reaching the success page means no alert is coming, stop waiting.
+        return any(driver.find_elements(*locator) for locator, _ in profile.success)
+
+    try:
+        alert = WebDriverWait(driver, timeout).until(alert_or_success)
+    except TimeoutException:
+        return
+    if alert is True:
+        return
+    text = alert.text
+    logger.info("Alert detected: %s", text)
+    alert.accept()
+    outcome = profile.failure_for(text)
+    if outcome:
+        raise FlowFailed(outcome, text)
+
+
+def _click_until(driver, flow_step):
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    deadline = time.monotonic() + flow_step.timeout
+    while True:
+        remaining = max(deadline - time.monotonic(), 0.1)
+        try:
+            WebDriverWait(driver, remaining).until(EC.element_to_be_clickable(flow_step.locator)).click()
+            WebDriverWait(driver, min(CLICK_RETRY_INTERVAL, remaining)).until(
+                EC.visibility_of_element_located(flow_step.until))
+            return
+        except (TimeoutException, StaleElementReferenceException):
+            if time.monotonic() >= deadline:
+                raise
+
+
+def _await_any(driver, flow_step):
+    from selenium.webdriver.support.ui import WebDriverWait
+    def visible_branch(driver):
+        for branch, locator in flow_step.choices.items():
+            try:
+                if driver.find_element(*locator).is_displayed():
+                    return branch
+            except Exception:
+                continue
+        return False
+
+    try:
+        return WebDriverWait(driver, flow_step.timeout).until(visible_branch)
+    except TimeoutException:
+        raise FlowFailed("next_step_not_found", f"None of {', '.join(flow_step.choices)} appeared.")
+
+
+def run_browser_step(driver, profile, flow_step, context):
+    """Carry out one click, fill or await step. Returns the branch an await step found."""
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    branch = None
+    if flow_step.action == "click":
+        if flow_step.until:
+            _click_until(driver, flow_step)
+        else:
+            WebDriverWait(driver, flow_step.timeout).until(EC.element_to_be_clickable(flow_step.locator)).click()
+    elif flow_step.action == "fill":
+        element = WebDriverWait(driver, flow_step.timeout).until(EC.element_to_be_clickable(flow_step.locator))
+        element.clear()
+        element.send_keys(str(flow_step.value).format(**context))
+    elif flow_step.action == "await":
+        branch = _await_any(driver, flow_step)
+    if flow_step.alert_timeout:
+        _check_alert(driver, profile, flow_step.alert_timeout)
+    return branch
+
+
+def check_success(driver, profile, timeout=DEFAULT_TIMEOUT):
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    for locator, text in profile.success:
+        try:
+            element = WebDriverWait(driver, timeout).until(EC.presence_of_element_located(locator))
+        except TimeoutException:
+            return False
+        if text and text not in element.text:
+            return False
+    return True
+
+
+async def run_portal_flow(driver, profile, mobile_number, sms_readers, test_id, local_address=None,
+                          lease=None) -> Optional[dict]:
+    """
+    Walk the profile's steps in the browser. The OTP is expected before any step runs so an early
+    SMS is not missed, and the SIM's modem is leased until its OTP has been read, taken from
+    `lease` when it was acquired along with the browser.
+    """
+    context = {"mobile_number": mobile_number, "branch": None}
+    async with AsyncExitStack() as otp_scope:
+        if profile.needs_otp:
+            sms_reader, context["mobile_number"] = await otp_scope.enter_async_context(
+                sms_readers.lease(mobile_number, lease))
+            sms_reader.expect_otp(test_id, pattern=profile.otp_pattern)
+            otp_scope.callback(sms_reader.discard, test_id)
+        try:
+            for flow_step in profile.steps:
+                if flow_step.when and flow_step.when != context["branch"]:
+                    continue
+                with step(flow_step.name):
+                    if flow_step.action == "otp":
+                        context["otp"] = await sms_reader.wait_for_otp(test_id, OTP_TIMEOUT, profile.otp_pattern)
+                        if not context["otp"]:
+                            return None
+                        await otp_scope.aclose()
+                    else:
+                        try:
+                            branch = await run_browser(run_browser_step, driver, profile, flow_step, context)
+                        except TimeoutException:
+                            raise FlowFailed("step_timeout", f"Timed out in step '{flow_step.name}'.")
+                        if branch:
+                            context["branch"] = branch
+        except FlowFailed as e:
+            logger.warning("Portal flow %s stopped: %s", profile.name, e)
+            PORTAL_EVENTS.inc(event=e.outcome)
+            return None
+    with step("check_wifi_connection_success"):
+        await run_browser(check_success, driver, profile)
+    with step("check_internet_connection"):
+        connected = (await get_connectivity_probe().check(local_address=local_address)).online
+    return {"Internet Connection": connected}
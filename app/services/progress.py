@@ -0,0 +1,41 @@
+# app/services/progress.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.services.metrics import STEP_DURATION
+
+# Callback receiving (step, state, info) for the pipeline running in the current task.
+_reporter = ContextVar("progress_reporter", default=None)
+
+
+def set_reporter(callback):
+    return _reporter.set(callback)
+
+
+def reset_reporter(token):
+    _reporter.reset(token)
+
+
+def report(step, state, **info):
+    callback = _reporter.get()
+    if callback is not None:
+        callback(step, state, info)
+
+
+@contextmanager
+def step(name, **info):
+    """Report the start, end and duration of one pipeline step to whoever is listening,
+    and record the duration in the step histogram."""
+    report(name, "started", **info)
+    started = time.monotonic()
+    try:
+        yield
+    except BaseException as e:
+        elapsed = time.monotonic() - started
+        STEP_DURATION.observe(elapsed, step=name, state="failed")
+        report(name, "failed", elapsed=elapsed, error=str(e))
+        raise
+    elapsed = time.monotonic() - started
+    STEP_DURATION.observe(elapsed, step=name, state="completed")
+    report(name, "completed", elapsed=elapsed)
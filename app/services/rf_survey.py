@@ -0,0 +1,95 @@
+# app/services/rf_survey.py
+import asyncio
+import time
+
+from app.dependencies import SURVEY_INTERFACES, SURVEY_INTERVAL, SURVEY_SAMPLES, SURVEY_MAX_BSSIDS
+from app.services.leases import LeaseUnavailable
+from app.services.logger import setup_logger
+from app.services.metrics import Gauge
+from app.services.scan_cache import get_scan_cache
+
+# Configure logger
+logger = setup_logger(__name__)
+
+
+class RfSurvey:
+    """
+    Continuous scanning of selected interfaces, each at its own rate, into a SignalHistory per
+    interface. Scans go through the scan cache, so they are shared with /scan-networks/ callers
+    and tests looking for an SSID.
+    """
+
+    def __init__(self, samples=SURVEY_SAMPLES, max_bssids=SURVEY_MAX_BSSIDS):
+        self.samples = samples
+        self.max_bssids = max_bssids
+        self.histories = {}
+        self._tasks = {}
+        self._intervals = {}
+
+    def history(self, interface_index):
+        return self.histories.get(interface_index)
+
+    async def _survey_forever(self, interface_index, interval):
+        history = self.histories[interface_index]
+        while True:
+            started = time.monotonic()
+            try:
+                scan_cache = get_scan_cache()
+                result, _ = await scan_cache.get(interface_index, max_age=interval / 2)
+                # A scan slower than half the interval is still cached on the next tick, recording it
+                # again would count every BSSID twice.
+                if result.scanned_at.timestamp() == history.last_recorded:
+                    result, _ = await scan_cache.get(interface_index, fresh=True)
+                if result.scanned_at.timestamp() != history.last_recorded:
+                    history.record(result.networks, result.scanned_at.timestamp())
+            except LeaseUnavailable:
+                logger.debug("Interface %s is busy with a test, skipping this survey scan.", interface_index)
+            except Exception as e:
+                logger.error("Survey scan on interface %s failed: %s", interface_index, e)
+            await asyncio.sleep(max(interval - (time.monotonic() - started), 0))
+
+    def start(self, interface_index, interval=SURVEY_INTERVAL):
+        """Start surveying an interface, or change its rate when it already is."""
+        self.stop(interface_index)
+        if interface_index not in self.histories:
+            # numpy is only loaded once a survey starts, most deployments never run one.
+            from app.services.signal_history import SignalHistory
+            self.histories[interface_index] = SignalHistory(self.samples, self.max_bssids)
+        self._intervals[interface_index] = interval
+        self._tasks[interface_index] = asyncio.create_task(self._survey_forever(interface_index, interval),
+                                                           name=f"rf-survey-{interface_index}")
+        logger.info("Surveying interface %s every %s seconds.", interface_index, interval)
+
+    def stop(self, interface_index):
+        task = self._tasks.pop(interface_index, None)
+        self._intervals.pop(interface_index, None)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    def start_configured(self, interface_indexes=SURVEY_INTERFACES, interval=SURVEY_INTERVAL):
+        for interface_index in interface_indexes:
+            self.start(interface_index, interval)
+
+    async def stop_all(self):
+        tasks = list(self._tasks.values())
+        for interface_index in list(self._tasks):
+            self.stop(interface_index)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def status(self):
+        return {index: {"running": index in self._tasks, "interval": self._intervals.get(index),
+                        **history.stats()} for index, history in self.histories.items()}
+
+
+_rf_survey = RfSurvey()
+
+
+def get_rf_survey() -> RfSurvey:
+    return _rf_survey
+
+
+Gauge("wifiprobe_survey_bssids", "BSSIDs tracked by the RF survey.", ["interface"],
+      callback=lambda: [({"interface": str(index)}, len(history._rows))
+                        for index, history in _rf_survey.histories.items()])
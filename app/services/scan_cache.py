@@ -0,0 +1,147 @@
+# app/services/scan_cache.py
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Tuple
+
+import orjson
+
+from app.dependencies import SCAN_CACHE_TTL, SCAN_REFRESH_INTERVAL, SCAN_REFRESH_INTERFACES
+from app.schemas.network import NETWORK_FIELDS
+from app.services.executors import run_radio
+from app.services.leases import get_lease_manager, interface_resource, LeaseUnavailable
+from app.services.logger import setup_logger
+from app.services.wifi_service import scan_wifi_networks
+
+# Configure logger
+logger = setup_logger(__name__)
+
+
+class ScanResult:
+    def __init__(self, interface_index, networks):
+        self.interface_index = interface_index
+        self.networks = networks
+        self.scanned_at = datetime.now(timezone.utc)
+        self._monotonic = time.monotonic()
+        self._encoded = {}
+
+    @property
+    def age(self):
+        return time.monotonic() - self._monotonic
+
+    def encode(self, fields=None) -> bytes:
+        """The networks as a JSON array, encoded once per projection while the result is cached."""
+        fields = fields or NETWORK_FIELDS
+        body = self._encoded.get(fields)
+        if body is None:
+            body = self._encoded[fields] = orjson.dumps([network.as_dict(fields) for network in self.networks])
+        return body
+
+    def lines(self, fields=None):
+        """The networks as JSON documents, one per network."""
+        fields = fields or NETWORK_FIELDS
+        return (orjson.dumps(network.as_dict(fields)) for network in self.networks)
+
+
+class ScanCache:
+    """
+    Per-interface cache of scan results. Callers asking for the same interface while a scan is
+    running share that scan instead of starting their own. A scan takes the radio's lease unless
+    the caller already holds it; while a test holds the radio the last result is served however
+    old it is, and LeaseUnavailable is raised when there is none.
+    """
+
+    def __init__(self, ttl=SCAN_CACHE_TTL, scanner=scan_wifi_networks):
+        self.ttl = ttl
+        self._scanner = scanner
+        self._results = {}
+        self._inflight = {}
+        self._refresher = None
+
+    async def get(self, interface_index, max_age=None, fresh=False, lease=None) -> Tuple[ScanResult, bool]:
+        """Return the scan result for an interface and whether it was served from the cache."""
+        max_age = self.ttl if max_age is None else max_age
+        result = self._results.get(interface_index)
+        if not fresh and result is not None and result.age <= max_age:
+            return result, True
+        task = self._inflight.get(interface_index)
+        if task is None:
+            resource = interface_resource(interface_index)
+            held = lease is not None and lease.holds(resource)
+            if not held and get_lease_manager().available(resource) <= 0:
+                # A test is connecting on this radio, scanning now would disturb it.
+                if result is not None:
+                    logger.debug("Interface %s is busy, serving a %.0fs old scan.", interface_index, result.age)
+                    return result, True
+                raise LeaseUnavailable([resource], get_lease_manager().retry_after)
+            task = asyncio.create_task(self._scan(interface_index, take_lease=not held))
+            self._inflight[interface_index] = task
+        else:
+            logger.debug("Joining in-flight scan on interface %s.", interface_index)
+        # Shield the shared scan so one caller disconnecting does not cancel it for the others.
+        return await asyncio.shield(task), False
+
+    async def find(self, interface_index, ssid, max_age=None, lease=None):
+        """
+        The strongest access point broadcasting `ssid` and whether it came from a cached scan.
+        A cached scan that lacks the SSID is repeated once, the network may have just appeared.
+        """
+        result, cached = await self.get(interface_index, max_age=max_age, lease=lease)
+        matches = [network for network in result.networks if network.ssid == ssid]
+        if not matches and cached:
+            result, cached = await self.get(interface_index, fresh=True, lease=lease)
+            matches = [network for network in result.networks if network.ssid == ssid]
+        best = max(matches, key=lambda network: network.signal if network.signal is not None else -1000, default=None)
+        return best, cached
+
+    async def _scan(self, interface_index, take_lease=True):
+        try:
+            if take_lease:
+                async with get_lease_manager().acquire([interface_resource(interface_index)], 0):
+                    networks = await run_radio(self._scanner, interface_index)
+            else:
+                networks = await run_radio(self._scanner, interface_index)
+            result = ScanResult(interface_index, networks)
+            self._results[interface_index] = result
+            return result
+        finally:
+            self._inflight.pop(interface_index, None)
+
+    def invalidate(self, interface_index=None):
+        if interface_index is None:
+            self._results.clear()
+        else:
+            self._results.pop(interface_index, None)
+
+    async def _refresh_forever(self, interval, interface_indexes):
+        while True:
+            for interface_index in interface_indexes:
+                try:
+                    await self.get(interface_index, max_age=interval / 2)
+                except LeaseUnavailable:
+                    logger.debug("Interface %s is busy with a test, skipping its background scan.", interface_index)
+                except Exception as e:
+                    logger.error("Background scan on interface %s failed: %s", interface_index, e)
+            await asyncio.sleep(interval)
+
+    def start_refresher(self, interval=SCAN_REFRESH_INTERVAL, interface_indexes=SCAN_REFRESH_INTERFACES):
+        if interval <= 0 or self._refresher is not None:
+            return
+        logger.info("Refreshing scans on interfaces %s every %s seconds.", interface_indexes, interval)
+        self._refresher = asyncio.create_task(self._refresh_forever(interval, interface_indexes))
+
+    async def stop_refresher(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+
+_scan_cache = ScanCache()
+
+
+def get_scan_cache() -> ScanCache:
+    return _scan_cache
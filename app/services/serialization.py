@@ -0,0 +1,51 @@
+# app/services/serialization.py
+"""
+Response encoding for large listings (scan results, interface inventories): JSON bodies are
+written directly instead of being validated again through a response model, clients can ask
+for a subset of the fields, and NDJSON streams one entry per line.
+"""
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_CHUNK = 64
+
+
+def parse_fields(spec: Optional[str], allowed):
+    """The fields named in a comma separated `fields` parameter, in that order; None for all of them."""
+    if not spec:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in spec.split(",") if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. "
+                                                    f"Available: {', '.join(allowed)}.")
+    return fields or None
+
+
+def wants_ndjson(request: Request, format: Optional[str] = None):
+    if format:
+        return format.lower() == "ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def json_response(body: bytes, headers=None) -> Response:
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def ndjson_response(lines: Iterable[bytes], headers=None) -> StreamingResponse:
+    """Stream pre-encoded entries one per line, a few dozen per chunk to keep the per-write overhead down."""
+
+    def chunks():
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= NDJSON_CHUNK:
+                yield b"\n".join(batch) + b"\n"
+                batch = []
+        if batch:
+            yield b"\n".join(batch) + b"\n"
+
+    return StreamingResponse(chunks(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
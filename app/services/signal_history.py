@@ -0,0 +1,172 @@
+# app/services/signal_history.py
+import time
+
+import numpy as np
+
+from app.dependencies import SURVEY_SAMPLES, SURVEY_MAX_BSSIDS
+
+
+def frequency_to_channel(frequency):
+    """Channel numbers for an array of frequencies in MHz, 0 where the frequency is unknown."""
+    frequency = np.asarray(frequency, dtype=np.int32)
+    return np.select(
+        [frequency == 2484, (frequency >= 2412) & (frequency < 2484), (frequency >= 5150) & (frequency < 5925),
+         frequency >= 5955],
+        [14, (frequency - 2407) // 5, (frequency - 5000) // 5, (frequency - 5950) // 5],
+        0)
+
+
+def _percentiles(ordered, counts, quantiles):
+    """Linearly interpolated quantiles of rows sorted with NaN last, each row holding counts[i] values."""
+    rows = np.arange(len(counts))[:, None]
+    positions = (counts[:, None] - 1) * np.asarray(quantiles)[None, :]
+    below = np.floor(positions).astype(np.intp)
+    above = np.minimum(below + 1, counts[:, None] - 1)
+    fraction = positions - below
+    return ordered[rows, below] * (1 - fraction) + ordered[rows, above] * fraction
+
+
+class SignalHistory:
+    """
+    Fixed-size ring buffer of scans for one interface: one column per scan and one row per BSSID,
+    holding signal (NaN when the BSSID was not seen) and frequency. Memory does not grow with
+    survey length; once every row is taken, the BSSID seen longest ago gives up its row.
+    Aggregates are computed over whole arrays, never per BSSID in Python.
+    """
+
+    def __init__(self, samples=SURVEY_SAMPLES, max_bssids=SURVEY_MAX_BSSIDS):
+        self.samples = samples
+        self.max_bssids = max_bssids
+        self.timestamps = np.full(samples, np.nan)
+        self.signal = np.full((max_bssids, samples), np.nan, dtype=np.float32)
+        self.frequency = np.zeros((max_bssids, samples), dtype=np.uint16)
+        self.last_seen = np.full(max_bssids, -np.inf)
+        self.bssids = [None] * max_bssids
+        self.ssids = [None] * max_bssids
+        self._rows = {}
+        self._head = 0
+        self.scans = 0
+        self.last_recorded = None
+
+    def _row(self, bssid, ssid, at):
+        row = self._rows.get(bssid)
+        if row is None:
+            if len(self._rows) < self.max_bssids:
+                row = len(self._rows)
+            else:
+                row = int(np.argmin(self.last_seen))
+                del self._rows[self.bssids[row]]
+                self.signal[row] = np.nan
+                self.frequency[row] = 0
+            self._rows[bssid] = row
+            self.bssids[row] = bssid
+        self.ssids[row] = ssid
+        # Marked right away so a scan with more BSSIDs than rows never evicts its own.
+        self.last_seen[row] = at
+        return row
+
+    def record(self, networks, at=None):
+        """Add one scan as the newest column, overwriting the oldest once the buffer is full."""
+        at = time.time() if at is None else at
+        column = self._head
+        self.timestamps[column] = at
+        self.signal[:, column] = np.nan
+        self.frequency[:, column] = 0
+        seen = [(self._row(network.bssid, network.ssid, at), network.signal, network.frequency or 0)
+                for network in networks if network.bssid and network.signal is not None]
+        if seen:
+            rows, signals, frequencies = (np.array(values) for values in zip(*seen))
+            self.signal[rows, column] = signals
+            self.frequency[rows, column] = frequencies
+        self._head = (column + 1) % self.samples
+        self.scans += 1
+        self.last_recorded = at
+
+    def _window(self, window):
+        """Chronological column indexes of the scans from the last `window` seconds (all kept scans when None)."""
+        order = (np.arange(self.samples) + self._head) % self.samples
+        stamps = self.timestamps[order]
+        keep = ~np.isnan(stamps)
+        if window is not None:
+            keep &= stamps >= time.time() - window
+        return order[keep]
+
+    def bssid_stats(self, window=None):
+        columns = self._window(window)
+        used = len(self._rows)
+        signal = self.signal[:used][:, columns]
+        present = ~np.isnan(signal)
+        counts = present.sum(axis=1)
+        rows = np.flatnonzero(counts)
+        signal, present, counts = signal[rows], present[rows], counts[rows]
+        stamps = self.timestamps[columns]
+        # One sort per row (NaN last) gives min, max and the percentiles; np.nanpercentile loops per row.
+        ordered = np.sort(signal, axis=1)
+        filled = np.where(present, signal, 0)
+        mean = filled.sum(axis=1) / np.maximum(counts, 1)
+        spread = np.where(present, signal - mean[:, None], 0)
+        quantiles = _percentiles(ordered, counts, (0.1, 0.9)) if rows.size else np.empty((0, 2))
+        stats = {
+            "min": ordered[:, 0] if rows.size else np.empty(0),
+            "max": ordered[np.arange(rows.size), counts - 1] if rows.size else np.empty(0),
+            "mean": mean,
+            "std": np.sqrt((spread ** 2).sum(axis=1) / np.maximum(counts, 1)),
+            "p10": quantiles[:, 0],
+            "p90": quantiles[:, 1],
+        }
+        # Appearing is a scan that sees a BSSID the previous one did not, disappearing the reverse.
+        edges = np.diff(present.astype(np.int8), axis=1)
+        appeared = (edges == 1).sum(axis=1)
+        disappeared = (edges == -1).sum(axis=1)
+        first = stamps[present.argmax(axis=1)] if rows.size else np.empty(0)
+        last = stamps[present.shape[1] - 1 - present[:, ::-1].argmax(axis=1)] if rows.size else np.empty(0)
+        frequency = self.frequency[:used][:, columns][rows].max(axis=1) if rows.size else np.empty(0)
+
+        bssids = []
+        for i, row in enumerate(rows.tolist()):
+            entry = {"bssid": self.bssids[row], "ssid": self.ssids[row], "frequency": int(frequency[i]),
+                     "samples": int(counts[i]), "presence": round(float(counts[i]) / len(columns), 3),
+                     "appeared": int(appeared[i]), "disappeared": int(disappeared[i]),
+                     "first_seen": float(first[i]), "last_seen": float(last[i])}
+            entry.update({name: round(float(values[i]), 2) for name, values in stats.items()})
+            bssids.append(entry)
+        return {"scans": int(columns.size), "from": float(stamps[0]) if columns.size else None,
+                "to": float(stamps[-1]) if columns.size else None, "bssids": bssids}
+
+    def events(self, window=None):
+        """Appear and disappear events in chronological order."""
+        columns = self._window(window)
+        used = len(self._rows)
+        present = ~np.isnan(self.signal[:used][:, columns])
+        edges = np.diff(present.astype(np.int8), axis=1)
+        rows, steps = np.nonzero(edges)
+        order = np.argsort(steps, kind="stable")
+        stamps = self.timestamps[columns]
+        return [{"at": float(stamps[step + 1]), "bssid": self.bssids[row], "ssid": self.ssids[row],
+                 "event": "appeared" if edges[row, step] > 0 else "disappeared"}
+                for row, step in zip(rows[order].tolist(), steps[order].tolist())]
+
+    def channel_occupancy(self, window=None):
+        """Per channel: BSSIDs heard per scan on average, distinct BSSIDs and their mean signal."""
+        columns = self._window(window)
+        used = len(self._rows)
+        signal = self.signal[:used][:, columns]
+        present = ~np.isnan(signal)
+        channels = frequency_to_channel(self.frequency[:used][:, columns])[present]
+        heard = signal[present]
+        rows = np.broadcast_to(np.arange(used)[:, None], present.shape)[present]
+        if not channels.size:
+            return {"scans": int(columns.size), "channels": []}
+        numbers, index = np.unique(channels, return_inverse=True)
+        samples = np.bincount(index)
+        signal_sums = np.bincount(index, weights=heard)
+        distinct = np.bincount(np.unique(np.stack([index, rows]), axis=1)[0], minlength=numbers.size)
+        return {"scans": int(columns.size), "channels": [
+            {"channel": int(numbers[i]), "occupancy": round(float(samples[i]) / columns.size, 3),
+             "bssids": int(distinct[i]), "mean_signal": round(float(signal_sums[i] / samples[i]), 2)}
+            for i in range(numbers.size)]}
+
+    def stats(self):
+        return {"scans": self.scans, "kept": int(np.count_nonzero(~np.isnan(self.timestamps))),
+                "capacity": self.samples, "bssids": len(self._rows), "max_bssids": self.max_bssids,
+                "bytes": int(self.signal.nbytes + self.frequency.nbytes + self.timestamps.nbytes)}
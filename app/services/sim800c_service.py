@@ -1,75 +1,276 @@
 # app/services/sim800c_service.py
+import asyncio
 import re
+import threading
 import time
 from enum import Enum
 
-import serial
-
-from app.dependencies import SERIAL_PORT, BAUD_RATE, OTP_TEMPLATE, OTP_TIMEOUT
+from app.dependencies import SERIAL_PORT, BAUD_RATE, OTP_TEMPLATE, SMS_DELIVERY
 from app.services.logger import setup_logger
+from app.services.sms_pdu import Sms, decode_pdu, parse_text_timestamp
 
 # Configure logger
 logger = setup_logger(__name__)
 
 
-class SmsModem:
+FINAL_RESULT_CODES = ("OK", "ERROR")
+FINAL_ERROR_PREFIXES = ("+CME ERROR:", "+CMS ERROR:")
+URC_PREFIXES = ("+CMTI:", "+CMT:", "+CDS:", "+CBM:", "RING", "+CRING:", "+CLIP:", "NO CARRIER",
+                "+CPIN:", "+CFUN:", "Call Ready", "SMS Ready", "RDY", "UNDER-VOLTAGE", "OVER-VOLTAGE",
+                "NORMAL POWER DOWN")
+# These notifications carry their payload on the line that follows the header.
+URC_WITH_BODY = ("+CMT:", "+CDS:", "+CBM:")
+OTP_PATTERN = re.compile(OTP_TEMPLATE)
+
+
+class ModemError(Exception):
+    pass
+
+
+class AtResponse:
+    def __init__(self, command, lines, final):
+        self.command = command
+        self.lines = lines
+        self.final = final
+
+    @property
+    def ok(self):
+        return self.final == "OK"
+
+    def __repr__(self):
+        return f"AtResponse({self.command!r}, {self.lines!r}, {self.final!r})"
+
+
+class AtStreamParser:
+    """
+    Incremental splitter for the modem byte stream. Bytes are appended as they arrive and only
+    complete lines are decoded, so the stream is scanned once no matter how it is chunked.
+    """
+
     def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        lines = []
+        start = 0
+        while True:
+            end = self._buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line = self._buffer[start:end].strip(b"\r ")
+            if line:
+                lines.append(line.decode("utf-8", errors="replace"))
+            start = end + 1
+        del self._buffer[:start]
+        return lines
+
+
+def _response_prefix(command):
+    # "AT+CMGR=3" answers with "+CMGR: ...", which must not be mistaken for an unsolicited code.
+    match = re.match(r"AT(\+\w+)", command.upper())
+    return match.group(1) + ":" if match else None
+
+
+class ModemManager:
+    """
+    Owns the SIM800C serial port for the lifetime of the process. Commands are queued and sent one
+    at a time, every reply is matched to the command that caused it and unsolicited result codes
+    (+CMTI, RING, ...) are handed to subscribers instead of ending up in a command response.
+    """
+
+    def __init__(self, port=SERIAL_PORT, baudrate=BAUD_RATE, serial_factory=None, delivery=SMS_DELIVERY):
+        self.port = port
+        self.baudrate = baudrate
+        self.delivery = delivery
+        self._serial_factory = serial_factory
+        self._ser = None
+        self._parser = AtStreamParser()
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        self._reader_thread = None
+        self._pending = None
+        self._pending_urc = None
+        self._subscribers = []
+
+    @property
+    def running(self):
+        return self._worker is not None and not self._worker.done()
+
+    @property
+    def pdu_mode(self):
+        """Direct delivery runs the modem in PDU mode so multipart and UCS2 messages arrive intact."""
+        return self.delivery == "direct"
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        if self.running:
+            return
+        logger.debug("Opening modem on %s.", self.port)
+        self._loop = asyncio.get_running_loop()
+        opening = self._loop.run_in_executor(None, self._open)
         try:
-            logger.debug("Initializing the SMS modem.")
-            self.ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-            self.initialize_modem()
-        except serial.SerialException as e:
-            logger.error(f"Failed to initialize modem: {e}")
+            self._ser = await asyncio.shield(opening)
+        except asyncio.CancelledError:
+            # Shut down while the port was opening, close it once the open returns.
+            opening.add_done_callback(lambda done: done.exception() is None and done.result().close())
             raise
-
-    def initialize_modem(self):
+        self._queue = asyncio.Queue()
+        try:
+            self._loop.add_reader(self._ser.fileno(), self._on_readable)
+        except (AttributeError, NotImplementedError, OSError):  # serial.SerialException is an OSError
+            # Ports without a selectable descriptor are read from a helper thread instead.
+            self._reader_thread = threading.Thread(target=self._read_forever, name="modem-reader", daemon=True)
+            self._reader_thread.start()
+        self._worker = asyncio.create_task(self._process_commands(), name="modem-commands")
         try:
-            logger.debug("Setting up the modem configurations.")
-            self.writeline('ATE0')  # Turn off command echo
-            self.writeline('AT+CMGF=1')  # Set SMS to text mode
-            self.writeline('AT+CPMS="SM","SM","SM"')  # Preferred SMS storage
-            self.writeline('AT+CMGDA="DEL ALL"')  # Delete all SMS
-            logger.info("Modem initialized and configured.")
-        except Exception as e:
-            logger.error(f"Failed to configure modem: {e}")
+            await self.initialize_modem()
+        except Exception:
+            await self.stop()
             raise
 
-    def writeline(self, text):
+    def _open(self):
+        serial_factory = self._serial_factory
+        if serial_factory is None:
+            import serial  # only needed once a modem is opened
+            serial_factory = serial.Serial
         try:
-            logger.debug(f"Sending command to modem: {text}")
-            self.ser.write((text + '\r').encode())
-        except serial.SerialTimeoutException as e:
-            logger.error(f"Timeout during sending command to modem: {text}, Error: {e}")
+            return serial_factory(self.port, int(self.baudrate), timeout=0)
+        except OSError as e:
+            logger.error("Failed to open modem: %s", e)
             raise
 
-    def receive(self):
+    async def initialize_modem(self):
+        logger.debug("Setting up the modem configurations.")
+        for command in ('ATE0',  # Turn off command echo
+                        'AT+CMGF=0' if self.pdu_mode else 'AT+CMGF=1',  # PDU or text mode
+                        'AT+CPMS="SM","SM","SM"',  # Preferred SMS storage
+                        # Push new SMS as +CMT, or store them and announce the index with +CMTI
+                        'AT+CNMI=2,2,0,0,0' if self.pdu_mode else 'AT+CNMI=2,1,0,0,0'):
+            response = await self.command(command)
+            if not response.ok:
+                raise ModemError(f"Modem rejected {command}: {response.final}")
+        logger.info("Modem initialized and configured.")
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._ser is not None:
+            if self._reader_thread is None:
+                self._loop.remove_reader(self._ser.fileno())
+            ser, self._ser = self._ser, None
+            ser.close()
+            self._reader_thread = None
+        logger.info("Modem closed.")
+
+    def subscribe(self, prefix, callback):
+        """Call `callback(line, body)` for every unsolicited result code starting with `prefix`."""
+        entry = (prefix, callback)
+        self._subscribers.append(entry)
+        return lambda: self._subscribers.remove(entry)
+
+    async def command(self, command, timeout=5):
+        if not self.running:
+            raise ModemError("Modem is not running.")
+        future = self._loop.create_future()
+        await self._queue.put((command, timeout, future))
+        return await future
+
+    async def _process_commands(self):
+        while True:
+            command, timeout, future = await self._queue.get()
+            if future.cancelled():
+                continue
+            self._pending = (command, _response_prefix(command), [], self._loop.create_future())
+            try:
+                logger.debug("Sending command to modem: %s", command)
+                self._ser.write((command + "\r").encode())
+                response = await asyncio.wait_for(self._pending[3], timeout)
+                if not future.done():
+                    future.set_result(response)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = ModemError(f"Modem did not answer {command} within {timeout} seconds.")
+                logger.error("Modem command %s failed: %s", command, e)
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._pending = None
+
+    def _on_readable(self):
         try:
-            line = self.ser.readline().decode().strip()
-            if line:
-                logger.debug(f"Received line from modem: {line}")
-            return line
-        except Exception as e:
-            logger.error(f"Error reading from modem: {e}")
-
-#    def receive(self):
-#        start_time = time.time()
-#        while True:
-#            logger.debug(f"Waiting for OTP {time.time()}")
-#            if time.time() - start_time > OTP_TIMEOUT:
-#                logger.warning("Timeout reached while waiting for SMS.")
-#                return None
-#            try:
-#                line = self.ser.readline().decode('utf-8').strip()
-#                if line:
-#                    logger.debug(f"Received line from modem: {line}")
-#                    return line
-#            except serial.SerialException as e:
-#                logger.error(f"Error during receiving data from modem: {e}")
-#                raise
-#            except Exception as e:
-#                logger.error(f"Unhandled exception during receiving data from modem: {e}")
-#                raise
-#            time.sleep(1)
+            data = self._ser.read(self._ser.in_waiting or 1)
+        except OSError as e:
+            logger.error("Error reading from modem: %s", e)
+            return
+        self._handle_lines(self._parser.feed(data))
+
+    def _read_forever(self):
+        while self._ser is not None:
+            try:
+                data = self._ser.read(self._ser.in_waiting or 1)
+            except Exception as e:
+                logger.error("Error reading from modem: %s", e)
+                break
+            if data:
+                self._loop.call_soon_threadsafe(self._handle_lines, self._parser.feed(data))
+            else:
+                time.sleep(0.05)
+
+    def _handle_lines(self, lines):
+        for line in lines:
+            self._handle_line(line)
+
+    def _handle_line(self, line):
+        logger.debug("Received line from modem: %s", line)
+        if self._pending_urc is not None:
+            header, self._pending_urc = self._pending_urc, None
+            self._dispatch(header, line)
+            return
+        pending = self._pending
+        if pending is not None:
+            command, prefix, lines, done = pending
+            if line == command:
+                return  # command echo
+            if line in FINAL_RESULT_CODES or line.startswith(FINAL_ERROR_PREFIXES):
+                if not done.done():
+                    done.set_result(AtResponse(command, lines, line))
+                return
+            if prefix and line.startswith(prefix):
+                lines.append(line)
+                return
+            if prefix and any(header.startswith(prefix) for header in lines):
+                # Past the response header the lines are message text, which may well begin with "RING".
+                lines.append(line)
+                return
+        if line.startswith(URC_WITH_BODY):
+            self._pending_urc = line
+            return
+        if line.startswith(URC_PREFIXES) or pending is None:
+            self._dispatch(line, None)
+            return
+        pending[2].append(line)
+
+    def _dispatch(self, line, body):
+        delivered = False
+        for prefix, callback in list(self._subscribers):
+            if line.startswith(prefix):
+                delivered = True
+                try:
+                    callback(line, body)
+                except Exception as e:
+                    logger.error("Unsolicited result code handler failed for %s: %s", line, e, exc_info=True)
+        if not delivered:
+            logger.debug("Unhandled unsolicited result code: %s", line)
 
 
 class Indication(Enum):
@@ -82,11 +283,11 @@ class Indication(Enum):
 
 
 def message_type(message):
-    logger.debug(f"Evaluating message type: {message}")
+    logger.debug("Evaluating message type: %s", message)
     if message:
         if "+CMTI" in message:
             index = re.search(r'\d+', message).group()
-            logger.info(f"New SMS received: {index}")
+            logger.info("New SMS received: %s", index)
             return Indication.RX_SMS, index
         if "OK" in message:
             return Indication.OK, None
@@ -96,63 +297,72 @@ def message_type(message):
     return Indication.UNKNOWN, message
 
 
-def process_sms(modem, index):
-    logger.info(f"Processing SMS at index: {index}")
-    modem.writeline(f"AT+CMGR={index}")
-    sms_content = ""
-    while True:
-        line = modem.receive()
-        if "+CMGR:" in line:
-            continue
-        elif "OK" in line:
-            break
-        elif line:
-            sms_content += line + "\n"
-    logger.info(f"SMS content received: {sms_content.strip()}")
-    return sms_content.strip()
+def parse_sms(response):
+    """Message text of an AT+CMGR response, without the +CMGR header."""
+    return "\n".join(line for line in response.lines if not line.startswith("+CMGR:")).strip()
+
+
+def _text_header(header, sender_field):
+    # +CMGR: "REC UNREAD","+91...","","24/01/31,18:05:09+22", +CMGL: 1,"REC UNREAD","+91...",...
+    # and +CMT: "+91...","","24/01/31,18:05:09+22"
+    fields = re.findall(r'"([^"]*)"', header)
+    sender = fields[sender_field] if len(fields) > sender_field else ""
+    timestamp = parse_text_timestamp(fields[-1]) if fields else None
+    return sender, timestamp
 
 
-def extract_otp(sms_content):
+def parse_message(header, body, pdu_mode):
+    """An Sms from a +CMGR/+CMGL/+CMT header and the line(s) that follow it."""
+    if pdu_mode:
+        return decode_pdu(body)
+    sender_field = 0 if header.startswith("+CMT:") else 1
+    sender, timestamp = _text_header(header, sender_field)
+    return Sms(sender, body.strip(), timestamp)
+
+
+async def process_sms(modem, index):
+    logger.info("Processing SMS at index: %s", index)
+    response = await modem.command(f"AT+CMGR={index}")
+    if not response.ok or not response.lines:
+        raise ModemError(f"Could not read SMS {index}: {response.final}")
+    sms = parse_message(response.lines[0], parse_sms(response), modem.pdu_mode)
+    logger.info("SMS received from %s: %s", sms.sender, sms.text)
+    await modem.command(f"AT+CMGD={index}")
+    return sms
+
+
+async def read_stored_sms(modem):
+    """
+    Every message already in SIM storage, as (index, Sms) pairs. Messages that arrived while the
+    app was down are read instead of wiped so a pending OTP is not lost.
+    """
+    response = await modem.command("AT+CMGL=4" if modem.pdu_mode else 'AT+CMGL="ALL"', timeout=15)
+    if not response.ok:
+        raise ModemError(f"Could not list stored SMS: {response.final}")
+    entries = []
+    for line in response.lines:
+        if line.startswith("+CMGL:"):
+            entries.append((line, []))
+        elif entries:
+            entries[-1][1].append(line)
+    messages = []
+    for header, body in entries:
+        index = int(re.search(r"\d+", header).group())
+        try:
+            sms = parse_message(header, "\n".join(body), modem.pdu_mode)
+        except ValueError as e:
+            logger.warning("Unreadable stored SMS %s: %s", index, e)
+            sms = None
+        messages.append((index, sms))
+    return messages
+
+
+def extract_otp(sms_content, pattern=OTP_PATTERN):
     logger.debug("Extracting OTP from SMS content.")
-    match = re.search(OTP_TEMPLATE, sms_content)
+    match = pattern.search(sms_content)
     if match:
         otp = match.group(1)
-        logger.info(f"OTP extracted: {otp}")
+        logger.info("OTP extracted: %s", otp)
         return otp
-    logger.warning("No OTP found in the SMS content.")
+    logger.debug("No OTP found in the SMS content.")
     return None
-
-
-def receive_otp(sms_modem):
-    logger.info("Waiting to receive OTP.")
-    start_time = time.time()
-    while time.time() - start_time < OTP_TIMEOUT:
-        line = sms_modem.receive()
-        if line:
-            indication, info = message_type(line)
-            if indication == Indication.RX_SMS:
-                sms_content = process_sms(sms_modem, info)
-                logger.debug(f"Received SMS content: {sms_content}")
-                otp = extract_otp(sms_content)
-                if otp:
-                    return otp
-    logger.warning("OTP reception timed out.")
-    return None
-
-#def receive_otp(sms_modem):
-#    logger.info("Trying to recieve OTP")
-#    start_time = time.time()
-#    otp = None
-#    while otp is None:
-#        if time.time() - start_time > OTP_TIMEOUT:
-#            logger.warning("Timeout reached while waiting for SMS.")
-#            return None
-#        line = sms_modem.receive()
-#        logger.info(f'{line}')
-#        logger.debug(f'{time.time()}')
-#        indication, info = message_type(line)
-#        if indication == Indication.RX_SMS:
-#            sms_content = process_sms(sms_modem, info)
-#            logger.debug(f"Recieved SMS content: {sms_content}.")
-#            otp = extract_otp(sms_content)
-#    return otp
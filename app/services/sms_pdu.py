@@ -0,0 +1,189 @@
+# app/services/sms_pdu.py
+"""
+Decoding of SMS-DELIVER PDUs (3GPP TS 23.040) as the SIM800C hands them out in PDU mode,
+and reassembly of concatenated messages.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+# GSM 03.38 default alphabet, indexed by septet value.
+GSM7_BASIC = ("@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞ\x1bÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+              "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà")
+GSM7_ESCAPE = 0x1B
+GSM7_EXTENSION = {0x0A: "\f", 0x14: "^", 0x28: "{", 0x29: "}", 0x2F: "\\", 0x3C: "[", 0x3D: "~",
+                  0x3E: "]", 0x40: "|", 0x65: "€"}
+
+ALPHABET_GSM7 = "gsm7"
+ALPHABET_8BIT = "8bit"
+ALPHABET_UCS2 = "ucs2"
+
+# Information elements of the user data header that carry concatenation info.
+IE_CONCAT_8BIT_REF = 0x00
+IE_CONCAT_16BIT_REF = 0x08
+
+
+class Sms:
+    """A received message, or one part of a concatenated message when `parts` > 1."""
+
+    def __init__(self, sender, text, timestamp=None, reference=None, part=1, parts=1):
+        self.sender = sender
+        self.text = text
+        self.timestamp = timestamp
+        self.reference = reference
+        self.part = part
+        self.parts = parts
+
+    def __repr__(self):
+        return f"Sms({self.sender!r}, {self.text!r}, part={self.part}/{self.parts})"
+
+
+def unpack_septets(data, count, skip=0):
+    """The first `count` 7-bit values packed into `data`, ignoring the first `skip` of them."""
+    value = int.from_bytes(data, "little")
+    return [(value >> (7 * i)) & 0x7F for i in range(skip, count)]
+
+
+def decode_gsm7(septets):
+    chars = []
+    escaped = False
+    for septet in septets:
+        if escaped:
+            chars.append(GSM7_EXTENSION.get(septet, " "))
+            escaped = False
+        elif septet == GSM7_ESCAPE:
+            escaped = True
+        else:
+            chars.append(GSM7_BASIC[septet])
+    return "".join(chars)
+
+
+def _semi_octets(data):
+    digits = []
+    for octet in data:
+        digits.append(octet & 0x0F)
+        digits.append(octet >> 4)
+    return digits
+
+
+def _decode_address(data, length, address_type):
+    if address_type & 0x70 == 0x50:  # alphanumeric sender such as "VM-RLWIRE"
+        return decode_gsm7(unpack_septets(data, length * 4 // 7))
+    number = "".join(str(digit) for digit in _semi_octets(data) if digit < 10)[:length]
+    return "+" + number if address_type & 0x70 == 0x10 else number
+
+
+def _decode_timestamp(data):
+    digits = _semi_octets(data)
+    year, month, day, hour, minute, second = (digits[i] * 10 + digits[i + 1] for i in range(0, 12, 2))
+    # Quarter hours from UTC, with the sign in bit 3 of the first digit.
+    quarters = (digits[12] & 0x07) * 10 + digits[13]
+    offset = timedelta(minutes=15 * quarters) * (-1 if digits[12] & 0x08 else 1)
+    try:
+        return datetime(2000 + year, month, day, hour, minute, second, tzinfo=timezone(offset))
+    except ValueError:
+        return None
+
+
+def parse_text_timestamp(text):
+    """Timestamp of a text mode header such as "24/01/31,18:05:09+22" (offset in quarter hours)."""
+    try:
+        stamp = datetime.strptime(text[:17], "%y/%m/%d,%H:%M:%S")
+        quarters = int(text[17:])
+    except (ValueError, IndexError):
+        return None
+    return stamp.replace(tzinfo=timezone(timedelta(minutes=15 * quarters)))
+
+
+def _alphabet(dcs):
+    group = dcs & 0xF0
+    if group & 0xC0 == 0x00 or group & 0xC0 == 0x40:  # general data coding, possibly auto-deleted
+        return (ALPHABET_GSM7, ALPHABET_8BIT, ALPHABET_UCS2, ALPHABET_GSM7)[(dcs >> 2) & 0x03]
+    if group == 0xE0:
+        return ALPHABET_UCS2
+    if group == 0xF0:
+        return ALPHABET_8BIT if dcs & 0x04 else ALPHABET_GSM7
+    return ALPHABET_GSM7  # message waiting groups
+
+
+def _concatenation(header):
+    position = 0
+    while position + 2 <= len(header):
+        element, length = header[position], header[position + 1]
+        value = header[position + 2:position + 2 + length]
+        if element == IE_CONCAT_8BIT_REF and length == 3:
+            return value[0], value[1], value[2]
+        if element == IE_CONCAT_16BIT_REF and length == 4:
+            return (value[0] << 8) | value[1], value[2], value[3]
+        position += 2 + length
+    return None, 1, 1
+
+
+def decode_pdu(hex_pdu):
+    """
+    Decode an SMS-DELIVER PDU, including the leading SMSC address the modem prepends.
+    Raises ValueError for anything that is not a well-formed SMS-DELIVER.
+    """
+    try:
+        pdu = bytes.fromhex(hex_pdu.strip())
+        position = 1 + pdu[0]  # SMSC address
+        first_octet = pdu[position]
+        if first_octet & 0x03 != 0x00:
+            raise ValueError(f"Not an SMS-DELIVER PDU (message type {first_octet & 0x03}).")
+        address_length, address_type = pdu[position + 1], pdu[position + 2]
+        position += 3
+        address_octets = (address_length + 1) // 2
+        sender = _decode_address(pdu[position:position + address_octets], address_length, address_type)
+        position += address_octets
+        dcs = pdu[position + 1]
+        timestamp = _decode_timestamp(pdu[position + 2:position + 9])
+        user_data_length = pdu[position + 9]
+        user_data = pdu[position + 10:]
+    except IndexError:
+        raise ValueError("Truncated PDU.") from None
+
+    header = b""
+    if first_octet & 0x40:  # user data header present
+        header = user_data[1:1 + user_data[0]]
+    reference, parts, part = _concatenation(header)
+    alphabet = _alphabet(dcs)
+    if alphabet == ALPHABET_GSM7:
+        # The header is padded to a septet boundary and counts towards the septet length.
+        skip = ((len(header) + 1) * 8 + 6) // 7 if header else 0
+        text = decode_gsm7(unpack_septets(user_data, user_data_length, skip))
+    else:
+        body = user_data[len(header) + 1 if header else 0:user_data_length]
+        text = body.decode("utf-16-be", errors="replace") if alphabet == ALPHABET_UCS2 else body.decode("latin-1")
+    return Sms(sender, text, timestamp, reference, part, parts)
+
+
+class SmsAssembler:
+    """Joins the parts of concatenated messages; parts still missing after `timeout` seconds are dropped."""
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+        self._partial = {}
+
+    def add(self, sms):
+        """The complete message once `sms` finishes one, otherwise None."""
+        if sms.parts <= 1:
+            return sms
+        key = (sms.sender, sms.reference, sms.parts)
+        received, parts = self._partial.setdefault(key, (time.monotonic(), {}))
+        parts[sms.part] = sms
+        if len(parts) < sms.parts:
+            return None
+        del self._partial[key]
+        ordered = [parts[number] for number in sorted(parts)]
+        return Sms(sms.sender, "".join(part.text for part in ordered), ordered[0].timestamp, sms.reference)
+
+    def expire(self):
+        """Drop incomplete messages older than the timeout and return how many were dropped."""
+        deadline = time.monotonic() - self.timeout
+        expired = [key for key, (received, _) in self._partial.items() if received < deadline]
+        for key in expired:
+            del self._partial[key]
+        return len(expired)
+
+    @property
+    def pending(self):
+        return len(self._partial)
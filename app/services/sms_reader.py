@@ -0,0 +1,317 @@
+# app/services/sms_reader.py
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager, AsyncExitStack
+
+from app.dependencies import MODEMS, OTP_BUFFER_TTL, SMS_SENDERS, SMS_CONCAT_TIMEOUT, MODEM_LEASE_TIMEOUT
+from app.services.leases import get_lease_manager
+from app.services.logger import setup_logger
+from app.services.metrics import Gauge, PORTAL_EVENTS
+from app.services.sim800c_service import (ModemManager, extract_otp, process_sms, read_stored_sms, parse_message,
+                                          message_type, Indication, OTP_PATTERN)
+from app.services.sms_pdu import SmsAssembler
+
+# Configure logger
+logger = setup_logger(__name__)
+
+
+class SmsReader:
+    """
+    Long-lived subscriber to one modem's new message notifications: +CMT carries the message
+    itself, +CMTI only its storage index, which is then fetched. Messages from senders outside
+    `senders` are ignored, multipart messages are joined and the result is handed to the oldest
+    test whose OTP pattern it matches. Messages nobody is waiting for are kept for `buffer_ttl` seconds.
+    """
+
+    def __init__(self, modem, mobile_number=None, buffer_ttl=OTP_BUFFER_TTL, senders=SMS_SENDERS,
+                 concat_timeout=SMS_CONCAT_TIMEOUT):
+        self.modem = modem
+        self.mobile_number = mobile_number
+        self.buffer_ttl = buffer_ttl
+        self.senders = senders
+        self._assembler = SmsAssembler(concat_timeout)
+        self._unsubscribe = None
+        self._tasks = set()
+        self._waiters = {}
+        self._buffer = deque()
+        self._starting = asyncio.Lock()
+
+    @property
+    def running(self):
+        return self._unsubscribe is not None and self.modem.running
+
+    async def start(self):
+        # The warm-up and the first OTP request may both try to open the modem.
+        async with self._starting:
+            if self.running:
+                return
+            await self.modem.start()
+            if self._unsubscribe is None:
+                # Matches both +CMTI: and +CMT:.
+                self._unsubscribe = self.modem.subscribe("+CMT", self._on_new_sms)
+            await self._read_stored()
+        logger.info("SMS reader started.")
+
+    async def _read_stored(self):
+        try:
+            messages = await read_stored_sms(self.modem)
+        except Exception as e:
+            logger.error("Failed to read stored SMS: %s", e)
+            return
+        for index, sms in messages:
+            if sms is not None:
+                self._receive(sms, recovered=True)
+            # A message left behind is read again on the next start, the others still get deleted.
+            try:
+                response = await self.modem.command(f"AT+CMGD={index}")
+            except Exception as e:
+                logger.error("Failed to delete stored SMS %s: %s", index, e)
+                continue
+            if not response.ok:
+                logger.error("Failed to delete stored SMS %s: %s", index, response.final)
+        if messages:
+            logger.info("Read %s SMS left in SIM storage.", len(messages))
+
+    async def stop(self):
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        for task in list(self._tasks):
+            task.cancel()
+        await self.modem.stop()
+        for future, _ in self._waiters.values():
+            future.cancel()
+        self._waiters.clear()
+        logger.info("SMS reader stopped.")
+
+    def _on_new_sms(self, line, body):
+        if line.startswith("+CMT:"):
+            self._on_delivered_sms(line, body)
+            return
+        indication, index = message_type(line)
+        if indication != Indication.RX_SMS:
+            return
+        task = asyncio.create_task(self._fetch(index))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_delivered_sms(self, line, body):
+        try:
+            sms = parse_message(line, body or "", self.modem.pdu_mode)
+        except ValueError as e:
+            logger.error("Failed to decode delivered SMS: %s", e)
+            return
+        self._receive(sms)
+
+    async def _fetch(self, index):
+        try:
+            sms = await process_sms(self.modem, index)
+        except Exception as e:
+            logger.error("Failed to read SMS %s: %s", index, e)
+            return
+        self._receive(sms)
+
+    def _received_at(self, sms):
+        """Monotonic time an SMS from storage reached the modem, by its own timestamp."""
+        now = time.monotonic()
+        if sms.timestamp is None:
+            return now
+        age = (datetime.now(timezone.utc) - sms.timestamp).total_seconds()
+        return now - max(age, 0.0)
+
+    def _receive(self, sms, recovered=False):
+        if self.senders and not any(sender in (sms.sender or "").upper() for sender in self.senders):
+            logger.info("Ignoring SMS from %s.", sms.sender)
+            return
+        dropped = self._assembler.expire()
+        if dropped:
+            logger.warning("Dropped %s incomplete multipart SMS.", dropped)
+        complete = self._assembler.add(sms)
+        if complete is None:
+            logger.debug("Waiting for the rest of multipart SMS %s from %s (%s/%s).",
+                         sms.reference, sms.sender, sms.part, sms.parts)
+            return
+        self._deliver(complete.text, self._received_at(complete) if recovered else None, recovered)
+
+    def _purge(self):
+        expires = time.monotonic() - self.buffer_ttl
+        # Messages from storage are stamped with their own, older, time so the buffer is not ordered.
+        if any(entry[0] < expires for entry in self._buffer):
+            self._buffer = deque(entry for entry in self._buffer if entry[0] >= expires)
+
+    def _deliver(self, sms_content, received=None, recovered=False):
+        for key, (future, pattern) in list(self._waiters.items()):
+            if future.done():
+                continue
+            otp = extract_otp(sms_content, pattern)
+            if otp:
+                logger.info("Delivering OTP to test %s.", key)
+                PORTAL_EVENTS.inc(event="otp_received")
+                future.set_result(otp)
+                del self._waiters[key]
+                return
+        logger.info("No test is waiting for this SMS, buffering it.")
+        self._purge()
+        self._buffer.append((time.monotonic() if received is None else received, sms_content, recovered))
+
+    @property
+    def resource(self):
+        """Name of this modem's slot in the lease manager."""
+        return f"modem:{self.modem.port}"
+
+    @property
+    def leased(self):
+        return get_lease_manager().held(self.resource) > 0
+
+    def expect_otp(self, key, since=None, pattern=OTP_PATTERN):
+        """
+        Register interest in the next OTP matching `pattern` before triggering it, so an SMS that
+        arrives while the caller is still busy is not lost. Only buffered messages received after
+        `since` are accepted, except those read back from SIM storage at start-up: they predate
+        every waiter, so any of them younger than the buffer TTL is accepted.
+        """
+        future = asyncio.get_running_loop().create_future()
+        since = time.monotonic() if since is None else since
+        self._purge()
+        for entry in self._buffer:
+            received, content, recovered = entry
+            otp = extract_otp(content, pattern) if received >= since or recovered else None
+            if otp:
+                self._buffer.remove(entry)
+                future.set_result(otp)
+                break
+        self._waiters[key] = (future, pattern)
+        return future
+
+    async def wait_for_otp(self, key, timeout, pattern=OTP_PATTERN):
+        waiter = self._waiters.get(key)
+        if waiter is not None:
+            future = waiter[0]
+        else:
+            future = self.expect_otp(key, since=time.monotonic() - self.buffer_ttl, pattern=pattern)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("OTP reception timed out for test %s.", key)
+            PORTAL_EVENTS.inc(event="otp_timeout")
+            return None
+        finally:
+            self._waiters.pop(key, None)
+
+    def discard(self, key):
+        waiter = self._waiters.pop(key, None)
+        if waiter is not None:
+            waiter[0].cancel()
+
+
+class NoModemForNumber(Exception):
+    pass
+
+
+def parse_modems(spec):
+    """(port, baud rate, mobile number or None) for every entry of a MODEMS setting."""
+    modems = []
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        port, baudrate, number = (entry.split("|") + ["", ""])[:3]
+        modems.append((port.strip(), baudrate.strip() or "115200", number.strip() or None))
+    return modems
+
+
+class SmsReaderPool:
+    """
+    One SmsReader per SIM800C. A test leases the modem holding its mobile number, or the next free
+    modem when it does not care which SIM receives the OTP, and keeps it from requesting the OTP
+    until it has been read. Modems are slots of the lease manager, so a browser flow can take its
+    modem together with a browser. OTPs are handed out in arrival order, so tests sharing a SIM must take
+    turns or they could swap codes; tests on different SIMs run side by side.
+    """
+
+    def __init__(self, readers):
+        self.readers = readers
+        for reader in readers:
+            get_lease_manager().set_capacity(reader.resource, 1)
+
+    @classmethod
+    def from_config(cls, spec=MODEMS):
+        return cls([SmsReader(ModemManager(port, baudrate), number) for port, baudrate, number in parse_modems(spec)])
+
+    @property
+    def running(self):
+        return any(reader.running for reader in self.readers)
+
+    @property
+    def mobile_numbers(self):
+        return [reader.mobile_number for reader in self.readers if reader.mobile_number]
+
+    async def start(self):
+        """Start every modem. Fails only when none of them comes up, the others are retried on lease."""
+        results = await asyncio.gather(*(reader.start() for reader in self.readers), return_exceptions=True)
+        errors = []
+        for reader, result in zip(self.readers, results):
+            if isinstance(result, Exception):
+                logger.error("Modem on %s not started: %s", reader.modem.port, result)
+                errors.append(result)
+        if errors and len(errors) == len(self.readers):
+            raise errors[0]
+
+    async def stop(self):
+        await asyncio.gather(*(reader.stop() for reader in self.readers))
+
+    def _candidates(self, mobile_number):
+        if mobile_number is None:
+            return [reader for reader in self.readers if reader.mobile_number]
+        bound = [reader for reader in self.readers if reader.mobile_number == mobile_number]
+        # A modem without a configured number serves any number, as a single modem always did.
+        return bound or [reader for reader in self.readers if reader.mobile_number is None]
+
+    def serves(self, mobile_number):
+        return bool(self._candidates(mobile_number))
+
+    def modem_need(self, mobile_number=None):
+        """The lease manager need for any modem able to receive `mobile_number`'s OTP."""
+        candidates = self._candidates(mobile_number)
+        if not candidates:
+            raise NoModemForNumber(f"No modem holds the SIM for {mobile_number}." if mobile_number else
+                                   "No modem has a configured mobile number, the test must name one.")
+        return tuple(reader.resource for reader in candidates)
+
+    @asynccontextmanager
+    async def lease(self, mobile_number=None, lease=None, timeout=MODEM_LEASE_TIMEOUT):
+        """
+        Yield (reader, mobile number) for exclusive use until the OTP has been read. A modem already
+        held by `lease` is used and handed back on exit, otherwise one is acquired. Raises
+        LeaseUnavailable when none frees up within `timeout`.
+        """
+        need = self.modem_need(mobile_number)
+        async with AsyncExitStack() as scope:
+            if lease is None or not any(lease.holds(name) for name in need):
+                lease = await scope.enter_async_context(get_lease_manager().acquire([need], timeout))
+            reader = next(reader for reader in self.readers if reader.resource in need and lease.holds(reader.resource))
+            # The rest of the lease (the browser) is still needed after the OTP has been read.
+            scope.callback(lease.release, reader.resource)
+            if not reader.running:
+                await reader.start()
+            yield reader, mobile_number or reader.mobile_number
+
+    def stats(self):
+        return [{"port": reader.modem.port, "mobile_number": reader.mobile_number, "running": reader.running,
+                 "leased": reader.leased, "queue_depth": reader.modem.queue_depth} for reader in self.readers]
+
+
+_sms_readers = SmsReaderPool.from_config()
+
+
+def get_sms_readers() -> SmsReaderPool:
+    return _sms_readers
+
+
+Gauge("wifiprobe_modem_queue_depth", "AT commands waiting for the modem.", ["port"],
+      callback=lambda: [({"port": reader.modem.port}, reader.modem.queue_depth) for reader in _sms_readers.readers])
+Gauge("wifiprobe_modem_running", "Whether the modem is open and answering commands.", ["port"],
+      callback=lambda: [({"port": reader.modem.port}, int(reader.running)) for reader in _sms_readers.readers])
+Gauge("wifiprobe_modem_leased", "Whether a test holds the modem for an OTP exchange.", ["port"],
+      callback=lambda: [({"port": reader.modem.port}, int(reader.leased)) for reader in _sms_readers.readers])
@@ -0,0 +1,167 @@
+# app/services/test_pipeline.py
+import time
+import uuid
+
+import httpx
+
+from app.dependencies import PORTAL_MODE, DRIVER_CHECKOUT_TIMEOUT, LEASE_WAIT_TIMEOUT
+from app.services.connectivity_probe import ProbeOutcome, get_connectivity_probe
+from app.services.executors import run_browser, run_radio
+from app.services.leases import get_lease_manager, interface_resource, LeaseUnavailable
+from app.services.logger import setup_logger
+from app.services.metrics import TESTS_IN_FLIGHT, TEST_OUTCOMES, PORTAL_EVENTS
+from app.services.portal_direct import DirectPortalLogin, PortalStructureChanged
+from app.services.portal_flow import select_profile, run_portal_flow
+from app.services.network_service import get_interface_inventory
+from app.services.progress import step, report
+from app.services.scan_cache import get_scan_cache
+from app.services.selenium_utils import checkout_driver, open_captive_portal
+from app.services.wifi_service import connect_to_network, list_wifi_interfaces, get_interface_ipv4
+
+# Configure logger
+logger = setup_logger(__name__)
+
+
+class WiFiTestError(Exception):
+    def __init__(self, status_code, detail, headers=None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers
+
+
+class HardwareBusy(WiFiTestError):
+    def __init__(self, error):
+        super().__init__(429, str(error), {"Retry-After": str(error.retry_after)})
+
+
+async def free_wifi_interfaces(candidates=None):
+    indexes = [index for index, _ in await run_radio(list_wifi_interfaces)]
+    if candidates is not None:
+        indexes = [index for index in indexes if index in candidates]
+    leases = get_lease_manager()
+    return [index for index in indexes if leases.available(interface_resource(index)) > 0]
+
+
+async def login_through_portal(portal_url, mobile_number, sms_readers, test_id, local_address=None):
+    """
+    Replay the portal's HTTP API when PORTAL_MODE allows it and the profile describes one,
+    otherwise or on failure drive a browser.
+    """
+    profile = select_profile(portal_url)
+    portal_url = portal_url or profile.url
+    report("portal_profile", "selected", profile=profile.name)
+    if PORTAL_MODE == "direct" or (PORTAL_MODE == "auto" and profile.direct):
+        try:
+            return await DirectPortalLogin(profile, portal_url, local_address).login(mobile_number, sms_readers,
+                                                                                      test_id)
+        except (PortalStructureChanged, httpx.HTTPError) as e:
+            if PORTAL_MODE == "direct":
+                raise WiFiTestError(502, f"Direct portal login failed: {e}")
+            logger.warning("Direct portal login failed, falling back to the browser: %s", e)
+            PORTAL_EVENTS.inc(event="direct_fallback")
+    # The browser and the modem are taken together, so a test holding a browser never sits on it
+    # waiting for a modem another test holds while waiting for a browser.
+    needs = ["browser"] + ([sms_readers.modem_need(mobile_number)] if profile.needs_otp else [])
+    async with get_lease_manager().acquire(needs, DRIVER_CHECKOUT_TIMEOUT) as lease:
+        async with checkout_driver(lease) as driver:
+            with step("open_portal"):
+                load = await run_browser(open_captive_portal, driver, portal_url)
+            report("open_portal", "page", **load)
+            return await run_portal_flow(driver, profile, mobile_number, sms_readers, test_id, local_address,
+                                         lease)
+
+
+async def run_wifi_test(interface_index, ssid, password, mobile_number, sms_readers, test_id=None,
+                        wait=LEASE_WAIT_TIMEOUT):
+    """
+    Scan, connect, detect the captive portal and log in for one SSID on one radio. Without a
+    mobile number the OTP goes to whichever configured SIM is free. A radio busy with another
+    test is waited for up to `wait` seconds, None waits until it is free.
+    Raises WiFiTestError with the HTTP status that describes the failure, 429 when hardware stayed busy.
+    """
+    test_id = test_id or uuid.uuid4().hex
+    if not sms_readers.serves(mobile_number):
+        raise WiFiTestError(400, f"No modem holds the SIM for {mobile_number}." if mobile_number else
+                            "No modem has a configured mobile number, mobile_number is required.")
+    try:
+        async with get_lease_manager().acquire([interface_resource(interface_index)], wait) as lease:
+            return await _run_wifi_test(interface_index, ssid, password, mobile_number, sms_readers, test_id,
+                                        lease)
+    except LeaseUnavailable as e:
+        raise HardwareBusy(e)
+
+
+async def _run_wifi_test(interface_index, ssid, password, mobile_number, sms_readers, test_id, lease):
+    TESTS_IN_FLIGHT.inc()
+    outcome = "error"
+    try:
+        # Step 1: Find the desired SSID in a recent scan, or scan for it
+        logger.debug("Looking for SSID '%s' on interface %s", ssid, interface_index)
+        with step("scan", interface_index=interface_index):
+            network, cached = await get_scan_cache().find(interface_index, ssid, lease=lease)
+        if network is None:
+            logger.error("SSID '%s' not found.", ssid)
+            outcome = "ssid_not_found"
+            raise WiFiTestError(404, f"SSID '{ssid}' not found.")
+        report("scan", "result", cached=cached, bssid=network.bssid, signal=network.signal)
+        logger.debug("SSID '%s' found, strongest access point %s.", ssid, network.bssid)
+
+        # Step 2: Connect to the network, through its strongest access point
+        logger.debug("Trying to connect to SSID '%s'.", ssid)
+        with step("connect", ssid=ssid, bssid=network.bssid):
+            connection_result = await run_radio(connect_to_network, interface_index, ssid, password,
+                                                network.bssid)
+        report("connect", "result", reused=connection_result.get("reused", False))
+        if not connection_result.get("reused"):
+            # Association and addressing just changed, the cached inventory no longer matches.
+            get_interface_inventory().invalidate()
+        if not connection_result.get("connected"):
+            logger.error("Failed to connect to SSID '%s'.", ssid)
+            outcome = "connect_failed"
+            raise WiFiTestError(400, "Failed to connect to the network.")
+        logger.debug("Successfully connected to SSID '%s'.", ssid)
+
+        # Step 3: Check for a captive portal through this radio, a browser is only needed when there is one
+        interface_name = dict(await run_radio(list_wifi_interfaces)).get(interface_index)
+        local_address = await run_radio(get_interface_ipv4, interface_name) if interface_name else None
+        with step("portal_detection"):
+            result = await get_connectivity_probe().check(local_address=local_address)
+        report("portal_detection", "result", outcome=result.outcome.value, portal_url=result.portal_url)
+        if result.outcome == ProbeOutcome.ONLINE:
+            outcome = "online"
+            return {"message": "Internet access granted"}
+        if result.outcome == ProbeOutcome.OFFLINE:
+            outcome = "offline"
+            raise WiFiTestError(400, "No internet access and no captive portal detected")
+
+        # Step 4: Log in through the portal
+        portal_result = await login_through_portal(result.portal_url, mobile_number, sms_readers, test_id,
+                                                   local_address)
+        if portal_result and portal_result.get("Internet Connection"):
+            outcome = "portal_login"
+            return {"message": "Internet access granted"}
+        outcome = "login_failed"
+        raise WiFiTestError(400, "Failed to gain internet access")
+    except LeaseUnavailable:
+        outcome = "busy"
+        raise
+    finally:
+        TESTS_IN_FLIGHT.dec()
+        TEST_OUTCOMES.inc(outcome=outcome)
+
+
+async def run_timed_wifi_test(interface_index, target, sms_readers):
+    started = time.monotonic()
+    outcome = {"interface_index": interface_index, "ssid": target.ssid}
+    try:
+        outcome.update(await run_wifi_test(interface_index, target.ssid, target.password,
+                                           target.mobile_number, sms_readers, wait=None))
+        outcome["success"] = True
+    except WiFiTestError as e:
+        outcome.update({"success": False, "status_code": e.status_code, "detail": e.detail})
+    except Exception as e:
+        logger.error("Test of '%s' on interface %s failed: %s", target.ssid, interface_index, e, exc_info=True)
+        outcome.update({"success": False, "status_code": 500, "detail": str(e)})
+    outcome["elapsed"] = round(time.monotonic() - started, 3)
+    return outcome
@@ -0,0 +1,117 @@
+# app/services/warmup.py
+import asyncio
+import time
+
+from app.dependencies import WARMUP, SCAN_REFRESH_INTERFACES
+from app.services.driver_pool import get_driver_pool
+from app.services.executors import run_radio
+from app.services.logger import setup_logger
+from app.services.metrics import Gauge
+from app.services.network_service import get_interface_inventory
+from app.services.scan_cache import get_scan_cache
+from app.services.sms_reader import get_sms_readers
+from app.services.wifi_service import warm_wifi_backends
+
+# Configure logger
+logger = setup_logger(__name__)
+
+
+async def warm_browser():
+    pool = get_driver_pool()
+    idle = await asyncio.get_running_loop().run_in_executor(None, pool.warm)
+    if pool.size and not idle:
+        raise RuntimeError("No browser could be launched.")
+    return {"browsers": idle}
+
+
+async def warm_modem():
+    readers = get_sms_readers()
+    await readers.start()
+    return {"modems": sum(reader.running for reader in readers.readers)}
+
+
+async def warm_wifi():
+    names = await run_radio(warm_wifi_backends)
+    await run_radio(get_interface_inventory().snapshot)
+    return {"interfaces": names}
+
+
+async def warm_scan():
+    for interface_index in SCAN_REFRESH_INTERFACES:
+        await get_scan_cache().get(interface_index)
+    return {"interfaces": SCAN_REFRESH_INTERFACES}
+
+
+WARMERS = {
+    "browser": warm_browser,
+    "modem": warm_modem,
+    "wifi": warm_wifi,
+    "scan": warm_scan,
+}
+
+
+class WarmUp:
+    """
+    Prepares the slow backends in the background once the server is up, so it binds its port
+    straight away and the first test does not pay for launching Chrome or opening the modem.
+    Every component runs on its own; one failing leaves the others warm and is retried on
+    first use as before.
+    """
+
+    def __init__(self, components=WARMUP):
+        unknown = [name for name in components if name not in WARMERS]
+        if unknown:
+            logger.warning("Ignoring unknown warm-up components: %s", ", ".join(unknown))
+        self.components = [name for name in components if name in WARMERS]
+        self._status = {name: {"state": "pending"} for name in self.components}
+        self._tasks = []
+        self._started_at = None
+
+    def start(self):
+        if self._tasks:
+            return
+        self._started_at = time.monotonic()
+        self._tasks = [asyncio.create_task(self._run(name), name=f"warmup-{name}") for name in self.components]
+
+    async def _run(self, name):
+        status = self._status[name]
+        status["state"] = "running"
+        started = time.monotonic()
+        try:
+            status["detail"] = await WARMERS[name]()
+            status["state"] = "ready"
+        except asyncio.CancelledError:
+            status["state"] = "cancelled"
+            raise
+        except Exception as e:
+            logger.error("Warm-up of %s failed: %s", name, e)
+            status.update(state="failed", error=str(e))
+        status["seconds"] = round(time.monotonic() - started, 3)
+        if status["state"] == "ready":
+            logger.info("Warmed up %s in %.2fs.", name, status["seconds"])
+
+    @property
+    def ready(self):
+        return all(status["state"] == "ready" for status in self._status.values())
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "uptime": round(time.monotonic() - self._started_at, 3) if self._started_at else 0.0,
+            "components": {name: dict(status) for name, status in self._status.items()},
+        }
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+_warm_up = WarmUp()
+
+
+def get_warm_up() -> WarmUp:
+    return _warm_up
+
+
+Gauge("wifiprobe_ready", "Whether every configured backend has warmed up.", callback=lambda: int(_warm_up.ready))
@@ -1,26 +1,71 @@
 # app/services/wifi_service.py
+import socket
+import threading
 import time
 from typing import List
 
-from pywifi import PyWiFi, const, Profile
+import psutil
 from fastapi import HTTPException
 
-from app.schemas.network import Network
+from app.dependencies import WIFI_BACKEND, WIFI_CONNECT_TIMEOUT, PYWIFI_SCAN_WAIT
+from app.schemas.network import ScanRecord
 from app.services.logger import setup_logger
+from app.services.wpa_ctrl import get_wpa_ctrl, WpaCtrlError
 
 # Configure logger
 logger = setup_logger(__name__)
 
+# pywifi is imported on first use, like selenium and pyserial, so start-up does not pay for it.
+_pywifi_factory = None
+# pywifi cannot tell which network an interface is on, so remember the SSID each one was last
+# connected to, and the password of the profile kept per (interface, SSID).
+_associations = {}
+_profiles = {}
+_state_lock = threading.Lock()
 
-def scan_wifi_networks(interface_index: int = 0) -> List[Network]:
-    wifi = PyWiFi()
+
+def set_pywifi_factory(factory):
+    """Replace PyWiFi, e.g. with the simulated radios under bench/."""
+    global _pywifi_factory
+    _pywifi_factory = factory
+
+
+def get_pywifi():
+    global _pywifi_factory
+    if _pywifi_factory is None:
+        from pywifi import PyWiFi
+        _pywifi_factory = PyWiFi
+    return _pywifi_factory()
+
+
+def _wpa_ctrl_for(iface):
+    if WIFI_BACKEND == "pywifi":
+        return None
+    ctrl = get_wpa_ctrl(iface.name())
+    if ctrl is None and WIFI_BACKEND == "wpa_ctrl":
+        logger.warning("No wpa_supplicant control socket for %s, falling back to pywifi.", iface.name())
+    return ctrl
+
+
+def scan_wifi_networks(interface_index: int = 0) -> List[ScanRecord]:
+    wifi = get_pywifi()
     if interface_index >= len(wifi.interfaces()):
         logger.error("Interface index out of range")
         return []
 
     iface = wifi.interfaces()[interface_index]
+    ctrl = _wpa_ctrl_for(iface)
+    if ctrl is not None:
+        try:
+            networks = [ScanRecord(**network_from_scan_row(row)) for row in ctrl.scan()]
+            logger.info("Scan completed on interface %s. Found %s networks.", iface.name(), len(networks))
+            return networks
+        except WpaCtrlError as e:
+            logger.warning("wpa_supplicant scan failed on %s, falling back to pywifi: %s", iface.name(), e)
+
+    from pywifi import const
     iface.scan()
-    time.sleep(5)  # Sleep to allow for scan to complete
+    time.sleep(PYWIFI_SCAN_WAIT)  # Sleep to allow for scan to complete
     results = iface.scan_results()
 
     networks = []
@@ -35,15 +80,28 @@ def scan_wifi_networks(interface_index: int = 0) -> List[Network]:
                 "auth_algorithm": convert_auth_algorithm(net.auth if hasattr(net, 'auth') else [const.AUTH_ALG_OPEN]),
                 "network_type": "Infrastructure"  # Assuming all scanned networks are infrastructure type
             }
-            networks.append(Network(**network_data))
+            networks.append(ScanRecord(**network_data))
         except Exception as e:
-            logger.error(f"Error processing network data: {e}", exc_info=True)
+            logger.error("Error processing network data: %s", e, exc_info=True)
 
-    logger.info(f"Scan completed on interface {iface.name()}. Found {len(networks)} networks.")
+    logger.info("Scan completed on interface %s. Found %s networks.", iface.name(), len(networks))
     return networks
 
 
+def network_from_scan_row(row):
+    return {
+        "ssid": row["ssid"],
+        "bssid": row["bssid"],
+        "signal": row["signal"],
+        "frequency": row["frequency"],
+        "security": convert_scan_flags(row["flags"]),
+        "auth_algorithm": "Open",
+        "network_type": "Infrastructure",
+    }
+
+
 def convert_auth_algorithm(auth_alg):
+    from pywifi import const
     # Convert the list to a tuple to make it hashable if it's not already a string or tuple
     if isinstance(auth_alg, list):
         auth_alg = tuple(auth_alg)
@@ -56,6 +114,7 @@ def convert_auth_algorithm(auth_alg):
 
 
 def convert_security_type(akm_type):
+    from pywifi import const
     return {
         const.AKM_TYPE_NONE: 'None',
         const.AKM_TYPE_WPA: 'WPA',
@@ -65,31 +124,123 @@ def convert_security_type(akm_type):
     }.get(akm_type, 'Unknown')
 
 
+def convert_scan_flags(flags):
+    # Same precedence as pywifi, which keeps the last AKM it recognises.
+    for marker, security in (("WPA2-EAP", 'WPA2'), ("WPA-EAP", 'WPA'), ("WPA2-PSK", 'WPA2-PSK'), ("WPA-PSK", 'WPA-PSK')):
+        if marker in flags:
+            return security
+    if "WEP" in flags or "SAE" in flags or "RSN" in flags or "WPA" in flags:
+        return 'Unknown'
+    return 'None'
+
+
+def list_wifi_interfaces():
+    """Index and name of every Wi-Fi interface, in the order used by interface_index."""
+    return [(index, iface.name()) for index, iface in enumerate(get_pywifi().interfaces())]
+
+
+def warm_wifi_backends():
+    """Enumerate the radios and open their wpa_supplicant control connections ahead of the first test."""
+    names = []
+    for iface in get_pywifi().interfaces():
+        ctrl = _wpa_ctrl_for(iface)
+        if ctrl is not None:
+            ctrl.open()
+        names.append(iface.name())
+    if not names:
+        raise ValueError("No Wi-Fi interfaces available")
+    return names
+
+
+def get_interface_ipv4(interface_name):
+    for addr in psutil.net_if_addrs().get(interface_name, []):
+        if addr.family == socket.AF_INET:
+            return addr.address
+    return None
+
+
 def get_best_wifi_interface():
-    wifi = PyWiFi()
+    wifi = get_pywifi()
     if not wifi.interfaces():
         logger.error("No Wi-Fi interfaces found.")
         raise HTTPException(status_code=404, detail="No Wi-Fi interfaces available.")
     
     # Example criteria: choose the first available interface that is not connected
+    from pywifi import const
     for iface in wifi.interfaces():
         if iface.status() == const.IFACE_DISCONNECTED:
-            logger.info(f"Selected interface {iface.name()} as the best available option.")
+            logger.info("Selected interface %s as the best available option.", iface.name())
             return iface
     
     logger.warning("No suitable Wi-Fi interface found, selecting default.")
     return wifi.interfaces()[0]  # default to the first interface if none are disconnected
 
 
-def connect_to_network(interface_index: int, ssid: str, password: str = None):
-    wifi = PyWiFi()
+def _wait_for_status(iface, wanted, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        status = iface.status()
+        if status in wanted or time.monotonic() >= deadline:
+            return status
+        time.sleep(0.25)
+
+
+def _already_connected(iface, ctrl, ssid, bssid):
+    if ctrl is not None:
+        try:
+            return ctrl.associated_with(ssid, bssid)
+        except WpaCtrlError:
+            return False
+    from pywifi import const
+    with _state_lock:
+        return iface.status() == const.IFACE_CONNECTED and _associations.get(iface.name()) == ssid
+
+
+def _profile_for(iface, profile):
+    """The profile kept for this SSID when its password still matches, otherwise a fresh one."""
+    key = (iface.name(), profile.ssid)
+    kept = [p for p in iface.network_profiles() if (p.ssid or "").strip('"') == profile.ssid]
+    with _state_lock:
+        if kept and key in _profiles and _profiles[key] == profile.key:
+            return kept[0]
+        for stale in kept:
+            iface.remove_network_profile(stale)
+        _profiles[key] = profile.key
+    return iface.add_network_profile(profile)
+
+
+def connect_to_network(interface_index: int, ssid: str, password: str = None, bssid: str = None):
+    """
+    Associate with `ssid`, preferring access point `bssid` when the backend can pin one. A radio
+    that is already on the network is left alone and profiles are kept per SSID for the next time.
+    """
+    wifi = get_pywifi()
     if interface_index >= len(wifi.interfaces()):
         logger.error("Interface index out of range")
         raise HTTPException(status_code=404, detail="Interface index out of range.")
 
     iface = wifi.interfaces()[interface_index]
-    iface.disconnect()
-    time.sleep(1)  # ensure the interface is disconnected
+    ctrl = _wpa_ctrl_for(iface)
+    if _already_connected(iface, ctrl, ssid, bssid):
+        logger.info("Interface %s is already connected to '%s', reusing the association.", iface.name(), ssid)
+        return {"connected": True, "reused": True, "status": "Already connected to the network"}
+    if ctrl is not None:
+        try:
+            logger.debug("Attempting to connect to network")
+            if ctrl.connect(ssid, password, bssid):
+                logger.info("Connected to the network successfully")
+                return {"connected": True, "status": "Connected to the network successfully"}
+            logger.warning("Failed to connect to the network")
+            return {"connected": False, "status": "Failed to connect to the network"}
+        except WpaCtrlError as e:
+            logger.warning("wpa_supplicant connect failed on %s, falling back to pywifi: %s", iface.name(), e)
+
+    from pywifi import const, Profile
+    with _state_lock:
+        _associations.pop(iface.name(), None)
+    if iface.status() not in (const.IFACE_DISCONNECTED, const.IFACE_INACTIVE):
+        iface.disconnect()
+        _wait_for_status(iface, (const.IFACE_DISCONNECTED, const.IFACE_INACTIVE), 1)  # ensure the interface is disconnected
 
     profile = Profile()
     profile.ssid = ssid
@@ -108,14 +259,16 @@ def connect_to_network(interface_index: int, ssid: str, password: str = None):
         logger.error("Password required for secured network")
         raise HTTPException(status_code=400, detail="Password required for secured network")
 
-    iface.remove_all_network_profiles()
-    tmp_profile = iface.add_network_profile(profile)
+    tmp_profile = _profile_for(iface, profile)
 
     logger.debug("Attempting to connect to network")
     iface.connect(tmp_profile)
-    time.sleep(10)  # wait for connection to establish
+    # Poll instead of sleeping a fixed time, a fast association returns straight away.
+    status = _wait_for_status(iface, (const.IFACE_CONNECTED,), WIFI_CONNECT_TIMEOUT)
 
-    if iface.status() == const.IFACE_CONNECTED:
+    if status == const.IFACE_CONNECTED:
+        with _state_lock:
+            _associations[iface.name()] = ssid
         logger.info("Connected to the network successfully")
         return {"connected": True, "status": "Connected to the network successfully"}
     else:
@@ -0,0 +1,266 @@
+# app/services/wpa_ctrl.py
+import itertools
+import os
+import re
+import select
+import socket
+import tempfile
+import threading
+import time
+
+from app.dependencies import WPA_CTRL_DIR, WIFI_SCAN_TIMEOUT, WIFI_CONNECT_TIMEOUT
+from app.services.logger import setup_logger
+
+# Configure logger
+logger = setup_logger(__name__)
+
+REPLY_SIZE = 8192
+_socket_ids = itertools.count()
+
+
+class WpaCtrlError(Exception):
+    pass
+
+
+def _bind_client(ctrl_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    local_path = os.path.join(tempfile.gettempdir(), f"wifiprobe-{os.getpid()}-{next(_socket_ids)}")
+    if os.path.exists(local_path):
+        os.unlink(local_path)
+    sock.bind(local_path)
+    try:
+        sock.connect(ctrl_path)
+    except OSError:
+        sock.close()
+        os.unlink(local_path)
+        raise
+    return sock, local_path
+
+
+def _decode_ssid(ssid):
+    # wpa_supplicant escapes non-printable SSID bytes as \xNN.
+    if "\\" not in ssid:
+        return ssid
+    raw = re.sub(rb"\\x([0-9a-fA-F]{2})", lambda m: bytes([int(m.group(1), 16)]),
+                 ssid.encode("latin-1", errors="replace"))
+    raw = raw.replace(b'\\"', b'"').replace(b"\\\\", b"\\")
+    return raw.decode("utf-8", errors="replace")
+
+
+class WpaCtrl:
+    """
+    Client for one interface's wpa_supplicant control socket. One socket carries requests, a second
+    one is ATTACHed and receives CTRL-EVENT-* notifications, so callers can wait for an event with a
+    deadline instead of sleeping.
+    """
+
+    def __init__(self, interface_name, ctrl_dir=WPA_CTRL_DIR):
+        self.interface_name = interface_name
+        self.ctrl_path = os.path.join(ctrl_dir, interface_name)
+        self._request_sock = None
+        self._monitor_sock = None
+        self._paths = []
+        self._open_lock = threading.Lock()
+        self._request_lock = threading.Lock()
+        # Scans and connects on one radio must not consume each other's events.
+        self.operation_lock = threading.Lock()
+        # Network id and password of the network kept for each SSID, reused by later connects.
+        self._networks = {}
+
+    @staticmethod
+    def available(interface_name, ctrl_dir=WPA_CTRL_DIR):
+        return os.path.exists(os.path.join(ctrl_dir, interface_name))
+
+    def open(self):
+        if self._request_sock is not None:
+            return
+        # Several executor threads may make the first request at once, only one of them binds.
+        with self._open_lock:
+            if self._request_sock is not None:
+                return
+            try:
+                monitor_sock, monitor_path = _bind_client(self.ctrl_path)
+                self._paths.append(monitor_path)
+                self._monitor_sock = monitor_sock
+                monitor_sock.send(b"ATTACH")
+                if self._recv(monitor_sock, 5, skip_events=True) != "OK":
+                    raise WpaCtrlError(f"wpa_supplicant refused ATTACH on {self.interface_name}")
+                request_sock, request_path = _bind_client(self.ctrl_path)
+                self._paths.append(request_path)
+                # Set last, the unlocked check above takes a request socket to mean fully open.
+                self._request_sock = request_sock
+            except WpaCtrlError:
+                self.close()
+                raise
+            except OSError as e:
+                self.close()
+                raise WpaCtrlError(f"Cannot open control socket {self.ctrl_path}: {e}")
+        logger.info("Attached to wpa_supplicant control socket for %s.", self.interface_name)
+
+    def close(self):
+        for sock in (self._request_sock, self._monitor_sock):
+            if sock is not None:
+                sock.close()
+        self._request_sock = self._monitor_sock = None
+        for path in self._paths:
+            if os.path.exists(path):
+                os.unlink(path)
+        self._paths = []
+
+    @staticmethod
+    def _recv(sock, timeout, skip_events=False):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+                raise WpaCtrlError("Timed out waiting for wpa_supplicant")
+            reply = sock.recv(REPLY_SIZE).decode("utf-8", errors="replace")
+            if skip_events and reply.startswith("<"):
+                continue
+            return reply.strip()
+
+    def request(self, command, timeout=5):
+        self.open()
+        with self._request_lock:
+            try:
+                self._request_sock.send(command.encode())
+                reply = self._recv(self._request_sock, timeout, skip_events=True)
+            except OSError as e:
+                self.close()
+                raise WpaCtrlError(f"{command} failed on {self.interface_name}: {e}")
+        if reply.startswith("FAIL"):
+            raise WpaCtrlError(f"{command} failed on {self.interface_name}: {reply}")
+        return reply
+
+    def drain_events(self):
+        self.open()
+        while select.select([self._monitor_sock], [], [], 0)[0]:
+            self._monitor_sock.recv(REPLY_SIZE)
+
+    def wait_event(self, prefixes, deadline):
+        """Return the first event starting with one of `prefixes`, or None once `deadline` passes."""
+        self.open()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self._monitor_sock], [], [], remaining)[0]:
+                return None
+            event = self._monitor_sock.recv(REPLY_SIZE).decode("utf-8", errors="replace").strip()
+            # Strip the "<3>" priority marker.
+            event = re.sub(r"^<\d+>", "", event)
+            logger.debug("wpa_supplicant event on %s: %s", self.interface_name, event)
+            if event.startswith(prefixes):
+                return event
+
+    def status(self):
+        status = {}
+        for line in self.request("STATUS").splitlines():
+            key, _, value = line.partition("=")
+            status[key] = value
+        return status
+
+    def scan(self, timeout=WIFI_SCAN_TIMEOUT):
+        with self.operation_lock:
+            deadline = time.monotonic() + timeout
+            self.drain_events()
+            try:
+                self.request("SCAN")
+            except WpaCtrlError as e:
+                # A scan that is already running finishes with the same event.
+                if "FAIL-BUSY" not in str(e):
+                    raise
+            event = self.wait_event(("CTRL-EVENT-SCAN-RESULTS", "CTRL-EVENT-SCAN-FAILED"), deadline)
+            if event is None or event.startswith("CTRL-EVENT-SCAN-FAILED"):
+                logger.warning("Scan on %s did not complete: %s", self.interface_name, event or 'timed out')
+            return self.scan_results()
+
+    def scan_results(self):
+        rows = []
+        # bssid / frequency / signal level / flags / ssid
+        for line in self.request("SCAN_RESULTS").splitlines()[1:]:
+            values = line.split("\t")
+            if len(values) < 4:
+                continue
+            rows.append({
+                "bssid": values[0],
+                "frequency": int(values[1]),
+                "signal": int(values[2]),
+                "flags": values[3],
+                "ssid": _decode_ssid(values[4]) if len(values) > 4 else "",
+            })
+        return rows
+
+    def disconnect(self, timeout=5):
+        with self.operation_lock:
+            if self.status().get("wpa_state") in ("DISCONNECTED", "INACTIVE", "INTERFACE_DISABLED"):
+                return True
+            self.drain_events()
+            self.request("DISCONNECT")
+            return self.wait_event(("CTRL-EVENT-DISCONNECTED",), time.monotonic() + timeout) is not None
+
+    def associated_with(self, ssid, bssid=None):
+        """Whether the interface is already associated with `ssid` (and `bssid`, when given)."""
+        status = self.status()
+        if status.get("wpa_state") != "COMPLETED" or _decode_ssid(status.get("ssid", "")) != ssid:
+            return False
+        return bssid is None or status.get("bssid", "").lower() == bssid.lower()
+
+    def _network_for(self, ssid, password):
+        # Keep one configured network per SSID instead of wiping them all on every connect.
+        known = self._networks.get(ssid)
+        configured = {line.split("\t")[0] for line in self.request("LIST_NETWORKS").splitlines()[1:]}
+        if known is not None and known[0] in configured:
+            if known[1] == password:
+                return known[0]
+            self.request(f"REMOVE_NETWORK {known[0]}")
+        network_id = self.request("ADD_NETWORK")
+        self.request(f"SET_NETWORK {network_id} ssid {ssid.encode().hex()}")
+        if password and re.fullmatch(r"[0-9a-fA-F]{64}", password):
+            self.request(f"SET_NETWORK {network_id} psk {password}")
+        elif password:
+            self.request(f'SET_NETWORK {network_id} psk "{password}"')
+        else:
+            self.request(f"SET_NETWORK {network_id} key_mgmt NONE")
+        self._networks[ssid] = (network_id, password)
+        return network_id
+
+    def connect(self, ssid, password=None, bssid=None, timeout=WIFI_CONNECT_TIMEOUT):
+        with self.operation_lock:
+            deadline = time.monotonic() + timeout
+            network_id = self._network_for(ssid, password)
+            # Aim at the access point picked from the scan, or let wpa_supplicant choose.
+            self.request(f"SET_NETWORK {network_id} bssid {bssid or 'any'}")
+            self.drain_events()
+            self.request(f"SELECT_NETWORK {network_id}")
+            # Dropping the previous association also reports DISCONNECTED, so only give up early
+            # when the network we just selected is rejected (e.g. a wrong key).
+            event = self.wait_event(("CTRL-EVENT-CONNECTED", "CTRL-EVENT-SSID-TEMP-DISABLED"), deadline)
+            if event is None:
+                logger.warning("Timed out connecting %s to %s.", self.interface_name, ssid)
+                return False
+            if event.startswith("CTRL-EVENT-CONNECTED"):
+                return True
+            logger.warning("Connecting %s to %s failed: %s", self.interface_name, ssid, event)
+            return False
+
+
+_controls = {}
+_controls_lock = threading.Lock()
+
+
+def get_wpa_ctrl(interface_name):
+    """Shared control connection for an interface, or None when wpa_supplicant does not manage it."""
+    with _controls_lock:
+        ctrl = _controls.get(interface_name)
+        if ctrl is None:
+            if not WpaCtrl.available(interface_name):
+                return None
+            ctrl = WpaCtrl(interface_name)
+            _controls[interface_name] = ctrl
+        return ctrl
+
+
+def close_wpa_ctrls():
+    with _controls_lock:
+        for ctrl in _controls.values():
+            ctrl.close()
+        _controls.clear()
@@ -0,0 +1,105 @@
+# bench/fake_wifi.py
+import threading
+import time
+
+from pywifi import const, Profile
+
+
+def make_network(ssid, bssid, signal=-55, freq=2437, password=None):
+    network = Profile()
+    network.ssid = ssid
+    network.bssid = bssid
+    network.signal = signal
+    network.freq = freq
+    network.akm = [const.AKM_TYPE_WPA2PSK] if password else [const.AKM_TYPE_NONE]
+    network.auth = [const.AUTH_ALG_OPEN]
+    network.key = password
+    return network
+
+
+class FakeInterface:
+    """Simulated radio with the parts of pywifi's Interface the app calls."""
+
+    def __init__(self, name, networks, connect_delay=1.0, on_connect=None):
+        self._name = name
+        self._networks = networks
+        self.connect_delay = connect_delay
+        self.on_connect = on_connect
+        self._status = const.IFACE_DISCONNECTED
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def name(self):
+        return self._name
+
+    def scan(self):
+        self._status = const.IFACE_SCANNING
+
+    def scan_results(self):
+        if self._status == const.IFACE_SCANNING:
+            self._status = const.IFACE_DISCONNECTED
+        return list(self._networks)
+
+    def status(self):
+        return self._status
+
+    def disconnect(self):
+        with self._lock:
+            self._generation += 1
+            self._status = const.IFACE_DISCONNECTED
+
+    def remove_all_network_profiles(self):
+        self._profiles = []
+
+    def remove_network_profile(self, profile):
+        self._profiles = [kept for kept in self._profiles if kept is not profile]
+
+    def add_network_profile(self, profile):
+        self._profiles.append(profile)
+        return profile
+
+    def network_profiles(self):
+        return list(self._profiles)
+
+    def connect(self, profile):
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._status = const.IFACE_CONNECTING
+        network = next((net for net in self._networks if net.ssid == profile.ssid), None)
+        accepted = network is not None and (network.key is None or network.key == profile.key)
+
+        def associate():
+            time.sleep(self.connect_delay)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self._status = const.IFACE_CONNECTED if accepted else const.IFACE_DISCONNECTED
+            if accepted and self.on_connect is not None:
+                self.on_connect(self._name, profile.ssid)
+
+        threading.Thread(target=associate, daemon=True).start()
+
+
+class FakeWiFi:
+    """
+    Drop-in for the PyWiFi class: install with
+    app.services.wifi_service.set_pywifi_factory(FakeWiFi(...)). Calling the instance returns
+    itself, so every PyWiFi() in the app sees the same simulated radios.
+    """
+
+    def __init__(self, interface_count=2, networks=None, connect_delay=1.0, on_connect=None):
+        networks = networks or [
+            make_network("RailWire", "02:00:00:00:00:01", -48),
+            make_network("RailWire", "02:00:00:00:00:02", -71, 5180),
+            make_network("HomeNet", "02:00:00:00:00:03", -60, password="secret123"),
+        ]
+        self._interfaces = [FakeInterface(f"wlansim{n}", networks, connect_delay, on_connect)
+                            for n in range(interface_count)]
+
+    def __call__(self):
+        return self
+
+    def interfaces(self):
+        return self._interfaces
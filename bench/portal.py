@@ -0,0 +1,173 @@
+# bench/portal.py
+import json
+import random
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+OTP_SMS = "Railwire WiFi OTP sponsored by BPCL is {otp}"
+FREE_PLAN_EXHAUSTED = "Free plan limit exhausted for the day"
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>RailWire Wi-Fi</title>
+<meta name="csrf-token" content="%(token)s">
+<style>.step { display: none; } #start { display: block; }</style></head>
+<body>
+<input type="hidden" name="portal_id" value="railwire-sim">
+<div id="start" class="step">
+  <button id="connect" disabled><span>Connect To Wi-Fi</span></button>
+</div>
+<div id="phone" class="step">
+  <input class="phoneNumber" type="tel">
+  <button class="enter-btn">Send Code</button>
+</div>
+<div id="otp" class="step">
+  <input class="form-control" type="number" placeholder="Enter OTP">
+  <button class="verify-btn btn btn-primary">Verify</button>
+</div>
+<div id="ad" class="step">
+  <button id="skip">Skip Ad to Connect WiFi</button>
+</div>
+<div id="done" class="step">
+  <span class="wifi-connect">Congratulations!!! You are connected to RailWire WIFI</span>
+</div>
+<script>
+function show(id) {
+  document.querySelectorAll(".step").forEach(el => el.style.display = "none");
+  document.getElementById(id).style.display = "block";
+}
+function post(path, body) {
+  const token = document.querySelector("meta[name=csrf-token]").content;
+  return fetch(path, {method: "POST", headers: {"Content-Type": "application/json", "X-CSRF-Token": token},
+                      body: JSON.stringify(body || {})})
+    .then(r => r.json());
+}
+setTimeout(() => document.getElementById("connect").disabled = false, %(button_delay_ms)d);
+document.getElementById("connect").onclick = () => show("phone");
+document.querySelector(".enter-btn").onclick = () =>
+  post("/api/request-otp", {number: document.querySelector(".phoneNumber").value})
+    .then(r => show(r.otp_required ? "otp" : "ad"));
+document.querySelector(".verify-btn").onclick = () =>
+  post("/api/verify", {otp: document.querySelector("#otp input").value}).then(r => { if (r.ok) show("ad"); });
+document.getElementById("skip").onclick = () =>
+  post("/api/skip-ad").then(r => { if (r.alert) { alert(r.alert); } else { show("done"); } });
+</script>
+</body></html>
+"""
+
+
+class PortalSimulator:
+    """
+    Local copy of the Railwire captive portal. Until a client logs in, /generate_204 redirects
+    to /portal like the real network does; the portal walks through "Connect To Wi-Fi", the
+    phone number, the OTP (sent through `send_sms(number, text)`) and "Skip Ad". API calls need the session
+    cookie and csrf token handed out with the page, like the real portal. In "open" mode the
+    network is online from the start and no browser is needed.
+    """
+
+    def __init__(self, mode="captive", send_sms=None, button_delay=0.0, otp_required=True,
+                 free_plan_exhausted=False):
+        self.mode = mode
+        self.send_sms = send_sms
+        self.button_delay = button_delay
+        self.otp_required = otp_required
+        self.free_plan_exhausted = free_plan_exhausted
+        self.logged_in = mode == "open"
+        self._otps = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self.logins = 0
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="portal-sim", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self, *_):
+        """Forget the login, e.g. when a simulated radio reassociates."""
+        with self._lock:
+            self.logged_in = self.mode == "open"
+
+    def _request_otp(self, number):
+        if not self.otp_required:
+            return {"otp_required": False}
+        otp = f"{random.randint(0, 999999):06d}"
+        with self._lock:
+            self._otps[number] = otp
+        if self.send_sms is not None:
+            self.send_sms(number, OTP_SMS.format(otp=otp))
+        return {"otp_required": True}
+
+    def _verify(self, otp):
+        with self._lock:
+            number = next((number for number, issued in self._otps.items() if issued == otp), None)
+            if number is not None:
+                del self._otps[number]
+        return {"ok": number is not None}
+
+    def _skip_ad(self):
+        if self.free_plan_exhausted:
+            return {"alert": FREE_PLAN_EXHAUSTED}
+        with self._lock:
+            self.logged_in = True
+            self.logins += 1
+        return {"ok": True}
+
+    def _handler(self):
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b"", content_type="text/html", headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                if status != 204:
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if status != 204:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/generate_204"):
+                    if portal.logged_in:
+                        self._send(204)
+                    else:
+                        self._send(302, headers=[("Location", f"{portal.url}/portal")])
+                elif self.path.startswith("/portal"):
+                    session, token = secrets.token_hex(8), secrets.token_hex(16)
+                    with portal._lock:
+                        portal._sessions[session] = token
+                    page = PAGE % {"button_delay_ms": int(portal.button_delay * 1000), "token": token}
+                    self._send(200, page.encode(), headers=[("Set-Cookie", f"session={session}; Path=/")])
+                else:
+                    self._send(404, b"not found", "text/plain")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                session = self.headers.get("Cookie", "").partition("session=")[2].split(";")[0]
+                if not session or portal._sessions.get(session) != self.headers.get("X-CSRF-Token"):
+                    self._send(403, b'{"error": "invalid session"}', "application/json")
+                    return
+                if self.path == "/api/request-otp":
+                    result = portal._request_otp(body.get("number"))
+                elif self.path == "/api/verify":
+                    result = portal._verify(body.get("otp"))
+                elif self.path == "/api/skip-ad":
+                    result = portal._skip_ad()
+                else:
+                    self._send(404, b"not found", "text/plain")
+                    return
+                self._send(200, json.dumps(result).encode(), "application/json")
+
+        return Handler
@@ -0,0 +1,233 @@
+# bench/run.py
+"""
+Drive the app against the simulators and report latency percentiles per endpoint and per
+pipeline step, throughput and peak memory.
+
+    python -m bench.run --scenario test-wifi --requests 20 --concurrency 2
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import orjson
+import psutil
+
+from bench.fake_wifi import FakeWiFi
+from bench.portal import PortalSimulator
+from bench.sim800c import Sim800cSimulator
+
+MOBILE_NUMBER = "99999999{:02d}"
+SCENARIOS = ("interfaces", "scan", "probe", "test-wifi", "mixed")
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples) if samples else None,
+        "p50": percentile(samples, 0.50),
+        "p95": percentile(samples, 0.95),
+        "p99": percentile(samples, 0.99),
+        "max": max(samples) if samples else None,
+    }
+
+
+class MemorySampler:
+    """Peak RSS of this process plus its children (chromedriver and Chrome)."""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        self.peak = max(self.peak, total)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def configure_environment(args, modems, portal):
+    # app.dependencies reads these at import time.
+    os.environ.update({
+        "MODEMS": ",".join(f"{sim.port}|115200|{number}" for number, sim in modems.items()),
+        "SMS_DELIVERY": args.sms_delivery,
+        "PROBE_TARGETS": f"{portal.url}/generate_204|204",
+        "CAPTIVE_PORTAL_URL": f"{portal.url}/portal",
+        # The simulated portal's API, so logins can skip the browser.
+        "PORTAL_MODE": os.environ.get("PORTAL_MODE", "auto"),
+        "PORTAL_API_REQUEST_OTP": "/api/request-otp",
+        "PORTAL_API_VERIFY_OTP": "/api/verify",
+        "PORTAL_API_SKIP_AD": "/api/skip-ad",
+        "WIFI_BACKEND": "pywifi",
+        "PYWIFI_SCAN_WAIT": str(args.scan_delay),
+        "NETLINK_WATCH": "0",
+        "SCAN_REFRESH_INTERVAL": "0",
+        "DRIVER_POOL_SIZE": str(args.browsers),
+        "JOB_DB_PATH": os.path.join(tempfile.mkdtemp(prefix="wifiprobe-bench-"), "jobs.sqlite3"),
+        "LOGGING_LEVEL": args.log_level,
+    })
+
+
+def build_requests(scenario, interface_count):
+    """Endless (label, method, path, body) generator for `scenario`, spread over the radios."""
+    n = 0
+    while True:
+        index = n % interface_count
+        kind = scenario if scenario != "mixed" else ("interfaces", "scan", "probe")[n % 3]
+        if kind == "interfaces":
+            yield "GET /interfaces/", "GET", "/interfaces/", None
+        elif kind == "scan":
+            yield "GET /scan-networks/", "GET", f"/scan-networks/?interface_index={index}&fresh=true", None
+        elif kind == "probe":
+            yield "POST /check-internet-connection/", "POST", "/check-internet-connection/", None
+        elif kind == "test-wifi":
+            # No mobile number: the test leases whichever SIM is free.
+            body = {"interface_index": index, "ssid": "RailWire"}
+            yield "POST /test-wifi/", "POST", "/test-wifi/", body
+        n += 1
+
+
+async def drive(app, args, interface_count):
+    import httpx
+    from app.services.progress import set_reporter, reset_reporter
+
+    endpoints = defaultdict(list)
+    steps = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+
+    def record_step(step, state, info):
+        if state in ("completed", "failed") and "elapsed" in info:
+            steps[step].append(info["elapsed"])
+
+    # Tasks copy the context they are created in, so every request reports its steps here.
+    token = set_reporter(record_step)
+    requests = build_requests(args.scenario, interface_count)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def one(label, method, path, body):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                endpoints[label].append(time.perf_counter() - started)
+                statuses[label][response.status_code] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(*next(requests)) for _ in range(args.requests)))
+        elapsed = time.perf_counter() - started
+    reset_reporter(token)
+    return elapsed, endpoints, steps, statuses
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"{'name':42} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name, stats in sorted(rows.items()):
+        cells = "".join(f" {stats[key] * 1000:8.1f}ms" if stats[key] is not None else f" {'-':>9}"
+                        for key in ("p50", "p95", "p99", "max"))
+        print(f"{name:42} {stats['count']:6d}{cells}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="mixed")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--interfaces", type=int, default=2, help="simulated Wi-Fi radios")
+    parser.add_argument("--portal-mode", choices=("captive", "open"), default="open",
+                        help="captive needs Chrome and chromedriver (CHROMEDRIVER_PATH)")
+    parser.add_argument("--browsers", type=int, default=1)
+    parser.add_argument("--modems", type=int, default=1, help="simulated SIM800C modems, one SIM each")
+    parser.add_argument("--sms-delay", type=float, default=2.0, help="seconds from OTP request to the SMS arriving")
+    parser.add_argument("--sms-delivery", choices=("stored", "direct"), default="stored",
+                        help="+CMTI and AT+CMGR, or +CMT PDUs pushed by the modem")
+    parser.add_argument("--sms-parts", type=int, default=1, help="split the OTP SMS into this many PDU parts")
+    parser.add_argument("--connect-delay", type=float, default=1.0, help="simulated association time")
+    parser.add_argument("--scan-delay", type=float, default=0.5, help="pywifi scan wait")
+    parser.add_argument("--button-delay", type=float, default=0.0, help="delay before 'Connect To Wi-Fi' enables")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    modems = {MOBILE_NUMBER.format(n): Sim800cSimulator(sms_delay=args.sms_delay, sms_parts=args.sms_parts).start()
+              for n in range(args.modems)}
+
+    def send_sms(number, text):
+        modems.get(number, next(iter(modems.values()))).deliver_sms(text)
+
+    portal = PortalSimulator(args.portal_mode, send_sms=send_sms, button_delay=args.button_delay).start()
+    configure_environment(args, modems, portal)
+
+    from app.main import app
+    from app.services.wifi_service import set_pywifi_factory
+
+    # A new association lands on the portal again, like a fresh client on the real network.
+    set_pywifi_factory(FakeWiFi(args.interfaces, connect_delay=args.connect_delay, on_connect=portal.reset))
+    try:
+        with MemorySampler() as memory:
+            elapsed, endpoints, steps, statuses = asyncio.run(drive(app, args, args.interfaces))
+    finally:
+        portal.stop()
+        for modem in modems.values():
+            modem.stop()
+
+    report = {
+        "scenario": args.scenario,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": args.requests / elapsed if elapsed else None,
+        "peak_rss_bytes": memory.peak,
+        "max_rss_self_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "endpoints": {name: summarize(samples) for name, samples in endpoints.items()},
+        "steps": {name: summarize(samples) for name, samples in steps.items()},
+        "status_codes": {name: dict(codes) for name, codes in statuses.items()},
+    }
+    print_table("Endpoints", report["endpoints"])
+    print_table("Pipeline steps", report["steps"])
+    print(f"\nstatus codes: {report['status_codes']}")
+    print(f"{args.requests} requests in {elapsed:.2f}s, {report['throughput_rps']:.2f} req/s, "
+          f"peak RSS {memory.peak / 1024 / 1024:.1f} MiB")
+    if args.json:
+        with open(args.json, "wb") as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
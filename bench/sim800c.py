@@ -0,0 +1,174 @@
+# bench/sim800c.py
+import itertools
+import os
+import pty
+import threading
+import time
+import tty
+
+from app.services.sms_pdu import GSM7_BASIC, GSM7_ESCAPE, GSM7_EXTENSION
+
+GSM7_REVERSE = {char: [index] for index, char in enumerate(GSM7_BASIC)}
+GSM7_REVERSE.update({char: [GSM7_ESCAPE, index] for index, char in GSM7_EXTENSION.items()})
+
+
+def _semi_octets(digits):
+    digits = digits + "F" * (len(digits) % 2)
+    return "".join(digits[i + 1] + digits[i] for i in range(0, len(digits), 2))
+
+
+def _pack_septets(septets, prefix=b"", skip=0):
+    value = int.from_bytes(prefix, "little")
+    for i, septet in enumerate(septets):
+        value |= septet << (7 * (skip + i))
+    return value.to_bytes((7 * (skip + len(septets)) + 7) // 8, "little")
+
+
+def encode_deliver_pdu(sender, text, reference=0, part=1, parts=1):
+    """SMS-DELIVER PDU (with an empty SMSC) the way the modem reports `text` from `sender`."""
+    if sender.lstrip("+").isdigit():
+        digits = sender.lstrip("+")
+        address = f"{len(digits):02X}{'91' if sender.startswith('+') else '81'}{_semi_octets(digits)}"
+    else:
+        packed = _pack_septets([septet for char in sender for septet in GSM7_REVERSE.get(char, [0x20])])
+        address = f"{(len(sender) * 7 + 3) // 4:02X}D0{packed.hex().upper()}"
+    header = bytes([5, 0x00, 3, reference & 0xFF, parts, part]) if parts > 1 else b""
+    stamp = _semi_octets(time.strftime("%y%m%d%H%M%S", time.gmtime()) + "00")
+    if all(char in GSM7_REVERSE for char in text):
+        septets = [septet for char in text for septet in GSM7_REVERSE[char]]
+        skip = (len(header) * 8 + 6) // 7
+        dcs, length, user_data = "00", skip + len(septets), _pack_septets(septets, header, skip)
+    else:
+        body = text.encode("utf-16-be")
+        dcs, length, user_data = "08", len(header) + len(body), header + body
+    first_octet = "44" if header else "04"
+    tpdu = f"{first_octet}{address}00{dcs}{stamp}{length:02X}{user_data.hex().upper()}"
+    return "00" + tpdu, len(tpdu) // 2
+
+
+class Sim800cSimulator:
+    """
+    SIM800C stand-in on a pseudo terminal. The app opens `port` like the real /dev/serial0;
+    deliver_sms() hands a message over `sms_delay` seconds later, split into `sms_parts` parts
+    in PDU mode. Depending on AT+CNMI it is pushed as +CMT, or stored and announced with +CMTI
+    for AT+CMGR/AT+CMGL/AT+CMGD to read and delete like the modem does.
+    """
+
+    def __init__(self, sms_delay=2.0, response_delay=0.0, sender="VM-RLWIRE", sms_parts=1):
+        self.sms_delay = sms_delay
+        self.response_delay = response_delay
+        self.sender = sender
+        self.sms_parts = sms_parts
+        self._pdu_mode = False
+        self._direct = False
+        self._references = itertools.count(1)
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._echo = True
+        self._storage = {}
+        self._indexes = itertools.count(1)
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self.commands = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name="sim800c-sim", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _write(self, text):
+        with self._write_lock:
+            os.write(self._master, text.encode())
+
+    def deliver_sms(self, text, delay=None):
+        """Deliver `text` once the delivery delay has passed."""
+        delay = self.sms_delay if delay is None else delay
+        threading.Timer(delay, self._arrive, (text,)).start()
+
+    def _arrive(self, text):
+        parts = self.sms_parts if self._pdu_mode else 1
+        size = -(-len(text) // parts)
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        reference = next(self._references)
+        for number, chunk in enumerate(chunks, 1):
+            message = (chunk, reference, number, len(chunks))
+            if self._direct:
+                pdu, length = encode_deliver_pdu(self.sender, *message)
+                self._write(f"\r\n+CMT: ,{length}\r\n{pdu}\r\n")
+            else:
+                index = next(self._indexes)
+                self._storage[index] = message
+                self._write(f'\r\n+CMTI: "SM",{index}\r\n')
+
+    def _format(self, index, message, command):
+        if self._pdu_mode:
+            pdu, length = encode_deliver_pdu(self.sender, *message)
+            status = f"{index},0" if command == "+CMGL" else "0"
+            return f"{command}: {status},,{length}\r\n{pdu}\r\n"
+        stamp = time.strftime("%y/%m/%d,%H:%M:%S+22")
+        status = f'{index},"REC UNREAD"' if command == "+CMGL" else '"REC UNREAD"'
+        return f'{command}: {status},"{self.sender}","","{stamp}"\r\n{message[0]}\r\n'
+
+    def _serve(self):
+        buffer = b""
+        while self._running:
+            try:
+                data = os.read(self._master, 1024)
+            except OSError:
+                return
+            buffer += data
+            while b"\r" in buffer:
+                line, _, buffer = buffer.partition(b"\r")
+                command = line.strip(b"\n ").decode(errors="replace")
+                if command:
+                    self._handle(command)
+
+    def _handle(self, command):
+        self.commands += 1
+        if self.response_delay:
+            time.sleep(self.response_delay)
+        reply = ""
+        if self._echo:
+            reply += command + "\r\n"
+        upper = command.upper()
+        if upper == "ATE0":
+            self._echo = False
+            reply += "\r\nOK\r\n"
+        elif upper.startswith("AT+CMGF="):
+            self._pdu_mode = upper.endswith("0")
+            reply += "\r\nOK\r\n"
+        elif upper.startswith("AT+CNMI="):
+            self._direct = upper.split("=", 1)[1].split(",")[1:2] == ["2"]
+            reply += "\r\nOK\r\n"
+        elif upper.startswith("AT+CMGR="):
+            index = int(upper.split("=", 1)[1])
+            message = self._storage.get(index)
+            if message is None:
+                reply += "\r\n+CMS ERROR: 321\r\n"
+            else:
+                reply += "\r\n" + self._format(index, message, "+CMGR") + "\r\nOK\r\n"
+        elif upper.startswith("AT+CMGL"):
+            listing = "".join(self._format(index, message, "+CMGL") for index, message in sorted(self._storage.items()))
+            reply += "\r\n" + listing + "\r\nOK\r\n"
+        elif upper.startswith("AT+CMGD="):
+            self._storage.pop(int(upper.split("=", 1)[1].split(",")[0]), None)
+            reply += "\r\nOK\r\n"
+        elif upper.startswith("AT+CMGDA"):
+            self._storage.clear()
+            reply += "\r\nOK\r\n"
+        elif upper.startswith("AT"):
+            reply += "\r\nOK\r\n"
+        else:
+            reply += "\r\nERROR\r\n"
+        self._write(reply)